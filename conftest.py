@@ -0,0 +1,13 @@
+import pytest
+
+
+@pytest.fixture(scope='session', autouse=True)
+def temporary_runtime_files():
+    """
+    Кеш, метрики и журнал медленных запросов прогона pytest —
+    во временном каталоге, как у manage.py test.
+    """
+    from core.testing import temporary_runtime_files
+
+    with temporary_runtime_files() as directory:
+        yield directory
@@ -0,0 +1,51 @@
+# Связанные объекты передаются ключом (username автора, slug группы),
+# а не вложенным объектом, чтобы ответ не повторял их в каждом посте.
+
+
+def post_data(post):
+    thumbnail = getattr(post, "thumbnail", None)
+    if thumbnail is not None and getattr(thumbnail, "is_placeholder", False):
+        thumbnail = None
+    return {
+        "id": post.pk,
+        "text": post.text,
+        "pub_date": post.pub_date.isoformat(),
+        "author": post.author.username,
+        "group": post.group.slug if post.group_id else None,
+        "image": post.image.url if post.image else None,
+        "thumbnail": thumbnail.url if thumbnail else None,
+    }
+
+
+def post_detail_data(post):
+    # Число комментариев есть только у отдельного поста: его версия
+    # учитывает область комментариев, а версии лент — нет.
+    return dict(post_data(post), comments_count=post.comments_count)
+
+
+def group_data(group):
+    return {
+        "slug": group.slug,
+        "title": group.title,
+        "description": group.description,
+    }
+
+
+def profile_data(user, counters):
+    return {
+        "username": user.username,
+        "full_name": user.get_full_name(),
+        "posts_count": counters.posts_count,
+        "followers_count": counters.followers_count,
+        "following_count": counters.following_count,
+    }
+
+
+def comment_data(comment):
+    return {
+        "id": comment.pk,
+        "post": comment.post_id,
+        "author": comment.author.username,
+        "text": comment.text,
+        "pub_date": comment.pub_date.isoformat(),
+    }
@@ -0,0 +1,97 @@
+from http import HTTPStatus
+
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.models import Comment, Group, Post, User
+
+
+class TestApi(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username="api_author")
+        cls.reader = User.objects.create_user(username="api_reader")
+        cls.group = Group.objects.create(
+            title="Группа API", slug="api-group", description="Описание"
+        )
+        cls.posts = [
+            Post.objects.create(
+                author=cls.author, group=cls.group, text=f"Пост {number}"
+            )
+            for number in range(3)
+        ]
+        Comment.objects.create(
+            post=cls.posts[0], author=cls.reader, text="Комментарий"
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def test_api_post_list_cursor_pages(self):
+        """Проверяем курсорную пагинацию и компактные поля постов."""
+        url = reverse("api:post_list")
+        first = self.client.get(url, {"limit": 2}).json()
+        self.assertEqual(
+            [post["id"] for post in first["results"]],
+            [self.posts[2].pk, self.posts[1].pk],
+        )
+        self.assertEqual(first["results"][0]["author"], "api_author")
+        self.assertEqual(first["results"][0]["group"], "api-group")
+        # Версии лент не учитывают комментарии, поэтому их числа в
+        # ленте нет: оно устарело бы вместе с закешированной страницей.
+        self.assertNotIn("comments_count", first["results"][0])
+        second = self.client.get(
+            url, {"limit": 2, "after": first["next"]}
+        ).json()
+        self.assertEqual(
+            [post["id"] for post in second["results"]], [self.posts[0].pk]
+        )
+        self.assertIsNone(second["next"])
+        response = self.client.get(url, {"after": "битый"})
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+
+    def test_api_etag_not_modified(self):
+        """Проверяем 304 на If-None-Match и новый ETag после изменения."""
+        url = reverse("api:post_detail", args=[self.posts[0].pk])
+        etag = self.client.get(url)["ETag"]
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+        Comment.objects.create(
+            post=self.posts[0], author=self.author, text="Ещё комментарий"
+        )
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertEqual(response.json()["comments_count"], 2)
+
+    def test_api_resources(self):
+        """Проверяем группы, профиль, комментарии и ленту подписок."""
+        group = self.client.get(
+            reverse("api:group_posts", args=[self.group.slug])
+        ).json()
+        self.assertEqual(group["group"]["title"], "Группа API")
+        self.assertEqual(len(group["results"]), 3)
+        profile = self.client.get(
+            reverse("api:profile", args=[self.author.username])
+        ).json()
+        self.assertEqual(profile["profile"]["posts_count"], 3)
+        comments = self.client.get(
+            reverse("api:comment_list", args=[self.posts[0].pk])
+        ).json()
+        self.assertEqual(comments["results"][0]["author"], "api_reader")
+        missing = self.client.get(reverse("api:post_detail", args=[0]))
+        self.assertEqual(missing.status_code, HTTPStatus.NOT_FOUND)
+        self.assertEqual(
+            self.client.get(reverse("api:follow_feed")).status_code,
+            HTTPStatus.UNAUTHORIZED,
+        )
+        self.reader_client.get(
+            reverse("posts:profile_follow", args=[self.author.username])
+        )
+        feed = self.reader_client.get(reverse("api:follow_feed")).json()
+        self.assertEqual(len(feed["results"]), 3)
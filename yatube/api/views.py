@@ -0,0 +1,167 @@
+import functools
+
+from django.http import Http404, JsonResponse
+from django.shortcuts import get_object_or_404
+from django.views.decorators.http import condition, require_safe
+
+from core.decorators import query_budget
+from posts import counters, timeline
+from posts.comments import COMMENTS_ORDERING
+from posts.feed_cache import cache_feed, feed_etag
+from posts.models import Comment, Group, Post, User
+from posts.paginators import CursorPaginator, InvalidCursor
+from posts.thumbnails import attach_thumbnails
+
+from .serializers import (
+    comment_data,
+    group_data,
+    post_data,
+    post_detail_data,
+    profile_data,
+)
+
+
+PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+JSON_PARAMS = {"ensure_ascii": False, "separators": (",", ":")}
+
+
+def error(status, detail):
+    return JsonResponse(
+        {"detail": detail}, status=status, json_dumps_params=JSON_PARAMS
+    )
+
+
+def api_view(*scopes, login=False):
+    """
+    Обёртка view API: только GET/HEAD, ошибки в JSON и условный GET.
+    ETag — версия ленты по поколениям областей scopes
+    (posts.feed_cache), поэтому ответ 304 на If-None-Match стоит
+    одного обращения к кешу; ответ 200 кешируется под той же версией.
+    """
+    def decorator(view):
+        cached = condition(etag_func=feed_etag(*scopes))(
+            cache_feed(*scopes)(view)
+        )
+
+        @functools.wraps(view)
+        @require_safe
+        def wrapper(request, *args, **kwargs):
+            if login and not request.user.is_authenticated:
+                return error(401, "Требуется вход.")
+            try:
+                return cached(request, *args, **kwargs)
+            except Http404:
+                return error(404, "Не найдено.")
+            except InvalidCursor:
+                return error(400, "Неверный курсор.")
+
+        return wrapper
+
+    return decorator
+
+
+def page_size(request):
+    try:
+        size = int(request.GET.get("limit", PAGE_SIZE))
+    except ValueError:
+        return PAGE_SIZE
+    return min(max(size, 1), MAX_PAGE_SIZE)
+
+
+def paginated(request, source, serialize, ordering=None, extra=None,
+              prepare=None):
+    """Страница source по курсорам after/before в формате API."""
+    options = {"ordering": ordering} if ordering else {}
+    page = CursorPaginator(source, page_size(request), **options).page(
+        after=request.GET.get("after") or None,
+        before=request.GET.get("before") or None,
+    )
+    objects = list(page)
+    if prepare is not None:
+        prepare(objects)
+    data = dict(extra or {})
+    data.update(
+        next=page.next_cursor,
+        previous=page.previous_cursor,
+        results=[serialize(obj) for obj in objects],
+    )
+    return JsonResponse(data, json_dumps_params=JSON_PARAMS)
+
+
+def post_page(request, source, extra=None):
+    """Страница постов: миниатюры всей страницы находятся одной пачкой."""
+    return paginated(
+        request, source, post_data, extra=extra, prepare=attach_thumbnails
+    )
+
+
+@api_view("global")
+@query_budget(4)
+def post_list(request):
+    return post_page(request, Post.objects.select_related("author", "group"))
+
+
+@api_view("post:{post_id}", "comments:{post_id}")
+@query_budget(3)
+def post_detail(request, post_id):
+    post = get_object_or_404(
+        Post.objects.select_related("author", "group"), pk=post_id
+    )
+    attach_thumbnails([post])
+    return JsonResponse(
+        post_detail_data(post), json_dumps_params=JSON_PARAMS
+    )
+
+
+@api_view("post:{post_id}", "comments:{post_id}")
+@query_budget(4)
+def comment_list(request, post_id):
+    if not Post.objects.filter(pk=post_id).exists():
+        raise Http404
+    return paginated(
+        request,
+        Comment.objects.filter(post_id=post_id)
+        .select_related("author")
+        .order_by(*COMMENTS_ORDERING),
+        comment_data,
+        ordering=COMMENTS_ORDERING,
+    )
+
+
+@api_view("global")
+@query_budget(3)
+def group_list(request):
+    return paginated(
+        request, Group.objects.order_by("id"), group_data, ordering=("id",)
+    )
+
+
+@api_view("group:{slug}")
+@query_budget(4)
+def group_posts(request, slug):
+    group = get_object_or_404(Group, slug=slug)
+    return post_page(
+        request,
+        group.posts.select_related("author", "group"),
+        extra={"group": group_data(group)},
+    )
+
+
+@api_view("author:{username}")
+@query_budget(5)
+def profile(request, username):
+    author = get_object_or_404(
+        User.objects.select_related("counters"), username=username
+    )
+    return post_page(
+        request,
+        author.posts.select_related("author", "group"),
+        extra={"profile": profile_data(author, counters.for_user(author))},
+    )
+
+
+@api_view("global", "reader:{user}", login=True)
+@query_budget(7)
+def follow_feed(request):
+    return post_page(request, timeline.feed(request.user))
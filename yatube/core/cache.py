@@ -0,0 +1,296 @@
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+from core import metrics, timing
+
+
+DEFAULT_MAX_SIZE = 64 * 1024 * 1024
+# Время последнего чтения обновляется не чаще раза в секунду:
+# для LRU этого хватает, а горячие ключи не берут блокировку на запись.
+ACCESS_RESOLUTION = 1.0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS cache_entries (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    expires REAL,
+    accessed REAL NOT NULL,
+    size INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS cache_entries_accessed_idx
+    ON cache_entries (accessed);
+CREATE TABLE IF NOT EXISTS cache_stats (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    total_size INTEGER NOT NULL,
+    entries INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO cache_stats VALUES (1, 0, 0);
+CREATE TRIGGER IF NOT EXISTS cache_entries_insert
+AFTER INSERT ON cache_entries BEGIN
+    UPDATE cache_stats
+    SET total_size = total_size + new.size, entries = entries + 1;
+END;
+CREATE TRIGGER IF NOT EXISTS cache_entries_delete
+AFTER DELETE ON cache_entries BEGIN
+    UPDATE cache_stats
+    SET total_size = total_size - old.size, entries = entries - 1;
+END;
+CREATE TRIGGER IF NOT EXISTS cache_entries_update
+AFTER UPDATE OF size ON cache_entries BEGIN
+    UPDATE cache_stats SET total_size = total_size + new.size - old.size;
+END;
+"""
+
+UPSERT = """
+INSERT INTO cache_entries (key, value, expires, accessed, size)
+VALUES (?, ?, ?, ?, ?)
+ON CONFLICT (key) DO UPDATE SET
+    value = excluded.value,
+    expires = excluded.expires,
+    accessed = excluded.accessed,
+    size = excluded.size
+"""
+
+
+class SQLiteCache(BaseCache):
+    """
+    Кеш в файле SQLite, общий для всех процессов на хосте, в отличие
+    от LocMemCache, у которого в каждом воркере своя холодная копия.
+    Файл работает в режиме WAL: чтения не блокируют друг друга, а
+    записи сериализуются самим SQLite. Размер ограничен OPTIONS
+    MAX_SIZE (байты) и MAX_ENTRIES; при превышении вытесняются
+    давно не читавшиеся записи. Счётчики размера ведут триггеры,
+    поэтому проверка лимита не пересчитывает таблицу.
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get("OPTIONS", {})
+        self._path = location
+        self._max_size = int(options.get("MAX_SIZE", DEFAULT_MAX_SIZE))
+        self._busy_timeout = float(options.get("BUSY_TIMEOUT", 5))
+        self._local = threading.local()
+
+    def _connection(self):
+        # Соединение своё у каждого потока и процесса: после fork
+        # унаследованное соединение SQLite использовать нельзя.
+        connection = getattr(self._local, "connection", None)
+        if connection is None or self._local.pid != os.getpid():
+            directory = os.path.dirname(self._path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(
+                self._path, timeout=self._busy_timeout, isolation_level=None
+            )
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.executescript(SCHEMA)
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def _write(self, operation):
+        """Выполняет operation(connection) в транзакции на запись."""
+        started = time.perf_counter()
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            result = operation(connection)
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        connection.execute("COMMIT")
+        timing.record_cache(time.perf_counter() - started)
+        return result
+
+    def _row(self, key, value, timeout, now):
+        data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        expires = self.get_backend_timeout(timeout)
+        return key, data, expires, now, len(key) + len(data)
+
+    def _cull(self, connection, now):
+        total_size, entries = connection.execute(
+            "SELECT total_size, entries FROM cache_stats"
+        ).fetchone()
+        if total_size <= self._max_size and entries <= self._max_entries:
+            return
+        connection.execute(
+            "DELETE FROM cache_entries WHERE expires <= ?", (now,)
+        )
+        while True:
+            total_size, entries = connection.execute(
+                "SELECT total_size, entries FROM cache_stats"
+            ).fetchone()
+            if total_size <= self._max_size and entries <= self._max_entries:
+                return
+            connection.execute(
+                "DELETE FROM cache_entries WHERE key IN ("
+                "SELECT key FROM cache_entries ORDER BY accessed LIMIT ?)",
+                (max(1, entries // self._cull_frequency),),
+            )
+
+    def _touch_accessed(self, rows, now):
+        stale = [
+            (now, key) for key, accessed in rows
+            if accessed < now - ACCESS_RESOLUTION
+        ]
+        if stale:
+            self._write(
+                lambda connection: connection.executemany(
+                    "UPDATE cache_entries SET accessed = ? WHERE key = ?",
+                    stale,
+                )
+            )
+
+    def _fetch(self, keys):
+        started = time.perf_counter()
+        now = time.time()
+        found = {}
+        accessed = []
+        connection = self._connection()
+        # Ограничение SQLite на число параметров запроса.
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            rows = connection.execute(
+                "SELECT key, value, accessed FROM cache_entries "
+                "WHERE key IN (%s) AND (expires IS NULL OR expires > ?)"
+                % ", ".join("?" * len(chunk)),
+                (*chunk, now),
+            ).fetchall()
+            for key, value, last_access in rows:
+                found[key] = pickle.loads(value)
+                accessed.append((key, last_access))
+        timing.record_cache(
+            time.perf_counter() - started,
+            hits=len(found),
+            misses=len(keys) - len(found),
+        )
+        metrics.record_cache_lookups(keys, found)
+        self._touch_accessed(accessed, now)
+        return found
+
+    def get(self, key, default=None, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return self._fetch([key]).get(key, default)
+
+    def get_many(self, keys, version=None):
+        made = {self.make_key(key, version=version): key for key in keys}
+        for key in made:
+            self.validate_key(key)
+        return {
+            made[key]: value
+            for key, value in self._fetch(list(made)).items()
+        }
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.set_many({key: value}, timeout, version)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        now = time.time()
+        rows = []
+        for key, value in data.items():
+            key = self.make_key(key, version=version)
+            self.validate_key(key)
+            rows.append(self._row(key, value, timeout, now))
+
+        def write(connection):
+            connection.executemany(UPSERT, rows)
+            self._cull(connection, now)
+
+        self._write(write)
+        return []
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        now = time.time()
+        row = self._row(key, value, timeout, now)
+
+        def write(connection):
+            exists = connection.execute(
+                "SELECT 1 FROM cache_entries "
+                "WHERE key = ? AND (expires IS NULL OR expires > ?)",
+                (key, now),
+            ).fetchone()
+            if exists:
+                return False
+            connection.execute(UPSERT, row)
+            self._cull(connection, now)
+            return True
+
+        return self._write(write)
+
+    def incr(self, key, delta=1, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        now = time.time()
+
+        def write(connection):
+            row = connection.execute(
+                "SELECT value FROM cache_entries "
+                "WHERE key = ? AND (expires IS NULL OR expires > ?)",
+                (key, now),
+            ).fetchone()
+            if row is None:
+                raise ValueError("Key '%s' not found" % key)
+            value = pickle.loads(row[0]) + delta
+            data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+            connection.execute(
+                "UPDATE cache_entries SET value = ?, accessed = ?, size = ? "
+                "WHERE key = ?",
+                (data, now, len(key) + len(data), key),
+            )
+            return value
+
+        return self._write(write)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        now = time.time()
+        return self._write(
+            lambda connection: connection.execute(
+                "UPDATE cache_entries SET expires = ? "
+                "WHERE key = ? AND (expires IS NULL OR expires > ?)",
+                (self.get_backend_timeout(timeout), key, now),
+            ).rowcount > 0
+        )
+
+    def has_key(self, key, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return self._connection().execute(
+            "SELECT 1 FROM cache_entries "
+            "WHERE key = ? AND (expires IS NULL OR expires > ?)",
+            (key, time.time()),
+        ).fetchone() is not None
+
+    def delete(self, key, version=None):
+        self.delete_many([key], version)
+
+    def delete_many(self, keys, version=None):
+        made = [self.make_key(key, version=version) for key in keys]
+        for key in made:
+            self.validate_key(key)
+        self._write(
+            lambda connection: connection.executemany(
+                "DELETE FROM cache_entries WHERE key = ?",
+                [(key,) for key in made],
+            )
+        )
+
+    def clear(self):
+        self._write(
+            lambda connection: connection.execute("DELETE FROM cache_entries")
+        )
+
+    def close(self, **kwargs):
+        # Соединение живёт весь процесс: Django вызывает close() после
+        # каждого запроса, а переоткрывать файл SQLite каждый раз дорого.
+        pass
@@ -0,0 +1,48 @@
+import functools
+import logging
+
+from django.conf import settings
+from django.db import connection
+
+
+logger = logging.getLogger(__name__)
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+def query_budget(max_queries):
+    """
+    Объявляет, сколько SQL-запросов может выполнить view вместе
+    с отрисовкой шаблона. Запросы считаются через execute_wrapper,
+    поэтому подсчёт дешёвый и работает без DEBUG. При превышении
+    бюджета view падает, если включён QUERY_BUDGET_STRICT, иначе
+    превышение пишется в лог.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            executed = []
+
+            def count_query(execute, sql, params, many, context):
+                executed.append(sql)
+                return execute(sql, params, many, context)
+
+            with connection.execute_wrapper(count_query):
+                response = view(request, *args, **kwargs)
+            if len(executed) > max_queries:
+                message = (
+                    f"{view.__module__}.{view.__name__} выполнил "
+                    f"{len(executed)} запросов при бюджете {max_queries}: "
+                    + "; ".join(executed)
+                )
+                if settings.QUERY_BUDGET_STRICT:
+                    raise QueryBudgetExceeded(message)
+                logger.warning(message)
+            return response
+
+        wrapper.query_budget = max_queries
+        return wrapper
+
+    return decorator
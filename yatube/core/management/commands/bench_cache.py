@@ -0,0 +1,91 @@
+import multiprocessing
+import os
+import tempfile
+import time
+
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management.base import BaseCommand
+
+from core.cache import SQLiteCache
+
+
+def make_backend(name, path):
+    if name == "locmem":
+        return LocMemCache("bench", {"OPTIONS": {"MAX_ENTRIES": 10 ** 6}})
+    return SQLiteCache(path, {"OPTIONS": {"MAX_ENTRIES": 10 ** 6}})
+
+
+def worker(name, path, index, options, barrier, results):
+    """
+    Процесс бенчмарка: записывает свою долю ключей через set_many,
+    затем читает весь набор ключей через get_many. Попадания в ключи,
+    записанные другими процессами, показывают, общий ли кеш.
+    """
+    cache = make_backend(name, path)
+    processes = options["processes"]
+    batch = options["batch"]
+    value = "x" * options["value_size"]
+    keys = ["bench:%s" % number for number in range(options["keys"])]
+    own = keys[index::processes]
+    barrier.wait()
+    started = time.perf_counter()
+    for start in range(0, len(own), batch):
+        cache.set_many({key: value for key in own[start:start + batch]})
+    set_seconds = time.perf_counter() - started
+    barrier.wait()
+    hits = reads = 0
+    started = time.perf_counter()
+    for _ in range(options["rounds"]):
+        for start in range(0, len(keys), batch):
+            chunk = keys[start:start + batch]
+            hits += len(cache.get_many(chunk))
+            reads += len(chunk)
+    get_seconds = time.perf_counter() - started
+    results.put((len(own), set_seconds, reads, hits, get_seconds))
+
+
+class Command(BaseCommand):
+    help = (
+        "Сравнивает LocMemCache и core.cache.SQLiteCache на get_many и "
+        "set_many из нескольких процессов одновременно."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--processes", type=int, default=4)
+        parser.add_argument("--keys", type=int, default=2000)
+        parser.add_argument("--batch", type=int, default=20)
+        parser.add_argument("--rounds", type=int, default=5)
+        parser.add_argument("--value-size", type=int, default=2048)
+
+    def handle(self, *args, **options):
+        context = multiprocessing.get_context("fork")
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "bench.sqlite3")
+            for name in ("locmem", "sqlite"):
+                barrier = context.Barrier(options["processes"])
+                results = context.Queue()
+                processes = [
+                    context.Process(
+                        target=worker,
+                        args=(name, path, index, options, barrier, results),
+                    )
+                    for index in range(options["processes"])
+                ]
+                for process in processes:
+                    process.start()
+                rows = [results.get() for _ in processes]
+                for process in processes:
+                    process.join()
+                self.report(name, rows)
+
+    def report(self, name, rows):
+        written = sum(row[0] for row in rows)
+        set_seconds = max(row[1] for row in rows)
+        reads = sum(row[2] for row in rows)
+        hits = sum(row[3] for row in rows)
+        get_seconds = max(row[4] for row in rows)
+        self.stdout.write(
+            f"{name:>7}: set_many {written / set_seconds:,.0f} ключей/с, "
+            f"get_many {reads / get_seconds:,.0f} ключей/с, "
+            f"попаданий {hits / reads:.0%}"
+        )
@@ -0,0 +1,97 @@
+import glob
+import json
+from collections import Counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.slow_queries import normalize
+
+
+ORDERINGS = {
+    "total": lambda group: group["total_ms"],
+    "count": lambda group: group["count"],
+    "max": lambda group: group["max_ms"],
+}
+
+
+def read_entries(path):
+    """Записи журнала вместе с ротированными файлами path.1, path.2…"""
+    for filename in sorted(glob.glob(glob.escape(path) + "*")):
+        with open(filename, encoding="utf-8") as file:
+            for line in file:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
+
+
+def group_entries(entries):
+    groups = {}
+    for entry in entries:
+        group = groups.setdefault(entry["fingerprint"], {
+            "fingerprint": entry["fingerprint"],
+            "sql": normalize(entry["sql"]),
+            "count": 0,
+            "total_ms": 0.0,
+            "max_ms": 0.0,
+            "views": Counter(),
+            "plan": None,
+            "stack": None,
+        })
+        group["count"] += 1
+        group["total_ms"] += entry["ms"]
+        group["views"][entry["view"] or "-"] += 1
+        if entry["ms"] >= group["max_ms"]:
+            group["max_ms"] = entry["ms"]
+            group["plan"] = entry["plan"] or group["plan"]
+        if entry.get("stack"):
+            group["stack"] = entry["stack"]
+    return list(groups.values())
+
+
+class Command(BaseCommand):
+    help = (
+        "Отчёт по журналу медленных запросов (core.slow_queries): "
+        "запросы сгруппированы по отпечатку нормализованного SQL, "
+        "для каждой группы — число, суммарное и худшее время, view, "
+        "план самого медленного запроса и пример стека."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--file", default=settings.SLOW_QUERY_LOG)
+        parser.add_argument(
+            "--order", choices=sorted(ORDERINGS), default="total"
+        )
+        parser.add_argument("--limit", type=int, default=20)
+        parser.add_argument("--json", action="store_true")
+
+    def handle(self, *args, **options):
+        groups = sorted(
+            group_entries(read_entries(options["file"])),
+            key=ORDERINGS[options["order"]],
+            reverse=True,
+        )[:options["limit"]]
+        if options["json"]:
+            self.stdout.write(json.dumps(groups, ensure_ascii=False, indent=2))
+            return
+        if not groups:
+            self.stdout.write(f"В {options['file']} нет медленных запросов.")
+            return
+        for group in groups:
+            self.stdout.write(self.style.SUCCESS(
+                f"{group['fingerprint']}  {group['count']} раз, "
+                f"всего {group['total_ms']:.1f} мс, "
+                f"среднее {group['total_ms'] / group['count']:.1f} мс, "
+                f"худшее {group['max_ms']:.1f} мс"
+            ))
+            self.stdout.write(f"  {group['sql']}")
+            views = ", ".join(
+                f"{view} ({count})"
+                for view, count in group["views"].most_common()
+            )
+            self.stdout.write(f"  view: {views}")
+            for row in group["plan"] or []:
+                self.stdout.write(f"  план: {row}")
+            for frame in group["stack"] or []:
+                self.stdout.write(f"  стек: {frame}")
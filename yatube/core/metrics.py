@@ -0,0 +1,376 @@
+import atexit
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+from types import SimpleNamespace
+
+from django.conf import settings
+
+from core import timing
+
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+THUMBNAIL_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+# Имя -> (тип, описание, границы корзин гистограммы).
+METRICS = {
+    "yatube_http_requests_total": (
+        "counter", "HTTP requests by URL name, method and status.", None,
+    ),
+    "yatube_http_request_duration_seconds": (
+        "histogram", "HTTP request latency by URL name.", LATENCY_BUCKETS,
+    ),
+    "yatube_http_requests_in_flight": (
+        "gauge", "Requests being processed by all workers.", None,
+    ),
+    "yatube_db_queries_total": (
+        "counter", "SQL queries executed by requests, by URL name.", None,
+    ),
+    "yatube_db_query_seconds_total": (
+        "counter", "Time spent in SQL by requests, by URL name.", None,
+    ),
+    "yatube_cache_requests_total": (
+        "counter", "Cache key lookups by key kind and result.", None,
+    ),
+    "yatube_cache_hit_ratio": (
+        "gauge", "Share of cache lookups that hit, by key kind.", None,
+    ),
+    "yatube_thumbnails_generated_total": (
+        "counter", "Thumbnails generated, by result.", None,
+    ),
+    "yatube_thumbnail_generation_seconds": (
+        "histogram", "Time to generate one thumbnail.", THUMBNAIL_BUCKETS,
+    ),
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS counters (
+    name TEXT NOT NULL,
+    labels TEXT NOT NULL,
+    le TEXT NOT NULL,
+    value REAL NOT NULL,
+    PRIMARY KEY (name, labels, le)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS gauges (
+    name TEXT NOT NULL,
+    labels TEXT NOT NULL,
+    pid INTEGER NOT NULL,
+    value REAL NOT NULL,
+    PRIMARY KEY (name, labels, pid)
+) WITHOUT ROWID;
+"""
+
+ADD = """
+INSERT INTO counters (name, labels, le, value) VALUES (?, ?, ?, ?)
+ON CONFLICT (name, labels, le) DO UPDATE SET value = value + excluded.value
+"""
+
+_KEY_KIND = re.compile(r"[\w.-]+(?::[a-z_]+(?=:))?")
+
+
+def format_labels(**labels):
+    return ",".join(
+        '%s="%s"' % (
+            name,
+            str(value)
+            .replace("\\", "\\\\")
+            .replace('"', '\\"')
+            .replace("\n", "\\n"),
+        )
+        for name, value in sorted(labels.items())
+    )
+
+
+def cache_kind(key):
+    """
+    Вид ключа кеша для меток: feed:page, feed:gen, post:card,
+    sorl-thumbnail.
+    key — ключ после make_key, с префиксом ":версия:".
+    """
+    raw = key.split(":", 2)[-1]
+    match = _KEY_KIND.match(raw)
+    return match.group(0) if match else "other"
+
+
+class Registry:
+    """
+    Метрики процесса копятся в памяти, и фоновый поток раз в
+    METRICS_FLUSH_INTERVAL секунд прибавляет их к общим счётчикам
+    в файле SQLite METRICS_PATH. Поэтому /metrics любого воркера
+    отдаёт сумму по всем процессам, а запрос не ждёт записи счётчиков
+    на диск. Gauge хранится построчно на процесс, пишется при каждом
+    изменении и суммируется при чтении; строки завершившихся
+    процессов удаляются.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._gauge_lock = threading.Lock()
+        self._pending = defaultdict(float)
+        self._in_flight = 0
+        self._local = threading.local()
+        # Gauge пишется на каждом запросе, в том числе из потоков,
+        # которые сервер заводит на один запрос, поэтому у него одно
+        # соединение на процесс под _gauge_lock.
+        self._gauge = SimpleNamespace()
+        self._flusher_pid = None
+
+    def _open(self, path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        connection = sqlite3.connect(
+            path, timeout=5, isolation_level=None, check_same_thread=False
+        )
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.executescript(SCHEMA)
+        return connection
+
+    def _connection(self, holder=None):
+        """
+        Соединение потока или, если передан holder, общее соединение,
+        которое вызывающий держит под своим замком.
+        """
+        holder = self._local if holder is None else holder
+        key = (settings.METRICS_PATH, os.getpid())
+        if getattr(holder, "key", None) != key:
+            holder.connection = self._open(key[0])
+            holder.key = key
+        return holder.connection
+
+    def _start_flusher(self):
+        # Поток запускается лениво, уже в процессе воркера: потоки
+        # не переживают fork при запуске gunicorn с preload.
+        if self._flusher_pid == os.getpid():
+            return
+        with self._lock:
+            if self._flusher_pid == os.getpid():
+                return
+            self._flusher_pid = os.getpid()
+        threading.Thread(
+            target=self._flush_periodically,
+            name="metrics-flush",
+            daemon=True,
+        ).start()
+
+    def _flush_periodically(self):
+        while True:
+            time.sleep(settings.METRICS_FLUSH_INTERVAL)
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Не удалось записать метрики")
+
+    def inc(self, name, value=1, **labels):
+        key = (name, format_labels(**labels), "")
+        self._start_flusher()
+        with self._lock:
+            self._pending[key] += value
+
+    def observe(self, name, seconds, **labels):
+        buckets = METRICS[name][2]
+        le = next(
+            (str(bound) for bound in buckets if seconds <= bound), "+Inf"
+        )
+        labels = format_labels(**labels)
+        self._start_flusher()
+        with self._lock:
+            # Корзины хранятся без накопления: одно обновление на
+            # наблюдение, суммы по корзинам считаются при выводе.
+            self._pending[(name + "_bucket", labels, le)] += 1
+            self._pending[(name + "_sum", labels, "")] += seconds
+            self._pending[(name + "_count", labels, "")] += 1
+
+    def _write_in_flight(self):
+        # Значение читается под замком записи: последней всегда
+        # записывается актуальное число, как бы ни чередовались потоки.
+        # Сбой записи метрики не должен ронять сам запрос.
+        with self._gauge_lock:
+            try:
+                self._connection(self._gauge).execute(
+                    "INSERT OR REPLACE INTO gauges VALUES (?, '', ?, ?)",
+                    (
+                        "yatube_http_requests_in_flight",
+                        os.getpid(),
+                        self._in_flight,
+                    ),
+                )
+            except Exception:
+                logger.exception("Не удалось записать метрики")
+
+    def request_started(self):
+        with self._lock:
+            self._in_flight += 1
+        self._write_in_flight()
+
+    def request_finished(self):
+        with self._lock:
+            self._in_flight -= 1
+        self._write_in_flight()
+
+    def flush(self):
+        """Прибавляет накопленное в процессе к общим счётчикам."""
+        with self._lock:
+            if not self._pending:
+                return
+            pending, self._pending = self._pending, defaultdict(float)
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            connection.executemany(
+                ADD,
+                [(*key, value) for key, value in pending.items()],
+            )
+        except BaseException:
+            connection.execute("ROLLBACK")
+            with self._lock:
+                for key, value in pending.items():
+                    self._pending[key] += value
+            raise
+        connection.execute("COMMIT")
+
+    def _prune_gauges(self, connection):
+        pids = [
+            pid for (pid,) in connection.execute(
+                "SELECT DISTINCT pid FROM gauges"
+            )
+        ]
+        for pid in pids:
+            try:
+                os.kill(pid, 0)
+            except ProcessLookupError:
+                connection.execute("DELETE FROM gauges WHERE pid = ?", (pid,))
+            except PermissionError:
+                pass
+
+    def collect(self):
+        """Текст всех метрик в формате Prometheus exposition 0.0.4."""
+        self.flush()
+        connection = self._connection()
+        self._prune_gauges(connection)
+        samples = defaultdict(list)
+        for name, labels, le, value in connection.execute(
+            "SELECT name, labels, le, value FROM counters"
+        ):
+            samples[name].append((labels, le, value))
+        for name, labels, value in connection.execute(
+            "SELECT name, labels, SUM(value) FROM gauges "
+            "GROUP BY name, labels"
+        ):
+            samples[name].append((labels, "", value))
+        samples["yatube_cache_hit_ratio"] = hit_ratios(
+            samples.get("yatube_cache_requests_total", [])
+        )
+        lines = []
+        for name, (kind, description, buckets) in METRICS.items():
+            lines.append(f"# HELP {name} {description}")
+            lines.append(f"# TYPE {name} {kind}")
+            if kind == "histogram":
+                lines.extend(histogram_lines(name, buckets, samples))
+            else:
+                for labels, _, value in sorted(samples.get(name, [])):
+                    lines.append(sample_line(name, labels, value))
+        return "\n".join(lines) + "\n"
+
+
+def sample_line(name, labels, value):
+    labels = "{%s}" % labels if labels else ""
+    if value == int(value):
+        value = int(value)
+    return f"{name}{labels} {value}"
+
+
+def histogram_lines(name, buckets, samples):
+    counts = defaultdict(dict)
+    for labels, le, value in samples.get(name + "_bucket", []):
+        counts[labels][le] = value
+    totals = {
+        labels: value for labels, _, value in samples.get(name + "_sum", [])
+    }
+    lines = []
+    for labels in sorted(counts):
+        cumulative = 0
+        prefix = labels + "," if labels else ""
+        for bound in [*map(str, buckets), "+Inf"]:
+            cumulative += counts[labels].get(bound, 0)
+            lines.append(sample_line(
+                name + "_bucket", f'{prefix}le="{bound}"', cumulative
+            ))
+        lines.append(sample_line(name + "_sum", labels, totals.get(labels, 0)))
+        lines.append(sample_line(name + "_count", labels, cumulative))
+    return lines
+
+
+def hit_ratios(requests):
+    totals = defaultdict(lambda: [0, 0])
+    for labels, _, value in requests:
+        kind, _, result = labels.partition(",")
+        totals[kind][0 if result == 'result="hit"' else 1] += value
+    return [
+        (kind, "", hits / (hits + misses))
+        for kind, (hits, misses) in totals.items()
+        if hits + misses
+    ]
+
+
+registry = Registry()
+
+
+@atexit.register
+def _flush_at_exit():
+    registry.flush()
+
+
+def record_cache_lookups(keys, found):
+    for key in keys:
+        registry.inc(
+            "yatube_cache_requests_total",
+            kind=cache_kind(key),
+            result="hit" if key in found else "miss",
+        )
+
+
+class MetricsMiddleware:
+    """
+    Считает запросы, задержку и SQL по имени URL и число запросов
+    в обработке. Ставится сразу после ServerTimingMiddleware:
+    число и время SQL берутся из его замеров.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        started = time.perf_counter()
+        registry.request_started()
+        try:
+            response = self.get_response(request)
+        finally:
+            registry.request_finished()
+        seconds = time.perf_counter() - started
+        match = getattr(request, "resolver_match", None)
+        view = match.view_name if match else "unresolved"
+        registry.inc(
+            "yatube_http_requests_total",
+            view=view,
+            method=request.method,
+            status=response.status_code,
+        )
+        registry.observe(
+            "yatube_http_request_duration_seconds", seconds, view=view
+        )
+        timings = timing.current()
+        if timings is not None:
+            count, db_seconds = timings.phases.get("db", (0, 0.0))
+            registry.inc("yatube_db_queries_total", count, view=view)
+            registry.inc(
+                "yatube_db_query_seconds_total", db_seconds, view=view
+            )
+        return response
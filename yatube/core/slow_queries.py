@@ -0,0 +1,140 @@
+import hashlib
+import json
+import logging
+import random
+import re
+import sys
+import time
+import traceback
+
+from django.conf import settings
+from django.db import DatabaseError
+
+from core import timing
+
+
+logger = logging.getLogger("yatube.slow_queries")
+
+EXPLAINABLE = ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH")
+# Сколько кадров стека сохранять у медленного запроса.
+STACK_LIMIT = 12
+
+_IN_LIST = re.compile(r"\(\s*%s(?:\s*,\s*%s)*\s*\)")
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_SPACES = re.compile(r"\s+")
+
+
+def normalize(sql):
+    """
+    SQL без литералов и с IN-списками любой длины, свёрнутыми в один
+    вид: запросы, отличающиеся только данными, получают один отпечаток.
+    """
+    sql = _STRING.sub("?", sql)
+    sql = _NUMBER.sub("?", sql)
+    sql = _IN_LIST.sub("(...)", sql)
+    return _SPACES.sub(" ", sql).strip()
+
+
+def fingerprint(sql):
+    return hashlib.md5(normalize(sql).encode()).hexdigest()[:12]
+
+
+def originating_view():
+    """
+    View, из которого пришёл запрос, например posts.views.profile:
+    по разобранному URL текущего запроса, а вне запроса — внешняя
+    по стеку функция модуля views (команды вызывают view напрямую).
+    """
+    current = timing.current()
+    match = getattr(getattr(current, "request", None), "resolver_match", None)
+    if match is not None:
+        return f"{match.func.__module__}.{match.func.__name__}"
+    view = None
+    frame = sys._getframe(2)
+    while frame is not None:
+        module = frame.f_globals.get("__name__", "")
+        if module.endswith(".views"):
+            view = f"{module}.{frame.f_code.co_name}"
+        frame = frame.f_back
+    return view
+
+
+def project_stack():
+    """Кадры стека из кода проекта, без Django и сторонних пакетов."""
+    frames = [
+        frame for frame in traceback.extract_stack()[:-3]
+        if frame.filename.startswith(settings.BASE_DIR)
+        and "site-packages" not in frame.filename
+    ]
+    return [
+        f"{frame.filename[len(settings.BASE_DIR) + 1:]}:{frame.lineno} "
+        f"{frame.name}"
+        for frame in frames[-STACK_LIMIT:]
+    ]
+
+
+def explain(connection, sql, params, many):
+    if not sql.lstrip().upper().startswith(EXPLAINABLE):
+        return None
+    if many:
+        params = next(iter(params), None)
+    try:
+        prefix = connection.ops.explain_query_prefix()
+        # Курсор драйвера минует execute_wrapper: EXPLAIN не попадает
+        # ни в этот лог, ни в бюджеты запросов.
+        cursor = connection.create_cursor()
+        try:
+            cursor.execute(f"{prefix} {sql}", params)
+            return [" ".join(map(str, row)) for row in cursor.fetchall()]
+        finally:
+            cursor.close()
+    except DatabaseError:
+        return None
+
+
+def log_slow_queries(execute, sql, params, many, context):
+    """
+    execute_wrapper, который пишет запросы дольше SLOW_QUERY_MS в лог
+    yatube.slow_queries вместе с планом, view и, для доли
+    SLOW_QUERY_STACK_RATE из них, стеком вызова. Быстрый запрос
+    обходится в пару вызовов perf_counter.
+    """
+    threshold = settings.SLOW_QUERY_MS
+    if threshold is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        milliseconds = (time.perf_counter() - started) * 1000
+        if milliseconds >= threshold:
+            connection = context["connection"]
+            stack = None
+            if random.random() < settings.SLOW_QUERY_STACK_RATE:
+                stack = project_stack()
+            logger.warning(json.dumps(
+                {
+                    "time": time.time(),
+                    "ms": round(milliseconds, 3),
+                    "alias": connection.alias,
+                    "fingerprint": fingerprint(sql),
+                    "sql": sql,
+                    "params": repr(params)[:500],
+                    "view": originating_view(),
+                    "plan": explain(connection, sql, params, many),
+                    "stack": stack,
+                },
+                ensure_ascii=False,
+            ))
+
+
+def install(connection, **kwargs):
+    """
+    Обработчик connection_created: вешает обёртку на соединение.
+    Она ставится первой в списке, потому что connection.execute_wrapper
+    снимает при выходе последнюю обёртку, а соединение может открыться
+    внутри такого блока.
+    """
+    if log_slow_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, log_slow_queries)
@@ -0,0 +1,89 @@
+import multiprocessing
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.test import SimpleTestCase
+
+from core import slow_queries
+from core.cache import SQLiteCache
+
+
+def write_from_child(path):
+    SQLiteCache(path, {}).set_many({'shared': 'из другого процесса'})
+
+
+class TestSQLiteCache(SimpleTestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'cache.sqlite3')
+        self.cache = SQLiteCache(self.path, {})
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_cache_basic_operations(self):
+        '''Проверяем get/set/add/incr/delete и истечение срока.'''
+        self.cache.set_many({'a': 1, 'b': [2]})
+        self.assertEqual(
+            self.cache.get_many(['a', 'b', 'c']), {'a': 1, 'b': [2]}
+        )
+        self.assertFalse(self.cache.add('a', 10))
+        self.assertTrue(self.cache.add('c', 3))
+        self.assertEqual(self.cache.incr('a', 5), 6)
+        with self.assertRaises(ValueError):
+            self.cache.incr('missing')
+        self.cache.delete('b')
+        self.assertIsNone(self.cache.get('b'))
+        self.cache.set('expired', 1, timeout=0)
+        self.assertFalse(self.cache.has_key('expired'))
+
+    def test_cache_evicts_least_recently_used(self):
+        '''
+        Проверяем, что при превышении MAX_SIZE вытесняются давно
+        не читавшиеся ключи.
+        '''
+        cache = SQLiteCache(
+            os.path.join(self.directory, 'small.sqlite3'),
+            {'OPTIONS': {'MAX_SIZE': 3500, 'CULL_FREQUENCY': 10}},
+        )
+        for number in range(3):
+            cache.set('key%s' % number, 'x' * 1000)
+        connection = cache._connection()
+        connection.execute(
+            "UPDATE cache_entries SET accessed = 0 WHERE key LIKE '%key0'"
+        )
+        cache.set('key3', 'x' * 1000)
+        self.assertIsNone(cache.get('key0'), 'Давний ключ не вытеснен')
+        self.assertEqual(len(cache.get_many(['key1', 'key2', 'key3'])), 3)
+
+    def test_cache_shared_between_processes(self):
+        '''Проверяем, что запись из другого процесса видна в этом.'''
+        self.cache.get('warm-up')
+        process = multiprocessing.get_context('fork').Process(
+            target=write_from_child, args=(self.path,)
+        )
+        process.start()
+        process.join()
+        self.assertEqual(self.cache.get('shared'), 'из другого процесса')
+
+    def test_cache_files_of_test_run_are_temporary(self):
+        '''Проверяем, что тесты не пишут в кеш, метрики и журнал рабочей копии.'''
+        handler = next(
+            handler for handler in slow_queries.logger.handlers
+            if hasattr(handler, 'baseFilename')
+        )
+        paths = [
+            settings.CACHES['default']['LOCATION'],
+            settings.METRICS_PATH,
+            settings.SLOW_QUERY_LOG,
+            handler.baseFilename,
+        ]
+        directory = os.path.dirname(paths[0])
+        self.assertTrue(
+            os.path.basename(directory).startswith('yatube-test-')
+        )
+        for path in paths:
+            self.assertEqual(os.path.dirname(path), directory)
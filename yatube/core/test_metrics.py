@@ -0,0 +1,146 @@
+import multiprocessing
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from core.metrics import SCHEMA, cache_kind, registry
+from posts.cards import CARD_PREFIX
+
+
+User = get_user_model()
+
+
+def record_in_child():
+    registry.inc('yatube_thumbnails_generated_total', 3, result='ok')
+    registry.flush()
+
+
+def serve_in_child(started, release):
+    registry.request_started()
+    started.set()
+    release.wait(10)
+    registry.request_finished()
+
+
+class TestMetrics(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.path = os.path.join(directory, 'metrics.sqlite3')
+        settings = override_settings(METRICS_PATH=self.path)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def test_metrics_endpoint(self):
+        '''Проверяем гистограмму, запросы к БД и кеш по имени URL.'''
+        self.client.get(reverse('posts:index'))
+        response = self.client.get(reverse('metrics'))
+        text = response.content.decode()
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(
+            'yatube_http_requests_total'
+            '{method="GET",status="200",view="posts:index"} 1', text
+        )
+        self.assertIn(
+            'yatube_http_request_duration_seconds_count{view="posts:index"} 1',
+            text,
+        )
+        self.assertIn(
+            'yatube_http_request_duration_seconds_bucket'
+            '{view="posts:index",le="+Inf"} 1', text
+        )
+        self.assertRegex(
+            text, r'yatube_db_queries_total\{view="posts:index"\} [1-9]'
+        )
+        self.assertIn(
+            'yatube_cache_requests_total'
+            '{kind="feed:page",result="miss"} 1', text
+        )
+        self.assertIn('yatube_cache_hit_ratio{kind="feed:page"} 0', text)
+        self.assertIn('yatube_http_requests_in_flight 1', text)
+
+    def test_metrics_aggregated_across_processes(self):
+        '''Проверяем, что /metrics суммирует счётчики других процессов.'''
+        process = multiprocessing.get_context('fork').Process(
+            target=record_in_child
+        )
+        process.start()
+        process.join()
+        registry.inc('yatube_thumbnails_generated_total', 2, result='ok')
+        text = self.client.get(reverse('metrics')).content.decode()
+        self.assertIn('yatube_thumbnails_generated_total{result="ok"} 5', text)
+
+    def test_metrics_in_flight_summed_across_processes(self):
+        '''Проверяем, что запрос другого процесса виден в /metrics.'''
+        context = multiprocessing.get_context('fork')
+        started, release = context.Event(), context.Event()
+        process = context.Process(
+            target=serve_in_child, args=(started, release)
+        )
+        process.start()
+        self.addCleanup(process.join)
+        self.addCleanup(release.set)
+        self.assertTrue(started.wait(10))
+        text = self.client.get(reverse('metrics')).content.decode()
+        self.assertIn('yatube_http_requests_in_flight 2', text)
+        release.set()
+        process.join()
+        text = self.client.get(reverse('metrics')).content.decode()
+        self.assertIn('yatube_http_requests_in_flight 1', text)
+
+    @override_settings(METRICS_FLUSH_INTERVAL=0.05)
+    def test_metrics_flushed_without_requests(self):
+        '''Проверяем, что метрики записываются и без новых запросов.'''
+        registry.inc('yatube_thumbnails_generated_total', result='idle')
+        connection = sqlite3.connect(self.path)
+        self.addCleanup(connection.close)
+        connection.executescript(SCHEMA)
+        deadline = time.monotonic() + 5
+        rows = []
+        while not rows and time.monotonic() < deadline:
+            time.sleep(0.05)
+            rows = connection.execute(
+                "SELECT value FROM counters WHERE labels = 'result=\"idle\"'"
+            ).fetchall()
+        self.assertEqual(rows, [(1,)])
+
+    def test_metrics_failure_does_not_fail_request(self):
+        '''Проверяем, что сбой записи метрик пишется в лог, а запрос отвечает.'''
+        with mock.patch.object(
+            registry, '_connection',
+            side_effect=sqlite3.OperationalError('database is locked'),
+        ), self.assertLogs('core.metrics', 'ERROR'):
+            response = self.client.get(reverse('posts:index'))
+        self.assertEqual(response.status_code, 200)
+
+    def test_metrics_endpoint_restricted(self):
+        '''Проверяем, что /metrics видят только разрешённые адреса и сотрудники.'''
+        url = reverse('metrics')
+        self.assertEqual(
+            self.client.get(url, REMOTE_ADDR='203.0.113.5').status_code, 403
+        )
+        staff = User.objects.create_user(username='metrics_staff', is_staff=True)
+        self.client.force_login(staff)
+        self.assertEqual(
+            self.client.get(url, REMOTE_ADDR='203.0.113.5').status_code, 200
+        )
+
+    def test_cache_kind(self):
+        '''Проверяем вид ключа кеша для меток.'''
+        self.assertEqual(cache_kind(':1:feed:page:abc'), 'feed:page')
+        self.assertEqual(
+            cache_kind(cache.make_key(f'{CARD_PREFIX}12:abc')), 'post:card'
+        )
+        self.assertEqual(
+            cache_kind(':1:sorl-thumbnail||image||abc'), 'sorl-thumbnail'
+        )
@@ -0,0 +1,58 @@
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from core.slow_queries import fingerprint
+from posts.models import Post, User
+
+
+class TestSlowQueries(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='slow')
+        Post.objects.create(author=cls.user, text='Медленный пост')
+
+    def test_slow_query_logged_with_plan_and_view(self):
+        '''Проверяем, что медленный запрос пишется с планом, view и стеком.'''
+        with override_settings(SLOW_QUERY_MS=0, SLOW_QUERY_STACK_RATE=1):
+            with self.assertLogs('yatube.slow_queries') as logs:
+                self.client.get(
+                    reverse('posts:profile', args=[self.user.username])
+                )
+        entries = [json.loads(record.getMessage()) for record in logs.records]
+        select = next(
+            entry for entry in entries
+            if entry['sql'].startswith('SELECT')
+            and 'posts_post' in entry['sql']
+        )
+        self.assertEqual(select['view'], 'posts.views.profile')
+        self.assertTrue(select['plan'])
+        self.assertTrue(
+            any(frame.startswith('posts/') for frame in select['stack'])
+        )
+
+    def test_slow_queries_report_groups_by_fingerprint(self):
+        '''Проверяем, что отчёт сводит IN-списки разной длины в одну группу.'''
+        short = 'SELECT * FROM posts_post WHERE id IN (%s, %s)'
+        long = 'SELECT * FROM posts_post WHERE id IN (%s, %s, %s)'
+        self.assertEqual(fingerprint(short), fingerprint(long))
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'slow_queries.log')
+        with open(path, 'w', encoding='utf-8') as file:
+            for number, sql in enumerate((short, long, 'SELECT 1')):
+                file.write(json.dumps({
+                    'ms': 100 + number, 'sql': sql, 'view': None,
+                    'fingerprint': fingerprint(sql), 'plan': None,
+                }) + '\n')
+        out = StringIO()
+        call_command('slow_queries', file=path, json=True, stdout=out)
+        groups = json.loads(out.getvalue())
+        self.assertEqual([group['count'] for group in groups], [2, 1])
@@ -0,0 +1,30 @@
+import json
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+
+class TestServerTiming(TestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def test_server_timing_header_and_log(self):
+        '''Проверяем заголовок Server-Timing и строку лога с именем view.'''
+        with self.assertLogs('yatube.timing', 'INFO') as logs:
+            response = self.client.get(reverse('posts:index'))
+        header = response['Server-Timing']
+        for metric in ('db;dur=', 'tpl;dur=', 'cache;dur=', 'total;dur='):
+            self.assertIn(metric, header)
+        self.assertRegex(header, r'cache;dur=[\d.]+;desc="\d+ hit \d+ miss"')
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record['view'], 'posts:index')
+        self.assertEqual(record['status'], 200)
+        self.assertGreater(record['db']['count'], 0)
+
+    @override_settings(SERVER_TIMING=False)
+    def test_server_timing_disabled(self):
+        '''Проверяем, что при SERVER_TIMING=False заголовка нет.'''
+        response = self.client.get(reverse('posts:index'))
+        self.assertFalse(response.has_header('Server-Timing'))
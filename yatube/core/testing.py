@@ -0,0 +1,69 @@
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.test import override_settings
+from django.test.runner import DiscoverRunner
+
+from core import metrics, slow_queries
+
+
+def _point_log(handler, path):
+    # Обработчик открывает файл лениво (delay), поэтому достаточно
+    # закрыть текущий и сменить имя.
+    handler.close()
+    handler.baseFilename = os.path.abspath(path)
+
+
+@contextmanager
+def temporary_runtime_files():
+    """
+    Кеш, метрики и журнал медленных запросов во временном каталоге:
+    прогон тестов не трогает файлы рабочей копии, куда бы они ни
+    указывали (в том числе через YATUBE_*_PATH).
+    """
+    directory = tempfile.mkdtemp(prefix="yatube-test-")
+    cache = dict(
+        settings.CACHES["default"],
+        LOCATION=os.path.join(directory, "cache.sqlite3"),
+    )
+    log = os.path.join(directory, "slow_queries.log")
+    handlers = [
+        handler
+        for handler in slow_queries.logger.handlers
+        if hasattr(handler, "baseFilename")
+    ]
+    previous = [handler.baseFilename for handler in handlers]
+    try:
+        with override_settings(
+            CACHES={**settings.CACHES, "default": cache},
+            METRICS_PATH=os.path.join(directory, "metrics.sqlite3"),
+            SLOW_QUERY_LOG=log,
+        ):
+            for handler in handlers:
+                _point_log(handler, log)
+            try:
+                yield directory
+            finally:
+                # Иначе накопленное в процессе допишет в файл рабочей
+                # копии atexit, когда настройки уже вернутся.
+                metrics.registry.flush()
+    finally:
+        for handler, path in zip(handlers, previous):
+            _point_log(handler, path)
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+class TemporaryFilesRunner(DiscoverRunner):
+    """manage.py test с файлами прогона из temporary_runtime_files."""
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._runtime_files = temporary_runtime_files()
+        self._runtime_files.__enter__()
+
+    def teardown_test_environment(self, **kwargs):
+        self._runtime_files.__exit__(None, None, None)
+        super().teardown_test_environment(**kwargs)
@@ -0,0 +1,159 @@
+import contextvars
+import json
+import logging
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connection
+from django.template.backends.django import DjangoTemplates, Template
+
+
+logger = logging.getLogger("yatube.timing")
+
+_current = contextvars.ContextVar("request_timings", default=None)
+
+# Фазы в порядке вывода в Server-Timing.
+PHASES = ("db", "tpl", "cache", "thumb")
+
+
+class RequestTimings:
+    """Счётчики и суммарное время фаз одного запроса."""
+
+    def __init__(self, request=None):
+        self.request = request
+        self.started = time.perf_counter()
+        self.phases = {}
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def add(self, name, seconds, count=1):
+        total = self.phases.setdefault(name, [0, 0.0])
+        total[0] += count
+        total[1] += seconds
+
+    def header(self):
+        """Значение заголовка Server-Timing."""
+        metrics = []
+        for name in PHASES:
+            if name not in self.phases:
+                continue
+            count, seconds = self.phases[name]
+            description = str(count)
+            if name == "cache":
+                description = (
+                    f"{self.cache_hits} hit {self.cache_misses} miss"
+                )
+            metrics.append(
+                f'{name};dur={seconds * 1000:.1f};desc="{description}"'
+            )
+        total = time.perf_counter() - self.started
+        metrics.append(f"total;dur={total * 1000:.1f}")
+        return ", ".join(metrics)
+
+    def as_dict(self):
+        data = {
+            name: {"count": count, "ms": round(seconds * 1000, 2)}
+            for name, (count, seconds) in self.phases.items()
+        }
+        data["cache_hits"] = self.cache_hits
+        data["cache_misses"] = self.cache_misses
+        data["total_ms"] = round(
+            (time.perf_counter() - self.started) * 1000, 2
+        )
+        return data
+
+
+def current():
+    """Замеры текущего запроса или None вне запроса."""
+    return _current.get()
+
+
+def add(name, seconds, count=1):
+    timings = _current.get()
+    if timings is not None:
+        timings.add(name, seconds, count)
+
+
+def record_cache(seconds, hits=0, misses=0):
+    timings = _current.get()
+    if timings is not None:
+        timings.add("cache", seconds)
+        timings.cache_hits += hits
+        timings.cache_misses += misses
+
+
+@contextmanager
+def phase(name):
+    """Засекает время блока как фазу name текущего запроса."""
+    if _current.get() is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        add(name, time.perf_counter() - started)
+
+
+def time_query(execute, sql, params, many, context):
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        add("db", time.perf_counter() - started)
+
+
+class ServerTimingMiddleware:
+    """
+    Меряет фазы запроса и отдаёт их в заголовке Server-Timing и одной
+    JSON-строкой в логе yatube.timing. Время SQL считает обёртка
+    execute_wrapper, шаблонов — TimedDjangoTemplates, кеша —
+    core.cache.SQLiteCache, миниатюр — posts.thumbnails; все они
+    пишут в contextvar запроса, поэтому накладные расходы сводятся
+    к паре вызовов perf_counter на операцию.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timings = RequestTimings(request)
+        token = _current.set(timings)
+        try:
+            with connection.execute_wrapper(time_query):
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        if not settings.SERVER_TIMING:
+            return response
+        response["Server-Timing"] = timings.header()
+        match = getattr(request, "resolver_match", None)
+        logger.info(json.dumps(
+            {
+                "view": match.view_name if match else None,
+                "method": request.method,
+                "path": request.path,
+                "status": response.status_code,
+                **timings.as_dict(),
+            },
+            ensure_ascii=False,
+        ))
+        return response
+
+
+class TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        with phase("tpl"):
+            return super().render(context, request)
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """Бэкенд шаблонов Django, время отрисовки которого идёт в фазу tpl."""
+
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        template = super().get_template(template_name)
+        return TimedTemplate(template.template, self)
@@ -1,7 +1,23 @@
+from django.conf import settings
+from django.core.exceptions import PermissionDenied
+from django.http import HttpResponse
 from django.shortcuts import render
 
+from core.metrics import registry
+
+
 def page_not_found(request, exception):
     return render(request, 'core/404.html', {'path': request.path}, status=404)
 
 def csrf_failure(request, reason=''):
-    return render(request, 'core/403csrf.html')
\ No newline at end of file
+    return render(request, 'core/403csrf.html')
+
+def metrics(request):
+    # Счётчики по view и статусам видны только сборщику метрик
+    # с адресов METRICS_ALLOWED_IPS и сотрудникам.
+    allowed = request.META.get("REMOTE_ADDR") in settings.METRICS_ALLOWED_IPS
+    if not (allowed or request.user.is_staff):
+        raise PermissionDenied
+    return HttpResponse(
+        registry.collect(), content_type="text/plain; version=0.0.4"
+    )
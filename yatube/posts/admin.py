@@ -1,5 +1,7 @@
 from django.contrib import admin
+from django.db.models.expressions import RawSQL
 
+from . import search
 from .models import Group, Post
 
 
@@ -10,6 +12,14 @@ class PostAdmin(admin.ModelAdmin):
     list_editable = ("group",)
     empty_value_display = "-пусто-"
 
+    def get_search_results(self, request, queryset, search_term):
+        # Вместо LIKE '%term%' по всей таблице ищем по индексу FTS5.
+        if not search.match_query(search_term) or not search.is_supported():
+            return super().get_search_results(request, queryset, search_term)
+        return queryset.filter(
+            pk__in=RawSQL(*search.matching_ids_sql(search_term))
+        ), False
+
 
 admin.site.register(Post, PostAdmin)
 admin.site.register(Group)
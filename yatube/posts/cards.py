@@ -0,0 +1,54 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from .thumbnails import attach_thumbnails
+
+
+CARD_TEMPLATE = "posts/includes/post.html"
+CARD_PREFIX = "post:card:"
+
+
+def card_version(post):
+    """
+    Версия карточки: время последнего сохранения поста, имя автора
+    и адрес миниатюры, которые выводятся в карточке. Любая правка
+    через save() меняет updated, а готовая миниатюра сменяет
+    заглушку, поэтому старый фрагмент просто перестаёт находиться.
+    """
+    author = post.author
+    thumbnail = getattr(post, "thumbnail", None)
+    raw = "%s|%s|%s" % (
+        post.updated.isoformat(),
+        author.get_full_name() or author.username,
+        thumbnail.url if thumbnail else "",
+    )
+    return hashlib.md5(raw.encode()).hexdigest()
+
+
+def card_key(post):
+    return "%s%s:%s" % (CARD_PREFIX, post.pk, card_version(post))
+
+
+def attach_cards(page_obj):
+    """
+    Раскладывает по постам страницы готовый HTML карточки в card_html.
+    Фрагменты читаются одним get_many, отсутствующие рендерятся
+    и сохраняются одним set_many.
+    """
+    posts = attach_thumbnails(list(page_obj))
+    keys = {post.pk: card_key(post) for post in posts}
+    found = cache.get_many(list(keys.values()))
+    missing = {}
+    for post in posts:
+        html = found.get(keys[post.pk])
+        if html is None:
+            html = render_to_string(CARD_TEMPLATE, {"post": post})
+            missing[keys[post.pk]] = html
+        post.card_html = mark_safe(html)
+    if missing:
+        cache.set_many(missing, settings.POST_CARD_CACHE_TIMEOUT)
+    return page_obj
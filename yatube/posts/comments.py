@@ -0,0 +1,35 @@
+from .models import Comment, Post
+from .paginators import CursorPaginator
+
+
+COMMENTS_PER_PAGE = 20
+COMMENTS_ORDERING = ("pub_date", "id")
+
+
+def comments_page(post_id, after=None):
+    """
+    Страница комментариев поста от старых к новым по курсору after:
+    один запрос с JOIN автора по индексу (post, pub_date), сколько бы
+    комментариев ни набрал пост.
+    """
+    comments = (
+        Comment.objects.filter(post_id=post_id)
+        .select_related("author")
+        .order_by(*COMMENTS_ORDERING)
+    )
+    return CursorPaginator(
+        comments, COMMENTS_PER_PAGE, ordering=COMMENTS_ORDERING
+    ).get_page(after=after)
+
+
+def on_first_page(post_id):
+    """
+    Попадает ли новый комментарий в первую страницу, которая выводится
+    на странице поста. Комментарии идут от старых к новым, поэтому
+    новый виден там, только пока страница не заполнена, а следующий
+    за ней лишь добавляет ссылку на продолжение. Счётчик уже учитывает
+    новый комментарий: сигнал счётчика подключён раньше.
+    """
+    return Post.objects.filter(
+        pk=post_id, comments_count__lte=COMMENTS_PER_PAGE + 1
+    ).exists()
@@ -0,0 +1,135 @@
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import (
+    Comment, Follow, Group, Post, SiteCounters, User, UserCounters
+)
+
+
+SITE_COUNTERS_PK = 1
+USER_COUNTERS = {
+    "posts_count": (Post, "author"),
+    "followers_count": (Follow, "author"),
+    "following_count": (Follow, "user"),
+}
+
+
+def _count_of(model, field):
+    """Подзапрос COUNT(*) строк model, где field ссылается на внешний pk."""
+    return Coalesce(
+        Subquery(
+            model.objects.filter(**{field: OuterRef("pk")})
+            .order_by()
+            .values(field)
+            .annotate(total=Count("*"))
+            .values("total")
+        ),
+        0,
+    )
+
+
+def recount_users(user_ids):
+    """Пересчитывает счётчики пользователей точными COUNT."""
+    users = User.objects.filter(pk__in=user_ids).annotate(
+        **{name: _count_of(*source) for name, source in USER_COUNTERS.items()}
+    ).values("pk", *USER_COUNTERS)
+    rows = [
+        UserCounters(
+            user_id=user["pk"],
+            **{name: user[name] for name in USER_COUNTERS},
+        )
+        for user in users
+    ]
+    existing = set(
+        UserCounters.objects.filter(
+            user_id__in=[row.user_id for row in rows]
+        ).values_list("user_id", flat=True)
+    )
+    UserCounters.objects.bulk_update(
+        [row for row in rows if row.user_id in existing], list(USER_COUNTERS)
+    )
+    UserCounters.objects.bulk_create(
+        [row for row in rows if row.user_id not in existing],
+        ignore_conflicts=True,
+    )
+    return len(rows)
+
+
+def recount_posts(post_ids):
+    """Пересчитывает число комментариев у постов одним UPDATE."""
+    return Post.objects.filter(pk__in=post_ids).update(
+        comments_count=_count_of(Comment, "post")
+    )
+
+
+def recount_groups(group_ids):
+    """Пересчитывает число постов в группах одним UPDATE."""
+    return Group.objects.filter(pk__in=group_ids).update(
+        posts_count=_count_of(Post, "group")
+    )
+
+
+def recount_site():
+    """Пересчитывает счётчики сайта точным COUNT."""
+    counters, _ = SiteCounters.objects.update_or_create(
+        pk=SITE_COUNTERS_PK,
+        defaults={"posts_count": Post.objects.order_by().count()},
+    )
+    return counters
+
+
+def increment(user_id, field, delta=1):
+    """
+    Атомарно меняет счётчик пользователя. Строка счётчиков создаётся
+    лениво точным пересчётом при первом увеличении или чтении.
+    """
+    counters = UserCounters.objects.filter(user_id=user_id)
+    if delta < 0:
+        counters = counters.filter(**{f"{field}__gte": -delta})
+    updated = counters.update(**{field: F(field) + delta})
+    if not updated and delta > 0:
+        if not UserCounters.objects.filter(user_id=user_id).exists():
+            recount_users([user_id])
+
+
+def increment_comments(post_id, delta=1):
+    posts = Post.objects.filter(pk=post_id)
+    if delta < 0:
+        posts = posts.filter(comments_count__gte=-delta)
+    posts.update(comments_count=F("comments_count") + delta)
+
+
+def increment_group(group_id, delta=1):
+    groups = Group.objects.filter(pk=group_id)
+    if delta < 0:
+        groups = groups.filter(posts_count__gte=-delta)
+    groups.update(posts_count=F("posts_count") + delta)
+
+
+def increment_site(field, delta=1):
+    """
+    Атомарно меняет счётчик сайта; отсутствующая строка создаётся
+    точным пересчётом, который уже учитывает текущее изменение.
+    """
+    counters = SiteCounters.objects.filter(pk=SITE_COUNTERS_PK)
+    if delta < 0:
+        counters = counters.filter(**{f"{field}__gte": -delta})
+    updated = counters.update(**{field: F(field) + delta})
+    if not updated and delta > 0:
+        if not SiteCounters.objects.filter(pk=SITE_COUNTERS_PK).exists():
+            recount_site()
+
+
+def for_site():
+    """Счётчики сайта; отсутствующая строка пересчитывается."""
+    counters = SiteCounters.objects.filter(pk=SITE_COUNTERS_PK).first()
+    return counters or recount_site()
+
+
+def for_user(user):
+    """Счётчики пользователя; отсутствующая строка пересчитывается."""
+    try:
+        return user.counters
+    except UserCounters.DoesNotExist:
+        recount_users([user.pk])
+        return UserCounters.objects.get(user_id=user.pk)
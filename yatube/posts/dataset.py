@@ -0,0 +1,64 @@
+from collections import namedtuple
+
+from .models import Comment, Follow, Group, Post
+from .paginators import keyset_filter
+
+
+# Описание выгружаемой таблицы: имя файла, модель, колонки выгрузки
+# (имя в файле -> lookup для values()) и ключ порядка чтения.
+Table = namedtuple("Table", "name model columns ordering")
+
+TABLES = [
+    Table(
+        "groups",
+        Group,
+        {"id": "id", "title": "title", "slug": "slug",
+         "description": "description"},
+        ("id",),
+    ),
+    Table(
+        "posts",
+        Post,
+        {"id": "id", "pub_date": "pub_date", "author": "author__username",
+         "group": "group__slug", "text": "text", "image": "image"},
+        ("pub_date", "id"),
+    ),
+    Table(
+        "comments",
+        Comment,
+        {"id": "id", "pub_date": "pub_date", "post": "post_id",
+         "author": "author__username", "text": "text"},
+        ("pub_date", "id"),
+    ),
+    Table(
+        "follows",
+        Follow,
+        {"id": "id", "user": "user__username", "author": "author__username"},
+        ("id",),
+    ),
+]
+
+
+def stream_rows(table, since=None, batch_size=1000):
+    """
+    Отдаёт строки таблицы словарями пачками по ключу table.ordering:
+    каждая пачка — отдельный запрос по индексу с LIMIT, продолжающий
+    предыдущую, поэтому память не зависит от размера таблицы.
+    С since читаются только строки с pub_date новее since.
+    """
+    queryset = table.model.objects.order_by(*table.ordering)
+    if since is not None and "pub_date" in table.ordering:
+        queryset = queryset.filter(pub_date__gt=since)
+    lookups = list(table.columns.values())
+    keys = [lookups.index(name) for name in table.ordering]
+    last = None
+    while True:
+        batch = queryset
+        if last is not None:
+            batch = batch.filter(keyset_filter(table.ordering, last))
+        rows = list(batch.values_list(*lookups)[:batch_size])
+        if not rows:
+            return
+        for row in rows:
+            yield dict(zip(table.columns, row))
+        last = [rows[-1][index] for index in keys]
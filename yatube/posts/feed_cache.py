@@ -0,0 +1,158 @@
+import datetime
+import functools
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+GENERATION_PREFIX = "feed:gen:"
+PAGE_PREFIX = "feed:page:"
+# Область сдвигается, когда меняется набор pull-авторов.
+PULL_AUTHORS_SCOPE = "pull-authors"
+
+
+def _generation_key(scope):
+    return GENERATION_PREFIX + scope
+
+
+def _fresh_generation():
+    # Поколение — время последнего изменения области в наносекундах:
+    # выпавшее из кеша начинается с текущего времени, чтобы не совпасть
+    # с ключами страниц, закешированных до вытеснения.
+    return time.time_ns()
+
+
+def generations(scopes):
+    """Текущие поколения областей одним get_many."""
+    keys = {_generation_key(scope): scope for scope in scopes}
+    found = cache.get_many(list(keys))
+    result = {}
+    for key, scope in keys.items():
+        if key not in found:
+            fresh = _fresh_generation()
+            cache.add(key, fresh, None)
+            # Кеш, который ничего не хранит (DummyCache), вернёт fresh.
+            found[key] = cache.get(key, fresh)
+        result[scope] = found[key]
+    return result
+
+
+def bump(*scopes):
+    """
+    Сдвигает поколения областей: все страницы, закешированные со
+    старым поколением, перестают находиться без перебора ключей.
+    Новое поколение — текущее время, но всегда больше старого, даже
+    если часы грубые, поэтому оно же служит временем изменения.
+    Возвращает новые поколения по областям.
+    """
+    scopes = set(scopes)
+    now = _fresh_generation()
+    current = cache.get_many([_generation_key(scope) for scope in scopes])
+    bumped = {
+        scope: max(now, current.get(_generation_key(scope), 0) + 1)
+        for scope in scopes
+    }
+    cache.set_many(
+        {_generation_key(scope): value for scope, value in bumped.items()},
+        None,
+    )
+    return bumped
+
+
+def changed_at(scopes):
+    """Время последнего изменения областей по их поколениям."""
+    newest = max(generations(scopes).values())
+    return datetime.datetime.fromtimestamp(
+        newest / 1e9, datetime.timezone.utc
+    )
+
+
+def group_scope(slug):
+    return "group:" + slug
+
+
+def author_scope(username):
+    return "author:" + username
+
+
+def post_scope(post_id):
+    return "post:%s" % post_id
+
+
+def comments_scope(post_id):
+    return "comments:%s" % post_id
+
+
+def reader_scope(user_id):
+    return "reader:%s" % user_id
+
+
+def post_scopes(post):
+    """
+    Области, страницы которых выводят пост: общая лента, профиль
+    автора, страница поста и группа. Ленты подписок кешируются и под
+    "global", поэтому сдвигаются вместе с ней.
+    """
+    scopes = [
+        "global",
+        author_scope(post.author.username),
+        post_scope(post.pk),
+    ]
+    if post.group_id:
+        scopes.append(group_scope(post.group.slug))
+    return scopes
+
+
+def feed_version(request, scopes, kwargs):
+    """
+    Версия ответа ленты: хеш адреса, пользователя и текущих поколений
+    областей scopes. Меняется при любом изменении, которое сдвигает
+    поколения, и вычисляется одним get_many к кешу без запросов к БД.
+    """
+    # Условный GET и кеш страницы спрашивают версию у одного запроса
+    # дважды, поэтому она запоминается на объекте запроса.
+    versions = request.__dict__.setdefault("_feed_versions", {})
+    if scopes not in versions:
+        user = request.user.pk or "anon"
+        names = [scope.format(user=user, **kwargs) for scope in scopes]
+        current = generations(names)
+        raw = "|".join(
+            [request.get_full_path(), str(user)]
+            + ["%s=%s" % (name, current[name]) for name in names]
+        )
+        versions[scopes] = hashlib.md5(raw.encode()).hexdigest()
+    return versions[scopes]
+
+
+def feed_etag(*scopes):
+    """etag_func для django.views.decorators.http.condition."""
+    def etag(request, *args, **kwargs):
+        return feed_version(request, scopes, kwargs)
+
+    return etag
+
+
+def cache_feed(*scopes):
+    """
+    Кеширует GET-ответ ленты под ключом, в который входят поколения
+    областей scopes. Области — шаблоны строк, которые заполняются
+    аргументами view и id пользователя: "group:{slug}", "reader:{user}".
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ("GET", "HEAD"):
+                return view(request, *args, **kwargs)
+            key = PAGE_PREFIX + feed_version(request, scopes, kwargs)
+            response = cache.get(key)
+            if response is None:
+                response = view(request, *args, **kwargs)
+                if response.status_code == 200:
+                    cache.set(key, response, settings.FEED_CACHE_TIMEOUT)
+            return response
+
+        return wrapper
+
+    return decorator
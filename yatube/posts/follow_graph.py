@@ -0,0 +1,130 @@
+import threading
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict, namedtuple
+
+from django.conf import settings
+from django.db.models import Exists, OuterRef
+
+from . import feed_cache
+from .models import Follow, PullAuthor
+
+
+Entry = namedtuple("Entry", "generation pull_generation following pull")
+
+
+def _contains(ids, value):
+    index = bisect_left(ids, value)
+    return index < len(ids) and ids[index] == value
+
+
+def _toggled(ids, value, present):
+    """Копия отсортированного массива ids с value или без него."""
+    if _contains(ids, value) == present:
+        return ids
+    ids = array("q", ids)
+    index = bisect_left(ids, value)
+    if present:
+        ids.insert(index, value)
+    else:
+        del ids[index]
+    return ids
+
+
+class FollowGraph:
+    """
+    Ограниченный LRU подписок в памяти процесса: id пользователя ->
+    отсортированные массивы id авторов, на которых он подписан, и тех
+    из них, кто читается при запросе (PullAuthor). Проверка подписки —
+    двоичный поиск по массиву без запросов к БД.
+
+    Запись действительна, пока не сдвинулись поколения областей
+    "reader:<id>" и PULL_AUTHORS_SCOPE в общем кеше (posts.feed_cache):
+    так подписка в другом воркере сбрасывает запись и здесь. Подписку
+    в этом процессе сигнал применяет к записи без перечитывания.
+    """
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _load(self, user_id, generation, pull_generation):
+        rows = (
+            Follow.objects.filter(user_id=user_id)
+            .annotate(is_pull=Exists(
+                PullAuthor.objects.filter(author_id=OuterRef("author_id"))
+            ))
+            .order_by("author_id")
+            .values_list("author_id", "is_pull")
+        )
+        following, pull = array("q"), array("q")
+        for author_id, is_pull in rows:
+            following.append(author_id)
+            if is_pull:
+                pull.append(author_id)
+        return Entry(generation, pull_generation, following, pull)
+
+    def _set(self, user_id, entry):
+        self._items[user_id] = entry
+        self._items.move_to_end(user_id)
+        while len(self._items) > self.max_size:
+            self._items.popitem(last=False)
+
+    def _entry(self, user_id):
+        scope = feed_cache.reader_scope(user_id)
+        current = feed_cache.generations(
+            [scope, feed_cache.PULL_AUTHORS_SCOPE]
+        )
+        generation = current[scope]
+        pull_generation = current[feed_cache.PULL_AUTHORS_SCOPE]
+        with self._lock:
+            entry = self._items.get(user_id)
+            if entry is not None:
+                self._items.move_to_end(user_id)
+        if entry is None or (entry.generation, entry.pull_generation) != (
+            generation, pull_generation
+        ):
+            entry = self._load(user_id, generation, pull_generation)
+            with self._lock:
+                self._set(user_id, entry)
+        return entry
+
+    def following(self, user_id):
+        """Отсортированный массив id авторов, на которых подписан user."""
+        return self._entry(user_id).following
+
+    def pull_authors(self, user_id):
+        """Те из авторов подписок user, чьи посты читаются при запросе."""
+        return self._entry(user_id).pull
+
+    def is_following(self, user_id, author_id):
+        return _contains(self._entry(user_id).following, author_id)
+
+    def update(self, user_id, author_id, following, before, after):
+        """
+        Применяет подписку (following=True) или отписку к записи user,
+        если она была действительна при поколении before, и помечает её
+        поколением after, которое выставил сигнал. Массивы копируются,
+        а не меняются на месте: их могут читать другие потоки.
+        """
+        is_pull = following and PullAuthor.objects.filter(
+            author_id=author_id
+        ).exists()
+        with self._lock:
+            entry = self._items.get(user_id)
+            if entry is None or entry.generation != before:
+                self._items.pop(user_id, None)
+                return
+            self._set(user_id, entry._replace(
+                generation=after,
+                following=_toggled(entry.following, author_id, following),
+                pull=_toggled(entry.pull, author_id, is_pull),
+            ))
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+
+graph = FollowGraph(settings.FOLLOW_GRAPH_LRU_SIZE)
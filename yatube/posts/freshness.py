@@ -0,0 +1,81 @@
+import hashlib
+
+from django.middleware.csrf import get_token
+
+from .comments import COMMENTS_PER_PAGE
+from .feed_cache import changed_at, feed_version, post_scope
+from .models import Post
+
+
+def _latest(*moments):
+    return max(moment for moment in moments if moment is not None)
+
+
+def feed_last_modified(scope, field):
+    """
+    last_modified_func для condition(): время новейшего поста ленты
+    (один проход по индексу (field, pub_date) с LIMIT 1) или время
+    последнего изменения области scope, если оно позже. Правка поста
+    не меняет pub_date, но сдвигает поколение области сигналом.
+    Значение для field берётся из аргумента URL с именем его последней
+    части: group__slug — из slug.
+    """
+    def last_modified(request, **kwargs):
+        newest = (
+            Post.objects.filter(**{field: kwargs[field.split("__")[-1]]})
+            .order_by("-pub_date")
+            .values_list("pub_date", flat=True)
+            .first()
+        )
+        return _latest(newest, changed_at([scope.format(**kwargs)]))
+
+    return last_modified
+
+
+def post_state(request, post_id):
+    """
+    Одним запросом по первичному ключу: время правки поста, число
+    комментариев в пределах первой страницы, которая выводится на
+    странице поста, и число постов автора для счётчика. Комментарии
+    за первой страницей состояние не меняют. Результат запоминается
+    на запросе: condition() спрашивает и ETag, и Last-Modified.
+    """
+    states = request.__dict__.setdefault("_post_states", {})
+    if post_id not in states:
+        state = (
+            Post.objects.filter(pk=post_id)
+            .values_list(
+                "updated", "comments_count", "author__counters__posts_count"
+            )
+            .first()
+        )
+        if state is not None:
+            updated, comments_count, posts_count = state
+            shown = min(comments_count, COMMENTS_PER_PAGE + 1)
+            state = (updated, shown, posts_count)
+        states[post_id] = state
+    return states[post_id]
+
+
+def post_last_modified(request, post_id):
+    # Комментарий на первой странице сдвигает область поста сигналом,
+    # поэтому его время входит в changed_at.
+    state = post_state(request, post_id)
+    if state is None:
+        return None
+    return _latest(state[0], changed_at([post_scope(post_id)]))
+
+
+def post_etag(request, post_id):
+    # На странице форма комментария с токеном CSRF: login() меняет
+    # токен, и закешированная браузером страница с прежним ломала бы
+    # отправку формы. get_token выдаёт токен, если его ещё нет.
+    state = post_state(request, post_id)
+    if state is None:
+        return None
+    get_token(request)
+    version = feed_version(request, ("post:{post_id}",), {"post_id": post_id})
+    raw = "|".join(
+        map(str, (version, request.META["CSRF_COOKIE"], *state))
+    )
+    return hashlib.md5(raw.encode()).hexdigest()
@@ -0,0 +1,224 @@
+import datetime
+import json
+import random
+import time
+from io import StringIO
+
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import (
+    CaptureQueriesContext,
+    override_settings,
+    setup_test_environment,
+    teardown_test_environment,
+)
+from django.utils import timezone
+
+from posts import feed_cache, timeline
+from posts.models import Follow, Post, PullAuthor, User
+from posts.paginators import CursorPaginator
+
+from .bench_views import CACHES, percentile
+
+
+PAGE_SIZE = 10
+# Граница прохода индекса дат в режиме stale: за каждым из первых
+# постов ленты столько же чужих постов, и проход уступает слиянию.
+STALE_WALK_ROWS = 100
+
+
+class Command(BaseCommand):
+    help = (
+        "Замеряет ленту подписок читателей, подписанных на разное число "
+        "авторов (во временной тестовой БД): первая страница и страница "
+        "по курсору для раскладки по лентам (push), для pull-авторов "
+        "и для pull-авторов, давно не писавших (stale). Время и число "
+        "запросов должны не зависеть от числа подписок."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--follows",
+            default="10,100,1000,10000",
+            help="Числа подписок читателей через запятую.",
+        )
+        parser.add_argument(
+            "--posts-per-author",
+            type=int,
+            default=5,
+            help="Сколько постов у каждого автора.",
+        )
+        parser.add_argument(
+            "--repeat",
+            type=int,
+            default=50,
+            help="Сколько раз запрашивать каждую страницу.",
+        )
+        parser.add_argument("--output", help="Файл для результатов в JSON.")
+        parser.add_argument("--seed", type=int, default=2023)
+
+    def handle(self, *args, **options):
+        follows = [int(count) for count in options["follows"].split(",")]
+        results = []
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(
+            verbosity=0, autoclobber=True
+        )
+        try:
+            # Граф подписок проверяет поколения в кеше, поэтому нужен
+            # кеш, который их хранит; страницы лент здесь не кешируются.
+            with override_settings(CACHES=CACHES["warm"]):
+                call_command("flush", interactive=False, verbosity=0)
+                readers = self.seed(
+                    follows, options["posts_per_author"], options["seed"]
+                )
+                for mode in ("push", "pull", "stale"):
+                    if mode == "pull":
+                        self.make_pull_authors()
+                    if mode == "stale":
+                        self.make_stale(readers.values())
+                    for count in follows:
+                        with override_settings(
+                            **self.mode_settings(mode)
+                        ):
+                            result = self.measure(
+                                readers[count], options["repeat"]
+                            )
+                        result.update(mode=mode, follows=count)
+                        results.append(result)
+                        self.print_result(result)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as file:
+                json.dump(
+                    {"repeat": options["repeat"], "results": results},
+                    file,
+                    ensure_ascii=False,
+                    indent=2,
+                )
+            self.stdout.write(self.style.SUCCESS(
+                f"Результаты записаны в {options['output']}"
+            ))
+
+    def seed(self, follows, posts_per_author, seed):
+        """
+        Авторы с постами вразнобой по времени и по читателю на каждое
+        число подписок. Вставка идёт пачками мимо сигналов, ленты
+        читателей собираются одним rebuild_many.
+        """
+        rng = random.Random(seed)
+        password = make_password(None)
+        authors = max(follows)
+        User.objects.bulk_create(
+            User(username=f"feed_author{number}", password=password)
+            for number in range(authors)
+        )
+        author_ids = list(
+            User.objects.filter(username__startswith="feed_author")
+            .order_by("pk")
+            .values_list("pk", flat=True)
+        )
+        now = timezone.now()
+        span = datetime.timedelta(days=365).total_seconds()
+        Post.objects.bulk_create(
+            (
+                Post(
+                    author_id=author_id,
+                    text="Пост",
+                    pub_date=now - datetime.timedelta(
+                        seconds=rng.uniform(0, span)
+                    ),
+                )
+                for author_id in author_ids
+                for _ in range(posts_per_author)
+            )
+        )
+        call_command("recount", stdout=StringIO())
+        readers = {}
+        for count in follows:
+            reader = User.objects.create_user(username=f"feed_reader{count}")
+            Follow.objects.bulk_create(
+                Follow(user=reader, author_id=author_id)
+                for author_id in rng.sample(author_ids, count)
+            )
+            readers[count] = reader
+        timeline.rebuild_many([reader.pk for reader in readers.values()])
+        return readers
+
+    def make_pull_authors(self):
+        PullAuthor.objects.bulk_create(
+            (
+                PullAuthor(author_id=author_id)
+                for author_id in User.objects.filter(
+                    username__startswith="feed_author"
+                ).values_list("pk", flat=True)
+            )
+        )
+        # Вставка мимо сигналов: граф подписок сбрасывается вручную.
+        feed_cache.bump(feed_cache.PULL_AUTHORS_SCOPE)
+        timeline.rebuild_many(
+            User.objects.filter(
+                username__startswith="feed_reader"
+            ).values_list("pk", flat=True)
+        )
+
+    def make_stale(self, readers):
+        """
+        За каждым из первых постов ленты читателя — STALE_WALK_ROWS
+        постов автора без подписчиков: подписки давно не писали, проход
+        индекса дат не набирает страницу, и обе страницы собирает
+        слияние по всем pull-авторам читателя.
+        """
+        noise = User.objects.create_user(username="feed_noise")
+        posts = []
+        for reader in readers:
+            for post in timeline.feed(reader)[:2 * PAGE_SIZE + 1]:
+                posts.extend(
+                    Post(
+                        author=noise,
+                        text="Пост",
+                        pub_date=post.pub_date - datetime.timedelta(
+                            microseconds=number + 1
+                        ),
+                    )
+                    for number in range(STALE_WALK_ROWS)
+                )
+        Post.objects.bulk_create(posts, batch_size=timeline.BATCH_SIZE)
+
+    def mode_settings(self, mode):
+        if mode == "stale":
+            return {"TIMELINE_WALK_ROWS": STALE_WALK_ROWS}
+        return {}
+
+    def pages(self, reader):
+        paginator = CursorPaginator(timeline.feed(reader), PAGE_SIZE)
+        first = paginator.page()
+        second = paginator.page(after=first.next_cursor)
+        return len(first) + len(second)
+
+    def measure(self, reader, repeat):
+        self.pages(reader)
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            rows = self.pages(reader)
+            timings.append((time.perf_counter() - started) * 1000)
+        with CaptureQueriesContext(connection) as queries:
+            self.pages(reader)
+        return {
+            "rows": rows,
+            "p50_ms": round(percentile(timings, 0.50), 3),
+            "p95_ms": round(percentile(timings, 0.95), 3),
+            "queries": len(queries),
+        }
+
+    def print_result(self, result):
+        self.stdout.write(
+            "{mode:<5} {follows:>6} подписок  p50 {p50_ms:>8.2f} мс  "
+            "p95 {p95_ms:>8.2f} мс  {queries:>3} запр.  "
+            "{rows:>3} постов".format(**result)
+        )
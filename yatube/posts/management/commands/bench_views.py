@@ -0,0 +1,178 @@
+import json
+import math
+import platform
+import time
+import tracemalloc
+from io import StringIO
+
+import django
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import (
+    CaptureQueriesContext,
+    override_settings,
+    setup_test_environment,
+    teardown_test_environment,
+)
+from django.urls import reverse
+
+from posts.models import Group, Post, User
+
+
+CACHES = {
+    "cold": {"default": {
+        "BACKEND": "django.core.cache.backends.dummy.DummyCache",
+    }},
+    "warm": {"default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "bench_views",
+    }},
+}
+
+
+def percentile(values, share):
+    """Перцентиль по методу ближайшего ранга."""
+    ordered = sorted(values)
+    rank = max(math.ceil(share * len(ordered)), 1)
+    return ordered[rank - 1]
+
+
+def bench_cases():
+    """
+    Страницы для замера на текущих данных: самые большие группа,
+    профиль, обсуждение и лента подписок, плюс глубокая страница
+    главной, где OFFSET-пагинация дороже всего.
+    """
+    group = Group.objects.annotate(total=Count("posts")).order_by(
+        "-total"
+    ).first()
+    author = User.objects.annotate(total=Count("posts")).order_by(
+        "-total"
+    ).first()
+    post = Post.objects.order_by("-comments_count", "-pk").first()
+    reader = User.objects.annotate(total=Count("follower")).order_by(
+        "-total"
+    ).first()
+    last_page = max(math.ceil(Post.objects.count() / 10), 1)
+    cases = [
+        ("index", reverse("posts:index"), None),
+        ("index_last_page", reverse("posts:index") + f"?page={last_page}",
+         None),
+    ]
+    if group:
+        cases.append(("group_posts", reverse(
+            "posts:group_list", kwargs={"slug": group.slug}
+        ), None))
+    if author:
+        cases.append(("profile", reverse(
+            "posts:profile", kwargs={"username": author.username}
+        ), None))
+    if post:
+        cases.append(("post_detail", reverse(
+            "posts:post_detail", kwargs={"post_id": post.pk}
+        ), None))
+    if reader:
+        cases.append(("follow_index", reverse("posts:follow_index"), reader))
+    return cases
+
+
+class Command(BaseCommand):
+    help = (
+        "Замеряет ленты через тестовый клиент на наборах данных разного "
+        "размера (seed_bench во временной тестовой БД): p50/p95/p99 "
+        "времени ответа, число запросов, пиковую память и размер ответа. "
+        "Результат сохраняется в JSON, чтобы прогоны можно было сравнить."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sizes",
+            default="1000,10000",
+            help="Размеры наборов данных (число постов) через запятую.",
+        )
+        parser.add_argument(
+            "--repeat",
+            type=int,
+            default=50,
+            help="Сколько раз запрашивать каждую страницу.",
+        )
+        parser.add_argument("--cache", choices=sorted(CACHES), default="cold")
+        parser.add_argument("--output", help="Файл для результатов в JSON.")
+        parser.add_argument("--seed", type=int, default=2023)
+
+    def handle(self, *args, **options):
+        sizes = [int(size) for size in options["sizes"].split(",")]
+        results = []
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(
+            verbosity=0, autoclobber=True
+        )
+        try:
+            with override_settings(CACHES=CACHES[options["cache"]]):
+                for size in sizes:
+                    call_command("flush", interactive=False, verbosity=0)
+                    call_command(
+                        "seed_bench", posts=size, seed=options["seed"],
+                        stdout=StringIO(),
+                    )
+                    for name, url, user in bench_cases():
+                        result = self.measure(url, user, options["repeat"])
+                        result.update(size=size, view=name, url=url)
+                        results.append(result)
+                        self.print_result(result)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+        if options["output"]:
+            report = {
+                "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "python": platform.python_version(),
+                "django": django.get_version(),
+                "cache": options["cache"],
+                "repeat": options["repeat"],
+                "results": results,
+            }
+            with open(options["output"], "w", encoding="utf-8") as file:
+                json.dump(report, file, ensure_ascii=False, indent=2)
+            self.stdout.write(self.style.SUCCESS(
+                f"Результаты записаны в {options['output']}"
+            ))
+
+    def measure(self, url, user, repeat):
+        client = Client()
+        if user is not None:
+            client.force_login(user)
+        response = client.get(url)
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            client.get(url)
+            timings.append((time.perf_counter() - started) * 1000)
+        # Запросы и память меряются отдельным прогоном, чтобы
+        # tracemalloc не искажал время ответа.
+        with CaptureQueriesContext(connection) as queries:
+            tracemalloc.start()
+            client.get(url)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        return {
+            "status": response.status_code,
+            "p50_ms": round(percentile(timings, 0.50), 3),
+            "p95_ms": round(percentile(timings, 0.95), 3),
+            "p99_ms": round(percentile(timings, 0.99), 3),
+            "queries": len(queries),
+            "peak_kb": round(peak / 1024, 1),
+            "bytes": len(response.content),
+        }
+
+    def print_result(self, result):
+        self.stdout.write(
+            "{size:>8} {view:<16} p50 {p50_ms:>8.2f} мс  "
+            "p95 {p95_ms:>8.2f} мс  p99 {p99_ms:>8.2f} мс  "
+            "{queries:>3} запр.  {peak_kb:>9.1f} КБ  {bytes:>7} Б".format(
+                **result
+            )
+        )
@@ -0,0 +1,125 @@
+import inspect
+import re
+
+from django.contrib.sessions.middleware import SessionMiddleware
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext, override_settings
+
+from posts import views
+from posts.models import Comment, Follow, Group, Post, PullAuthor, User
+from posts.paginators import CursorPaginator
+
+
+FULL_SCAN = re.compile(
+    r"\bSCAN (TABLE )?(?P<table>\w+)\b(?! USING (COVERING )?INDEX)"
+)
+TEMP_SORT = re.compile(r"USE TEMP B-TREE")
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Выполняет ленты из posts.views и проверяет EXPLAIN QUERY PLAN "
+        "каждого запроса: полный проход таблицы или сортировка во "
+        "временном B-дереве считаются ошибкой."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--verbose-plans",
+            action="store_true",
+            help="Печатать планы всех запросов, а не только проблемных.",
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != "sqlite":
+            raise CommandError("Проверка планов поддерживает только SQLite.")
+        problems = []
+        try:
+            with transaction.atomic():
+                for name, queries in self.collect_queries():
+                    for sql in queries:
+                        problems += self.check_plan(
+                            name, sql, options["verbose_plans"]
+                        )
+                raise Rollback
+        except Rollback:
+            pass
+        if problems:
+            raise CommandError(
+                "Запросы без индекса:\n" + "\n".join(problems)
+            )
+        self.stdout.write(self.style.SUCCESS("Все ленты используют индексы."))
+
+    def collect_queries(self):
+        """Вызывает view лент на временных данных и собирает их SQL."""
+        author = User.objects.create_user(username="__plan_author__")
+        reader = User.objects.create_user(username="__plan_reader__")
+        group = Group.objects.create(
+            title="plan", slug="__plan_group__", description="plan"
+        )
+        post = Post.objects.create(text="plan", author=author, group=group)
+        Comment.objects.create(post=post, author=reader, text="plan")
+        Follow.objects.create(user=reader, author=author)
+        # Второй читатель подписан ещё и на pull-автора: его лента
+        # сливается из записей TimelineEntry и постов этого автора.
+        pull_author = User.objects.create_user(username="__plan_pull__")
+        PullAuthor.objects.create(author=pull_author)
+        Post.objects.create(text="plan", author=pull_author)
+        pull_reader = User.objects.create_user(username="__plan_merge__")
+        Follow.objects.create(user=pull_reader, author=author)
+        Follow.objects.create(user=pull_reader, author=pull_author)
+        cursor = CursorPaginator(Post.objects.all(), 1)._cursor_for(post)
+        cases = [
+            ("index", views.index, {}, reader),
+            ("group_posts", views.group_posts, {"slug": group.slug}, reader),
+            ("profile", views.profile, {"username": author.username}, reader),
+            ("post_detail", views.post_detail, {"post_id": post.pk}, reader),
+            (
+                "post_comments",
+                views.post_comments,
+                {"post_id": post.pk},
+                reader,
+            ),
+            ("follow_index", views.follow_index, {}, reader),
+            ("follow_index[pull]", views.follow_index, {}, pull_reader),
+        ]
+        for name, view, kwargs, user in cases:
+            yield from self.capture(name, view, kwargs, user, cursor)
+        # Читатель многих pull-авторов получает их посты одним проходом
+        # индекса дат, а не слиянием по авторам.
+        with override_settings(TIMELINE_MERGE_AUTHORS=0):
+            yield from self.capture(
+                "follow_index[walk]", views.follow_index, {}, pull_reader,
+                cursor,
+            )
+
+    def capture(self, name, view, kwargs, user, cursor):
+        factory = RequestFactory()
+        for query in ("", "?page=2", "?after=" + cursor):
+            request = factory.get("/" + query)
+            SessionMiddleware().process_request(request)
+            request.user = user
+            with CaptureQueriesContext(connection) as captured:
+                inspect.unwrap(view)(request, **kwargs)
+            yield name + query, [
+                item["sql"] for item in captured.captured_queries
+                if item["sql"].lstrip().upper().startswith("SELECT")
+            ]
+
+    def check_plan(self, name, sql, verbose):
+        with connection.cursor() as cursor:
+            cursor.execute("EXPLAIN QUERY PLAN " + sql)
+            plan = [row[-1] for row in cursor.fetchall()]
+        if verbose:
+            self.stdout.write(f"{name}: {sql}\n  " + "\n  ".join(plan))
+        problems = []
+        for step in plan:
+            if FULL_SCAN.search(step) or TEMP_SORT.search(step):
+                problems.append(f"{name}: {step}\n    {sql}")
+        return problems
@@ -0,0 +1,304 @@
+import gzip
+import json
+import os
+import time
+from contextlib import contextmanager
+from itertools import islice
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import DateTimeField, Max
+from django.utils.dateparse import parse_datetime
+
+from posts import counters, feed_cache, search, timeline
+from posts.models import Comment, Follow, Group, Post, User
+
+
+def read_jsonl(directory, name):
+    """Строки файла name.jsonl или name.jsonl.gz по одной."""
+    for filename, opener in (
+        (f"{name}.jsonl.gz", gzip.open),
+        (f"{name}.jsonl", open),
+    ):
+        path = os.path.join(directory, filename)
+        if os.path.exists(path):
+            with opener(path, "rt", encoding="utf-8") as file:
+                for line in file:
+                    if line.strip():
+                        yield json.loads(line)
+            return
+
+
+def chunks(rows, size):
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+@contextmanager
+def keep_dates(*models):
+    """
+    Отключает auto_now и auto_now_add: иначе bulk_create перезаписал
+    бы даты из выгрузки текущим временем.
+    """
+    changed = []
+    for model in models:
+        for field in model._meta.concrete_fields:
+            if isinstance(field, DateTimeField):
+                changed.append((field, field.auto_now, field.auto_now_add))
+                field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in changed:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+@contextmanager
+def deferred_indexes(models, enabled):
+    """
+    Снимает индексы Meta.indexes на время загрузки и строит их заново
+    в конце: один проход по готовой таблице дешевле, чем поддержка
+    B-деревьев на каждой вставке.
+    """
+    if not enabled:
+        yield
+        return
+    indexes = [
+        (model, index) for model in models for index in model._meta.indexes
+    ]
+    with connection.schema_editor() as editor:
+        for model, index in indexes:
+            editor.remove_index(model, index)
+    try:
+        yield
+    finally:
+        with connection.schema_editor() as editor:
+            for model, index in indexes:
+                editor.add_index(model, index)
+
+
+class Importer:
+    """
+    Загрузка выгрузки export_yatube. Авторы и группы находятся через
+    словари в памяти, новые создаются пачками; id постов назначаются
+    подряд после текущего максимума, а id из файла запоминаются для
+    привязки комментариев.
+    """
+
+    def __init__(self, batch_size):
+        self.batch_size = batch_size
+        self.users = dict(User.objects.values_list("username", "pk"))
+        self.groups = dict(Group.objects.values_list("slug", "pk"))
+        self.post_ids = {}
+        self.next_post_id = (
+            Post.objects.aggregate(last=Max("pk"))["last"] or 0
+        ) + 1
+        self.touched_users = set()
+        self.touched_groups = set()
+        self.skipped = 0
+
+    def load(self, rows, build, model, **options):
+        loaded = 0
+        for chunk in chunks(rows, self.batch_size):
+            with transaction.atomic():
+                objects = build(chunk)
+                # Размер INSERT выбирает сам бэкенд: в SQLite он ограничен
+                # числом параметров и термов составного SELECT.
+                model.objects.bulk_create(objects, **options)
+            loaded += len(objects)
+        return loaded
+
+    def resolve_users(self, usernames):
+        missing = {name for name in usernames if name not in self.users}
+        if missing:
+            User.objects.bulk_create(
+                User(username=name, password=make_password(None))
+                for name in missing
+            )
+            self.users.update(
+                User.objects.filter(username__in=missing).values_list(
+                    "username", "pk"
+                )
+            )
+
+    def build_groups(self, rows):
+        new = [row for row in rows if row["slug"] not in self.groups]
+        self.groups.update({row["slug"]: None for row in new})
+        return [
+            Group(
+                title=row["title"],
+                slug=row["slug"],
+                description=row["description"],
+            )
+            for row in new
+        ]
+
+    def build_posts(self, rows):
+        self.resolve_users(row["author"] for row in rows)
+        posts = []
+        for row in rows:
+            pub_date = parse_datetime(row["pub_date"])
+            post = Post(
+                id=self.next_post_id,
+                text=row["text"],
+                author_id=self.users[row["author"]],
+                group_id=self.groups.get(row.get("group")),
+                image=row.get("image") or "",
+                pub_date=pub_date,
+                updated=pub_date,
+            )
+            self.post_ids[row["id"]] = post.id
+            self.next_post_id += 1
+            self.touched_users.add(post.author_id)
+            if row.get("group"):
+                self.touched_groups.add(row["group"])
+            posts.append(post)
+        return posts
+
+    def build_comments(self, rows):
+        self.resolve_users(row["author"] for row in rows)
+        comments = []
+        for row in rows:
+            post_id = self.post_ids.get(row["post"])
+            if post_id is None:
+                self.skipped += 1
+                continue
+            comments.append(Comment(
+                post_id=post_id,
+                author_id=self.users[row["author"]],
+                text=row["text"],
+                pub_date=parse_datetime(row["pub_date"]),
+            ))
+        return comments
+
+    def build_follows(self, rows):
+        self.resolve_users(
+            name for row in rows for name in (row["user"], row["author"])
+        )
+        follows = []
+        for row in rows:
+            follow = Follow(
+                user_id=self.users[row["user"]],
+                author_id=self.users[row["author"]],
+            )
+            self.touched_users.update((follow.user_id, follow.author_id))
+            follows.append(follow)
+        return follows
+
+    def finish(self):
+        """
+        Один раз пересчитывает то, что при вставке по строке обновляли
+        бы сигналы: счётчики, поисковый индекс, ленты и кеш страниц.
+        """
+        user_ids = sorted(self.touched_users)
+        reader_ids = set()
+        scopes = ["global"]
+        scopes += [
+            feed_cache.group_scope(slug) for slug in self.touched_groups
+        ]
+        # Пачки ограничивают и транзакции, и число параметров запроса.
+        for chunk in chunks(user_ids, 500):
+            with transaction.atomic():
+                counters.recount_users(chunk)
+            reader_ids.update(
+                Follow.objects.filter(author_id__in=chunk).values_list(
+                    "user_id", flat=True
+                )
+            )
+            scopes += [
+                feed_cache.author_scope(name)
+                for name in User.objects.filter(pk__in=chunk).values_list(
+                    "username", flat=True
+                )
+            ]
+        for chunk in chunks(sorted(self.post_ids.values()), 500):
+            with transaction.atomic():
+                counters.recount_posts(chunk)
+        for chunk in chunks(sorted(self.touched_groups), 500):
+            counters.recount_groups(
+                Group.objects.filter(slug__in=chunk).values_list(
+                    "pk", flat=True
+                )
+            )
+        counters.recount_site()
+        if search.is_supported():
+            search.rebuild(self.batch_size)
+        for chunk in chunks(sorted(reader_ids), 500):
+            with transaction.atomic():
+                timeline.rebuild_many(chunk)
+        # Подписки вставлены мимо сигналов: граф подписок в памяти
+        # процессов перечитывает читателя по его поколению.
+        scopes += [feed_cache.reader_scope(uid) for uid in reader_ids]
+        feed_cache.bump(*scopes)
+
+
+class Command(BaseCommand):
+    help = (
+        "Загружает выгрузку export_yatube (JSONL, можно .gz) через "
+        "bulk_create большими пачками. Счётчики, поисковый индекс и "
+        "ленты подписок пересобираются один раз в конце."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("input_dir", help="Каталог с файлами выгрузки.")
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=5000,
+            help="Сколько строк вставлять в одной транзакции.",
+        )
+        parser.add_argument(
+            "--defer-indexes",
+            action="store_true",
+            help="Снять индексы постов и комментариев на время загрузки.",
+        )
+
+    def handle(self, *args, **options):
+        directory = options["input_dir"]
+        if not os.path.isdir(directory):
+            raise CommandError(f"Каталог {directory} не найден.")
+        importer = Importer(options["batch_size"])
+        steps = [
+            ("groups", importer.build_groups, Group, {}),
+            ("posts", importer.build_posts, Post, {}),
+            ("comments", importer.build_comments, Comment, {}),
+            ("follows", importer.build_follows, Follow,
+             {"ignore_conflicts": True}),
+        ]
+        started = time.perf_counter()
+        total = 0
+        with keep_dates(Post, Comment), deferred_indexes(
+            [Post, Comment], options["defer_indexes"]
+        ):
+            for name, build, model, extra in steps:
+                step_started = time.perf_counter()
+                loaded = importer.load(
+                    read_jsonl(directory, name), build, model, **extra
+                )
+                if name == "groups":
+                    importer.groups = dict(
+                        Group.objects.values_list("slug", "pk")
+                    )
+                self.report(name, loaded, step_started)
+                total += loaded
+        finish_started = time.perf_counter()
+        importer.finish()
+        self.stdout.write(
+            f"Пересчёт счётчиков, поиска и лент: "
+            f"{time.perf_counter() - finish_started:.1f} с"
+        )
+        if importer.skipped:
+            self.stdout.write(
+                f"Пропущено комментариев без поста: {importer.skipped}"
+            )
+        self.report("всего", total, started, success=True)
+
+    def report(self, name, rows, started, success=False):
+        seconds = max(time.perf_counter() - started, 1e-9)
+        message = f"{name}: {rows} строк, {rows / seconds:,.0f} строк/с"
+        self.stdout.write(self.style.SUCCESS(message) if success else message)
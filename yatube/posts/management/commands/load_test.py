@@ -0,0 +1,359 @@
+import http.client
+import json
+import os
+import random
+import shutil
+import signal
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from http.cookies import SimpleCookie
+from io import StringIO
+from socketserver import ThreadingMixIn
+from urllib.parse import urlencode
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from posts.models import Post, User
+from posts.management.commands.bench_views import percentile
+from yatube.wsgi import application
+
+
+DEFAULT_MIX = (
+    "index=30,group_list=10,profile=10,post_detail=20,follow_index=10,"
+    "add_comment=8,post_create=5,profile_follow=4,profile_unfollow=3"
+)
+# Границы корзин гистограммы времени ответа, мс.
+BUCKETS = [5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000]
+
+
+class ThreadingWSGIServer(ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+class VirtualUser:
+    """
+    Клиент нагрузки: держит cookie сессии и CSRF-токен пользователя
+    и отправляет запросы по HTTP, как браузер.
+    """
+
+    def __init__(self, port, user, session_key):
+        self.port = port
+        self.user = user
+        self.cookies = {"sessionid": session_key}
+
+    def request(self, method, path, data=None):
+        headers = {
+            "Cookie": "; ".join(f"{k}={v}" for k, v in self.cookies.items()),
+        }
+        body = None
+        if data is not None:
+            body = urlencode(data)
+            headers["Content-Type"] = "application/x-www-form-urlencoded"
+            headers["X-CSRFToken"] = self.cookies.get("csrftoken", "")
+        conn = http.client.HTTPConnection("127.0.0.1", self.port, timeout=30)
+        try:
+            conn.request(method, path, body=body, headers=headers)
+            response = conn.getresponse()
+            response.read()
+            for header in response.headers.get_all("Set-Cookie") or []:
+                for name, morsel in SimpleCookie(header).items():
+                    self.cookies[name] = morsel.value
+            return response.status
+        finally:
+            conn.close()
+
+
+class Scenario:
+    """Выбирает действие по весам и строит для него запрос."""
+
+    def __init__(self, mix, post_ids, usernames, group_slugs, rng):
+        self.names = list(mix)
+        self.weights = [mix[name] for name in self.names]
+        self.post_ids = post_ids
+        self.usernames = usernames
+        self.group_slugs = group_slugs
+        self.rng = rng
+
+    def next(self):
+        name = self.rng.choices(self.names, weights=self.weights)[0]
+        return name, getattr(self, name)()
+
+    def index(self):
+        return "GET", reverse("posts:index"), None
+
+    def group_list(self):
+        slug = self.rng.choice(self.group_slugs)
+        return "GET", reverse("posts:group_list", args=[slug]), None
+
+    def profile(self):
+        username = self.rng.choice(self.usernames)
+        return "GET", reverse("posts:profile", args=[username]), None
+
+    def post_detail(self):
+        post_id = self.rng.choice(self.post_ids)
+        return "GET", reverse("posts:post_detail", args=[post_id]), None
+
+    def follow_index(self):
+        return "GET", reverse("posts:follow_index"), None
+
+    def add_comment(self):
+        post_id = self.rng.choice(self.post_ids)
+        url = reverse("posts:add_comment", args=[post_id])
+        return "POST", url, {"text": "Комментарий под нагрузкой"}
+
+    def post_create(self):
+        return "POST", reverse("posts:post_create"), {
+            "text": "Пост под нагрузкой"
+        }
+
+    def profile_follow(self):
+        username = self.rng.choice(self.usernames)
+        return "GET", reverse("posts:profile_follow", args=[username]), None
+
+    def profile_unfollow(self):
+        username = self.rng.choice(self.usernames)
+        return "GET", reverse("posts:profile_unfollow", args=[username]), None
+
+
+class Stats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.statuses = defaultdict(lambda: defaultdict(int))
+
+    def record(self, name, status, milliseconds):
+        with self.lock:
+            self.latencies[name].append(milliseconds)
+            self.statuses[name][status] += 1
+            if status is None or status >= 500:
+                self.errors[name] += 1
+
+    def report(self, seconds):
+        rows = {}
+        for name, timings in sorted(self.latencies.items()):
+            histogram = [0] * (len(BUCKETS) + 1)
+            for value in timings:
+                index = next(
+                    (i for i, bound in enumerate(BUCKETS) if value <= bound),
+                    len(BUCKETS),
+                )
+                histogram[index] += 1
+            rows[name] = {
+                "requests": len(timings),
+                "rps": round(len(timings) / seconds, 1),
+                "error_rate": round(self.errors[name] / len(timings), 4),
+                "statuses": {
+                    str(status): count
+                    for status, count in self.statuses[name].items()
+                },
+                "p50_ms": round(percentile(timings, 0.50), 2),
+                "p95_ms": round(percentile(timings, 0.95), 2),
+                "p99_ms": round(percentile(timings, 0.99), 2),
+                "histogram": dict(zip(
+                    [f"<={bound}ms" for bound in BUCKETS] + ["slower"],
+                    histogram,
+                )),
+            }
+        return rows
+
+
+def parse_mix(text):
+    mix = {}
+    for item in text.split(","):
+        name, _, weight = item.partition("=")
+        if not hasattr(Scenario, name.strip()):
+            raise CommandError(f"Неизвестное действие в --mix: {name}")
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+
+class Command(BaseCommand):
+    help = (
+        "Нагрузочный тест: поднимает yatube.wsgi.application в этом "
+        "процессе под многопоточным или многопроцессным WSGI-сервером "
+        "на временной файловой БД SQLite и проигрывает смесь чтений и "
+        "записей. Печатает пропускную способность, долю ошибок и "
+        "гистограммы времени ответа по именам URL."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--server", choices=["threaded", "prefork"], default="threaded"
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=4,
+            help="Число процессов сервера в режиме prefork.",
+        )
+        parser.add_argument(
+            "--clients", type=int, default=8, help="Параллельных клиентов."
+        )
+        parser.add_argument("--duration", type=float, default=10.0)
+        parser.add_argument("--posts", type=int, default=2000)
+        parser.add_argument("--mix", default=DEFAULT_MIX)
+        parser.add_argument("--seed", type=int, default=2023)
+        parser.add_argument("--output", help="Файл для результатов в JSON.")
+
+    def handle(self, *args, **options):
+        mix = parse_mix(options["mix"])
+        directory = tempfile.mkdtemp(prefix="yatube-load-")
+        connection.settings_dict.setdefault("TEST", {})["NAME"] = (
+            os.path.join(directory, "db.sqlite3")
+        )
+        old_name = connection.creation.create_test_db(
+            verbosity=0, autoclobber=True
+        )
+        caches = {"default": {
+            "BACKEND": "core.cache.SQLiteCache",
+            "LOCATION": os.path.join(directory, "cache.sqlite3"),
+        }}
+        try:
+            with override_settings(DEBUG=False, CACHES=caches):
+                call_command(
+                    "seed_bench", posts=options["posts"],
+                    seed=options["seed"], stdout=StringIO(),
+                )
+                report = self.run(mix, options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            shutil.rmtree(directory, ignore_errors=True)
+        self.print_report(report)
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as file:
+                json.dump(report, file, ensure_ascii=False, indent=2)
+
+    def run(self, mix, options):
+        rng = random.Random(options["seed"])
+        sessions, scenario_args = self.prepare_clients(rng, options)
+        server, children = self.start_server(options)
+        stats, elapsed = self.drive(
+            server.server_address[1], sessions, mix, scenario_args, options
+        )
+        self.stop_server(server, children)
+        return {
+            "server": options["server"],
+            "workers": options["workers"] if children else 1,
+            "clients": len(sessions),
+            "seconds": round(elapsed, 2),
+            "urls": stats.report(elapsed),
+        }
+
+    def prepare_clients(self, rng, options):
+        """
+        Сессии виртуальных пользователей и данные для сценариев:
+        id постов, имена авторов и slug групп из засеянного набора.
+        """
+        users = list(User.objects.filter(username__startswith="bench"))
+        post_ids = list(Post.objects.values_list("pk", flat=True))
+        group_slugs = list(
+            Post.objects.exclude(group=None)
+            .values_list("group__slug", flat=True)
+            .distinct()
+        )
+        sessions = []
+        for user in rng.sample(users, min(options["clients"], len(users))):
+            client = Client()
+            client.force_login(user)
+            sessions.append((user, client.cookies["sessionid"].value))
+        scenario_args = (
+            post_ids, [user.username for user in users], group_slugs
+        )
+        return sessions, scenario_args
+
+    def start_server(self, options):
+        """Сервер на свободном порту: потоки или fork на каждый воркер."""
+        server = ThreadingWSGIServer(("127.0.0.1", 0), QuietHandler)
+        server.set_app(application)
+        # Соединения с БД не должны пережить fork в процессы сервера.
+        connections.close_all()
+        children = []
+        if options["server"] == "prefork":
+            for _ in range(options["workers"]):
+                pid = os.fork()
+                if pid == 0:
+                    try:
+                        server.serve_forever()
+                    finally:
+                        os._exit(0)
+                children.append(pid)
+        else:
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server, children
+
+    def stop_server(self, server, children):
+        if children:
+            for pid in children:
+                os.kill(pid, signal.SIGTERM)
+                os.waitpid(pid, 0)
+        else:
+            server.shutdown()
+        server.server_close()
+
+    def drive(self, port, sessions, mix, scenario_args, options):
+        """
+        Гоняет по потоку на виртуального пользователя до истечения
+        duration. Возвращает статистику и фактическое время прогона.
+        """
+        stats = Stats()
+        deadline = time.monotonic() + options["duration"]
+
+        def client_loop(number, user, session_key):
+            visitor = VirtualUser(port, user, session_key)
+            visitor.request("GET", reverse("posts:post_create"))
+            scenario = Scenario(
+                mix, *scenario_args, random.Random(options["seed"] + number)
+            )
+            while time.monotonic() < deadline:
+                name, (method, path, data) = scenario.next()
+                started = time.perf_counter()
+                try:
+                    status = visitor.request(method, path, data)
+                except (OSError, http.client.HTTPException):
+                    status = None
+                stats.record(
+                    name, status, (time.perf_counter() - started) * 1000
+                )
+
+        started = time.monotonic()
+        threads = [
+            threading.Thread(target=client_loop, args=(number, *session))
+            for number, session in enumerate(sessions)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return stats, time.monotonic() - started
+
+    def print_report(self, report):
+        total = sum(row["requests"] for row in report["urls"].values())
+        errors = sum(
+            round(row["error_rate"] * row["requests"])
+            for row in report["urls"].values()
+        )
+        self.stdout.write(
+            f"{report['server']}: {total} запросов за {report['seconds']} с, "
+            f"{total / report['seconds']:.1f} запр./с, ошибок {errors}"
+        )
+        for name, row in report["urls"].items():
+            self.stdout.write(
+                f"{name:<18} {row['requests']:>6} запр. {row['rps']:>7} /с  "
+                f"ошибок {row['error_rate']:>6.1%}  p50 {row['p50_ms']:>8} мс"
+                f"  p95 {row['p95_ms']:>8} мс  p99 {row['p99_ms']:>8} мс"
+            )
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import search
+
+
+class Command(BaseCommand):
+    help = (
+        "Пересобирает полнотекстовый индекс постов одной транзакцией, "
+        "читая таблицу пачками по возрастанию pk."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Сколько постов читать из таблицы за один запрос.",
+        )
+
+    def handle(self, *args, **options):
+        if not search.is_supported():
+            raise CommandError(
+                "Полнотекстовый поиск поддерживает только SQLite."
+            )
+        total = search.rebuild(options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(
+            f"В поисковый индекс добавлено постов: {total}"
+        ))
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from posts import timeline
+from posts.models import Follow, User
+
+
+class Command(BaseCommand):
+    help = "Пересобирает материализованные ленты подписок."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "usernames",
+            nargs="*",
+            help="Пользователи, чьи ленты пересобрать (по умолчанию все).",
+        )
+
+    def handle(self, *args, **options):
+        readers = User.objects.filter(
+            pk__in=Follow.objects.values("user_id")
+        ).order_by("pk")
+        if options["usernames"]:
+            readers = readers.filter(username__in=options["usernames"])
+        rebuilt = 0
+        for user in readers.iterator():
+            timeline.rebuild(user)
+            rebuilt += 1
+        self.stdout.write(self.style.SUCCESS(f"Пересобрано лент: {rebuilt}"))
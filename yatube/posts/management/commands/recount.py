@@ -0,0 +1,55 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts import counters
+from posts.models import Group, Post, User
+
+
+def pk_batches(queryset, batch_size):
+    """Отдаёт pk пачками по возрастанию без OFFSET."""
+    last_pk = 0
+    while True:
+        batch = list(
+            queryset.filter(pk__gt=last_pk)
+            .order_by("pk")
+            .values_list("pk", flat=True)[:batch_size]
+        )
+        if not batch:
+            return
+        yield batch
+        last_pk = batch[-1]
+
+
+class Command(BaseCommand):
+    help = (
+        "Пересчитывает денормализованные счётчики постов, комментариев "
+        "и подписок у пользователей, групп и сайта, исправляя "
+        "накопившееся расхождение."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Сколько строк пересчитывать в одной транзакции.",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        users = posts = 0
+        for batch in pk_batches(User.objects.all(), batch_size):
+            with transaction.atomic():
+                users += counters.recount_users(batch)
+        for batch in pk_batches(Post.objects.all(), batch_size):
+            with transaction.atomic():
+                posts += counters.recount_posts(batch)
+        groups = 0
+        for batch in pk_batches(Group.objects.all(), batch_size):
+            with transaction.atomic():
+                groups += counters.recount_groups(batch)
+        counters.recount_site()
+        self.stdout.write(self.style.SUCCESS(
+            f"Пересчитано пользователей: {users}, постов: {posts}, "
+            f"групп: {groups}"
+        ))
@@ -0,0 +1,167 @@
+import datetime
+import json
+import os
+import random
+import tempfile
+from itertools import accumulate
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from faker import Faker
+
+
+def author_weights(count, alpha):
+    """Веса по закону Ципфа: автор номер i пишет ~ 1 / i^alpha постов."""
+    return list(accumulate(1 / (rank + 1) ** alpha for rank in range(count)))
+
+
+class BenchDataset:
+    """
+    Генераторы строк набора по моделям. Они делят один rng, поэтому
+    набор воспроизводим, только если читать их по порядку: группы,
+    посты, комментарии, подписки.
+    """
+
+    def __init__(self, users, groups, alpha, seed):
+        self.fake = Faker("ru_RU")
+        self.fake.seed_instance(seed)
+        self.rng = random.Random(seed)
+        prefix = f"bench{seed}_"
+        self.usernames = [f"{prefix}{number}" for number in range(users)]
+        self.slugs = [f"{prefix}group{number}" for number in range(groups)]
+        self.weights = author_weights(users, alpha)
+        self.now = timezone.now()
+
+    def weighted_author(self):
+        return self.rng.choices(self.usernames, cum_weights=self.weights)[0]
+
+    def group_rows(self):
+        for slug in self.slugs:
+            yield {
+                "slug": slug,
+                "title": self.fake.sentence(nb_words=3)[:200],
+                "description": self.fake.paragraph(),
+            }
+
+    def post_rows(self, posts):
+        span = datetime.timedelta(days=365).total_seconds()
+        for number in range(posts):
+            author = self.weighted_author()
+            pub_date = self.now - datetime.timedelta(
+                seconds=self.rng.random() * span
+            )
+            group = (
+                self.rng.choice(self.slugs) if self.rng.random() < 0.6
+                else None
+            )
+            yield {
+                "id": number,
+                "pub_date": pub_date.isoformat(),
+                "author": author,
+                "group": group,
+                "text": self.fake.paragraph(
+                    nb_sentences=self.rng.randint(1, 8)
+                ),
+            }
+
+    def comment_rows(self, comments, posts):
+        for _ in range(comments if posts else 0):
+            yield {
+                "post": self.rng.randrange(posts),
+                "pub_date": self.now.isoformat(),
+                "author": self.rng.choice(self.usernames),
+                "text": self.fake.sentence(),
+            }
+
+    def follow_rows(self, follows_per_user):
+        # Популярные авторы набирают подписчиков пропорционально
+        # весу — так же, как посты.
+        for user in self.usernames:
+            authors = set()
+            for _ in range(follows_per_user * 20):
+                if len(authors) >= follows_per_user:
+                    break
+                author = self.weighted_author()
+                if author != user:
+                    authors.add(author)
+            for author in sorted(authors):
+                yield {"user": user, "author": author}
+
+
+class Command(BaseCommand):
+    help = (
+        "Генерирует набор данных для бенчмарков: пользователей, группы, "
+        "посты со степенным распределением по авторам, комментарии и "
+        "граф подписок. Данные загружаются через import_yatube, поэтому "
+        "счётчики, поиск и ленты собираются так же, как при импорте."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--posts", type=int, default=1000)
+        parser.add_argument(
+            "--users",
+            type=int,
+            help="По умолчанию один пользователь на 20 постов.",
+        )
+        parser.add_argument(
+            "--groups",
+            type=int,
+            help="По умолчанию одна группа на 200 постов.",
+        )
+        parser.add_argument(
+            "--comments",
+            type=int,
+            help="По умолчанию половина от числа постов.",
+        )
+        parser.add_argument(
+            "--follows-per-user",
+            type=int,
+            default=20,
+            help="Сколько авторов читает каждый пользователь.",
+        )
+        parser.add_argument(
+            "--alpha",
+            type=float,
+            default=1.1,
+            help="Показатель степенного распределения постов по авторам.",
+        )
+        parser.add_argument("--seed", type=int, default=2023)
+        parser.add_argument("--batch-size", type=int, default=5000)
+
+    def handle(self, *args, **options):
+        posts = options["posts"]
+        users = options["users"] or max(10, posts // 20)
+        groups = options["groups"] or max(3, posts // 200)
+        comments = (
+            options["comments"] if options["comments"] is not None
+            else posts // 2
+        )
+        rows = self.generate(
+            posts, users, groups, comments,
+            min(options["follows_per_user"], users - 1),
+            options["alpha"], options["seed"],
+        )
+        with tempfile.TemporaryDirectory() as directory:
+            for name, table in rows.items():
+                path = os.path.join(directory, f"{name}.jsonl")
+                with open(path, "w", encoding="utf-8") as file:
+                    for row in table:
+                        file.write(json.dumps(row, ensure_ascii=False) + "\n")
+            call_command(
+                "import_yatube",
+                directory,
+                batch_size=options["batch_size"],
+                stdout=self.stdout,
+            )
+
+    def generate(self, posts, users, groups, comments, follows_per_user,
+                 alpha, seed):
+        """Строки в формате export_yatube; генераторы ленивые."""
+        dataset = BenchDataset(users, groups, alpha, seed)
+        return {
+            "groups": dataset.group_rows(),
+            "posts": dataset.post_rows(posts),
+            "comments": dataset.comment_rows(comments, posts),
+            "follows": dataset.follow_rows(follows_per_user),
+        }
@@ -0,0 +1,93 @@
+# Generated by Django 2.2.16 on 2026-10-18 05:20
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+import django.db.models.deletion
+
+
+def fill_timelines(apps, schema_editor):
+    # Те же правила, что у posts.timeline: авторы с большим числом
+    # постов или подписчиков читаются при запросе, а не раскладываются.
+    Follow = apps.get_model('posts', 'Follow')
+    Post = apps.get_model('posts', 'Post')
+    PullAuthor = apps.get_model('posts', 'PullAuthor')
+    TimelineEntry = apps.get_model('posts', 'TimelineEntry')
+    prolific = (
+        Post.objects.order_by()
+        .values('author_id')
+        .annotate(total=Count('*'))
+        .filter(total__gt=settings.TIMELINE_BACKFILL_LIMIT)
+        .values_list('author_id', flat=True)
+    )
+    popular = (
+        Follow.objects.order_by()
+        .values('author_id')
+        .annotate(total=Count('*'))
+        .filter(total__gt=settings.TIMELINE_FANOUT_LIMIT)
+        .values_list('author_id', flat=True)
+    )
+    PullAuthor.objects.bulk_create(
+        PullAuthor(author_id=author_id)
+        for author_id in set(prolific) | set(popular)
+    )
+    schema_editor.execute(
+        f"INSERT INTO {TimelineEntry._meta.db_table} "
+        "(user_id, post_id, author_id, pub_date) "
+        "SELECT follow.user_id, post.id, post.author_id, post.pub_date "
+        f"FROM {Follow._meta.db_table} AS follow "
+        f"JOIN {Post._meta.db_table} AS post "
+        "ON post.author_id = follow.author_id "
+        "WHERE follow.author_id NOT IN ("
+        f"SELECT author_id FROM {PullAuthor._meta.db_table})"
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0011_update_proxy_permissions'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0010_post_ordering_tiebreak'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PullAuthor',
+            fields=[
+                ('author', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='pull_author', serialize=False, to=settings.AUTH_USER_MODEL, verbose_name='Автор')),
+            ],
+            options={
+                'verbose_name': 'Автор без раскладки по лентам',
+                'verbose_name_plural': 'Авторы без раскладки по лентам',
+            },
+        ),
+        migrations.CreateModel(
+            name='TimelineEntry',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pub_date', models.DateTimeField(verbose_name='Дата создания поста')),
+                ('author', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Автор')),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timeline_entries', to='posts.Post', verbose_name='Пост')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timeline', to=settings.AUTH_USER_MODEL, verbose_name='Читатель')),
+            ],
+            options={
+                'verbose_name': 'Запись ленты',
+                'verbose_name_plural': 'Записи ленты',
+                'ordering': ['-pub_date', '-post_id'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='timelineentry',
+            index=models.Index(fields=['user', '-pub_date', '-post'], name='timeline_user_pub_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='timelineentry',
+            index=models.Index(fields=['user', 'author'], name='timeline_user_author_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='timelineentry',
+            constraint=models.UniqueConstraint(fields=('user', 'post'), name='unique_timeline_user_post'),
+        ),
+        migrations.RunPython(fill_timelines, migrations.RunPython.noop),
+    ]
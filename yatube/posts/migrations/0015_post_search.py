@@ -0,0 +1,34 @@
+# Generated by Django 2.2.16 on 2026-10-18 08:02
+
+from django.db import migrations
+
+
+def create_search_table(apps, schema_editor):
+    # Полнотекстовый индекс FTS5 есть только в SQLite.
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE posts_post_search USING fts5("
+        "text, tokenize='unicode61', prefix='2 3')"
+    )
+    schema_editor.execute(
+        "INSERT INTO posts_post_search (rowid, text) "
+        "SELECT id, text FROM posts_post"
+    )
+
+
+def drop_search_table(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute("DROP TABLE posts_post_search")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0014_post_updated'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_table, drop_search_table),
+    ]
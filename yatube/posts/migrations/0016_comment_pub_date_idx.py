@@ -0,0 +1,17 @@
+# Generated by Django 2.2.16 on 2026-10-18 05:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0015_post_search'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['pub_date'], name='comment_pub_date_idx'),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 2.2.16 on 2026-10-18 06:07
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_posts(apps, schema_editor):
+    Group = apps.get_model('posts', 'Group')
+    Post = apps.get_model('posts', 'Post')
+    SiteCounters = apps.get_model('posts', 'SiteCounters')
+    posts = (
+        Post.objects.filter(group=OuterRef('pk'))
+        .order_by()
+        .values('group')
+        .annotate(total=Count('*'))
+        .values('total')
+    )
+    Group.objects.update(posts_count=Coalesce(Subquery(posts), 0))
+    SiteCounters.objects.update_or_create(
+        pk=1, defaults={'posts_count': Post.objects.order_by().count()}
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0016_comment_pub_date_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SiteCounters',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('posts_count', models.PositiveIntegerField(default=0, verbose_name='Число постов')),
+            ],
+            options={
+                'verbose_name': 'Счётчики сайта',
+                'verbose_name_plural': 'Счётчики сайта',
+            },
+        ),
+        migrations.AddField(
+            model_name='group',
+            name='posts_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Число постов'),
+        ),
+        migrations.RunPython(count_posts, migrations.RunPython.noop),
+    ]
@@ -14,6 +14,9 @@ class Group(models.Model):
         unique=True, verbose_name="Ссылка сайта после group/..."
     )
     description = models.TextField(verbose_name="Описание группы")
+    posts_count = models.PositiveIntegerField(
+        "Число постов", default=0, editable=False
+    )
 
     class Meta:
         verbose_name = "Группа"
@@ -48,11 +51,27 @@ class Post(CreatedModel):
         upload_to='posts/',
         blank=True
     )  
+    comments_count = models.PositiveIntegerField(
+        "Число комментариев", default=0, editable=False
+    )
+    updated = models.DateTimeField("Дата изменения", auto_now=True)
 
     class Meta:
         verbose_name = "Пост"
         verbose_name_plural = "Посты"
-        ordering = ["-pub_date"]
+        ordering = ["-pub_date", "-id"]
+        indexes = [
+            # Индексы по возрастанию: обратный проход даёт порядок
+            # (-pub_date, -id), так как SQLite хранит rowid последним
+            # ключом индекса, и сортировка во временном B-дереве не нужна.
+            models.Index(fields=["pub_date"], name="post_pub_date_idx"),
+            models.Index(
+                fields=["author", "pub_date"], name="post_author_pub_date_idx"
+            ),
+            models.Index(
+                fields=["group", "pub_date"], name="post_group_pub_date_idx"
+            ),
+        ]
 
     def __str__(self):
         return self.text[:SLICE_OF_THE_FOUND_POST]
@@ -65,9 +84,126 @@ class Comment(CreatedModel):
     author = models.ForeignKey(User, on_delete=models.CASCADE, related_name='comments', verbose_name='Автор комментария', help_text='Автор, написавший комментарий')
     text = models.TextField(verbose_name='Текст комментария', help_text='Текст комментария, который увидят пользователи')
 
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["post", "pub_date"], name="comment_post_pub_date_idx"
+            ),
+            # Для инкрементальной выгрузки export_yatube --since.
+            models.Index(fields=["pub_date"], name="comment_pub_date_idx"),
+        ]
+
     def get_absolute_url(self):
         return reverse('posts:post_detail', args=[self.post.id])
 
 class Follow(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='follower', verbose_name='Подписчик')
     author = models.ForeignKey(User, on_delete=models.CASCADE, related_name='following', verbose_name='Автор')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "author"], name="unique_follow_user_author"
+            ),
+        ]
+
+
+class TimelineEntry(models.Model):
+    """
+    Материализованная лента подписок: строка на пару (читатель, пост).
+    Заполняется при публикации поста (fan-out on write), поэтому лента
+    /follow/ читается одним диапазоном индекса (user, pub_date).
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="timeline",
+        verbose_name="Читатель",
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name="timeline_entries",
+        verbose_name="Пост",
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="+",
+        verbose_name="Автор",
+    )
+    pub_date = models.DateTimeField("Дата создания поста")
+
+    class Meta:
+        verbose_name = "Запись ленты"
+        verbose_name_plural = "Записи ленты"
+        ordering = ["-pub_date", "-post_id"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "post"], name="unique_timeline_user_post"
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=["user", "pub_date", "post"],
+                name="timeline_user_date_post_idx",
+            ),
+            models.Index(
+                fields=["user", "author"], name="timeline_user_author_idx"
+            ),
+        ]
+
+
+class PullAuthor(models.Model):
+    """
+    Авторы, чьи посты не раскладываются по лентам подписчиков,
+    а подтягиваются при чтении: слишком много подписчиков или постов.
+    """
+    author = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="pull_author",
+        verbose_name="Автор",
+    )
+
+    class Meta:
+        verbose_name = "Автор без раскладки по лентам"
+        verbose_name_plural = "Авторы без раскладки по лентам"
+
+
+class UserCounters(models.Model):
+    """
+    Денормализованные счётчики пользователя. Обновляются атомарно
+    через F() в сигналах posts.signals, сверяются командой recount.
+    """
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="counters",
+        verbose_name="Пользователь",
+    )
+    posts_count = models.PositiveIntegerField("Число постов", default=0)
+    followers_count = models.PositiveIntegerField(
+        "Число подписчиков", default=0
+    )
+    following_count = models.PositiveIntegerField(
+        "Число подписок", default=0
+    )
+
+    class Meta:
+        verbose_name = "Счётчики пользователя"
+        verbose_name_plural = "Счётчики пользователей"
+
+
+class SiteCounters(models.Model):
+    """
+    Счётчики сайта целиком: одна строка с pk=1. Как и UserCounters,
+    обновляется через F() в сигналах и сверяется командой recount.
+    """
+    posts_count = models.PositiveIntegerField("Число постов", default=0)
+
+    class Meta:
+        verbose_name = "Счётчики сайта"
+        verbose_name_plural = "Счётчики сайта"
@@ -0,0 +1,320 @@
+import base64
+import binascii
+import hashlib
+import json
+from functools import partial
+from inspect import isbuiltin
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import EmptyPage, Page, Paginator
+from django.db.models import Q
+from django.utils.functional import cached_property
+from django.utils.inspect import method_has_no_args
+
+
+DEFAULT_CURSOR_ORDERING = ("-pub_date", "-id")
+COUNT_PREFIX = "paginator:count:"
+ELLIPSIS = "…"
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def keyset_filter(ordering, values, reverse=False):
+    """Строит условие "строго после курсора" для составного ключа."""
+    condition = Q()
+    equal = {}
+    for name, value in zip(ordering, values):
+        attname = name.lstrip("-")
+        descending = name.startswith("-") != reverse
+        lookup = "%s__%s" % (attname, "lt" if descending else "gt")
+        condition |= Q(**equal, **{lookup: value})
+        equal[attname] = value
+    return condition
+
+
+def reversed_ordering(ordering):
+    return [
+        name[1:] if name.startswith("-") else "-" + name for name in ordering
+    ]
+
+
+def encode_cursor(values):
+    """Упаковывает значения ключа сортировки в непрозрачный токен."""
+    raw = json.dumps(
+        [value.isoformat() if hasattr(value, "isoformat") else value
+         for value in values],
+        separators=(",", ":"),
+    )
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(token, fields):
+    """Распаковывает токен и приводит значения к типам полей модели."""
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (binascii.Error, UnicodeError, ValueError):
+        raise InvalidCursor(token)
+    if not isinstance(values, list) or len(values) != len(fields):
+        raise InvalidCursor(token)
+    try:
+        return [field.to_python(value) for field, value in zip(fields, values)]
+    except Exception:
+        raise InvalidCursor(token)
+
+
+class WindowPage(Page):
+    # Курсор продолжения с последней номерной страницы, если глубину
+    # номеров ограничивает FeedPaginator.max_pages.
+    next_cursor = None
+
+    @property
+    def page_window(self):
+        """Номера страниц для навигации с пропусками вокруг текущей."""
+        return self.paginator.get_elided_page_range(self.number)
+
+
+def exact_count(object_list):
+    """Точное число объектов, как Paginator.count: count() или len()."""
+    count = getattr(object_list, "count", None)
+    if callable(count) and not isbuiltin(count) and method_has_no_args(count):
+        return count()
+    return len(object_list)
+
+
+def cached_count(object_list):
+    """
+    Точное число объектов, хранящееся в кеше PAGINATOR_COUNT_TIMEOUT
+    секунд под хешем SQL запроса. Источники без запроса считаются сразу.
+    """
+    query = getattr(object_list, "query", None)
+    if query is None:
+        return exact_count(object_list)
+    key = COUNT_PREFIX + hashlib.md5(str(query).encode()).hexdigest()
+    count = cache.get(key)
+    if count is None:
+        count = exact_count(object_list)
+        cache.set(key, count, settings.PAGINATOR_COUNT_TIMEOUT)
+    return count
+
+
+class FeedPaginator(Paginator):
+    """
+    Номерная пагинация лент: навигация показывает первую и последнюю
+    страницы и окно on_each_side вокруг текущей, а не все номера.
+
+    Число объектов даёт источник count — функция без аргументов,
+    которую view выбирает под свою ленту (например, поддерживаемый
+    сигналами счётчик постов группы). Без него используется точный
+    COUNT(*), закешированный функцией cached_count.
+
+    max_pages ограничивает глубину номеров для лент, у которых N-я
+    страница стоит N страниц (например, слияние источников в Python):
+    номера дальше дают последнюю разрешённую страницу, а она — курсор
+    next_cursor, с которого лента листается курсорной пагинацией.
+    """
+
+    on_each_side = 3
+    on_ends = 1
+    ELLIPSIS = ELLIPSIS
+
+    def __init__(self, object_list, per_page, count=None, max_pages=None,
+                 **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.count_source = count or partial(cached_count, object_list)
+        self.max_pages = max_pages
+        self.exact = False
+
+    def _get_page(self, *args, **kwargs):
+        return WindowPage(*args, **kwargs)
+
+    def page(self, number):
+        # Срез не обрезается по count: счётчик или число из кеша может
+        # отставать, и новые посты иначе не попали бы на страницу.
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        top = bottom + self.per_page
+        if top + self.orphans >= self.count:
+            top += self.orphans
+        object_list = self.object_list[bottom:top]
+        if number > 1 and not self.exact:
+            object_list = list(object_list)
+            if not object_list:
+                # Источник насчитал больше, чем осталось: пересчитываем
+                # точно, и get_page отдаст настоящую последнюю страницу.
+                self._recount()
+                return self.page(number)
+        page = self._get_page(object_list, number, self)
+        if self._capped and number == self.num_pages and object_list:
+            page.next_cursor = encode_cursor([
+                getattr(object_list[-1], name.lstrip("-"))
+                for name in DEFAULT_CURSOR_ORDERING
+            ])
+        return page
+
+    def _recount(self):
+        self.count_source = partial(exact_count, self.object_list)
+        self.exact = True
+        self.__dict__.pop("count", None)
+        self.__dict__.pop("num_pages", None)
+
+    @cached_property
+    def count(self):
+        return self.count_source()
+
+    @cached_property
+    def num_pages(self):
+        pages = Paginator.num_pages.func(self)
+        if self.max_pages is not None:
+            return min(pages, self.max_pages)
+        return pages
+
+    @property
+    def _capped(self):
+        return (
+            self.max_pages is not None
+            and self.count > self.max_pages * self.per_page
+        )
+
+    def get_page(self, number):
+        """
+        Как Paginator.get_page: номер вне диапазона даёт последнюю
+        страницу, в том числе когда источник count завысил число.
+        """
+        try:
+            return super().get_page(number)
+        except EmptyPage:
+            return self.page(self.num_pages)
+
+    def get_elided_page_range(self, number):
+        """
+        Номера страниц с ELLIPSIS на месте пропусков, как
+        Paginator.get_elided_page_range из новых версий Django.
+        """
+        number = self.validate_number(number)
+        window = self.on_each_side
+        if self.num_pages <= (window + self.on_ends) * 2:
+            yield from self.page_range
+            return
+        if number > 1 + window + self.on_ends + 1:
+            yield from range(1, self.on_ends + 1)
+            yield ELLIPSIS
+            yield from range(number - window, number + 1)
+        else:
+            yield from range(1, number + 1)
+        if number < self.num_pages - window - self.on_ends - 1:
+            yield from range(number + 1, number + window + 1)
+            yield ELLIPSIS
+            yield from range(
+                self.num_pages - self.on_ends + 1, self.num_pages + 1
+            )
+        else:
+            yield from range(number + 1, self.num_pages + 1)
+
+
+class CursorPage(Page):
+    """
+    Страница курсорной пагинации с интерфейсом обычной Page:
+    шаблоны итерируются по ней так же, но вместо номеров страниц
+    получают токены next_cursor и previous_cursor.
+    """
+
+    is_cursor = True
+
+    def __init__(self, object_list, paginator, next_cursor, previous_cursor):
+        super().__init__(object_list, None, paginator)
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __repr__(self):
+        return "<Cursor page of %s items>" % len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def next_page_number(self):
+        return self.next_cursor
+
+    def previous_page_number(self):
+        return self.previous_cursor
+
+    def start_index(self):
+        return 1 if self.object_list else 0
+
+    def end_index(self):
+        return len(self.object_list)
+
+
+class CursorPaginator(Paginator):
+    """
+    Пагинация по ключу (pub_date, id) без COUNT(*) и OFFSET:
+    каждая страница — это диапазон индекса, начинающийся с курсора,
+    поэтому N-я страница стоит столько же, сколько первая.
+    """
+
+    def __init__(self, object_list, per_page,
+                 ordering=DEFAULT_CURSOR_ORDERING):
+        super().__init__(object_list, per_page)
+        self.ordering = tuple(ordering)
+        model = object_list.model
+        self.fields = [
+            model._meta.get_field(name.lstrip("-")) for name in self.ordering
+        ]
+
+    def _cursor_for(self, obj):
+        return encode_cursor(
+            [getattr(obj, field.attname) for field in self.fields]
+        )
+
+    def _rows(self, values, reverse, limit):
+        """
+        Первые limit строк после курсора. Источники, которые не являются
+        QuerySet (например, слияние нескольких лент), реализуют keyset_rows.
+        """
+        if hasattr(self.object_list, "keyset_rows"):
+            return self.object_list.keyset_rows(values, reverse, limit)
+        queryset = self.object_list
+        if values is not None:
+            queryset = queryset.filter(
+                keyset_filter(self.ordering, values, reverse)
+            )
+        ordering = reversed_ordering(self.ordering) if reverse else (
+            self.ordering
+        )
+        return list(queryset.order_by(*ordering)[:limit])
+
+    def page(self, after=None, before=None):
+        """Возвращает страницу после курсора after или перед before."""
+        reverse = bool(before)
+        token = before if reverse else after
+        values = decode_cursor(token, self.fields) if token else None
+        rows = self._rows(values, reverse, self.per_page + 1)
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if reverse and not has_more:
+            # Дошли до начала ленты: отдаём полноценную первую страницу.
+            return self.page()
+        if reverse:
+            rows.reverse()
+            has_next = has_previous = True
+        else:
+            has_next, has_previous = has_more, bool(token)
+        next_cursor = previous_cursor = None
+        if rows and has_next:
+            next_cursor = self._cursor_for(rows[-1])
+        if rows and has_previous:
+            previous_cursor = self._cursor_for(rows[0])
+        return CursorPage(rows, self, next_cursor, previous_cursor)
+
+    def get_page(self, after=None, before=None):
+        """Как page(), но с битым курсором отдаёт первую страницу."""
+        try:
+            return self.page(after=after, before=before)
+        except InvalidCursor:
+            return self.page()
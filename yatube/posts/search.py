@@ -0,0 +1,129 @@
+import re
+
+from django.db import connection, transaction
+
+from .models import Post
+
+
+SEARCH_TABLE = "posts_post_search"
+TOKEN = re.compile(r"\w+")
+
+
+def is_supported():
+    return connection.vendor == "sqlite"
+
+
+def match_query(text):
+    """
+    Превращает ввод пользователя в запрос FTS5: каждое слово ищется
+    по префиксу, чтобы находились другие словоформы, а операторы
+    и кавычки FTS5 из ввода не проходят.
+    """
+    return " ".join('"%s"*' % token for token in TOKEN.findall(text))
+
+
+def index_post(post):
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"DELETE FROM {SEARCH_TABLE} WHERE rowid = %s", [post.pk]
+        )
+        cursor.execute(
+            f"INSERT INTO {SEARCH_TABLE} (rowid, text) VALUES (%s, %s)",
+            [post.pk, post.text],
+        )
+
+
+def remove_post(post_id):
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"DELETE FROM {SEARCH_TABLE} WHERE rowid = %s", [post_id]
+        )
+
+
+def rebuild(batch_size=1000):
+    """
+    Пересобирает индекс, читая посты пачками по возрастанию pk,
+    чтобы не держать всю таблицу в памяти. Всё идёт одной транзакцией:
+    пока она не закоммичена, поиск видит прежний индекс, а не пустой
+    или частичный. Возвращает число постов.
+    """
+    total = 0
+    last_pk = 0
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {SEARCH_TABLE}")
+        while True:
+            rows = list(
+                Post.objects.filter(pk__gt=last_pk)
+                .order_by("pk")
+                .values_list("pk", "text")[:batch_size]
+            )
+            if not rows:
+                break
+            cursor.executemany(
+                f"INSERT INTO {SEARCH_TABLE} (rowid, text) VALUES (%s, %s)",
+                rows,
+            )
+            total += len(rows)
+            last_pk = rows[-1][0]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {SEARCH_TABLE} ({SEARCH_TABLE}) VALUES ('optimize')"
+        )
+    return total
+
+
+def matching_ids_sql(text):
+    """Подзапрос id подходящих постов для фильтра pk__in."""
+    return (
+        f"SELECT rowid FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s",
+        [match_query(text)],
+    )
+
+
+class SearchResults:
+    """
+    Результаты поиска, упорядоченные по релевантности bm25 и затем
+    по убыванию id, для номерной пагинации (FeedPaginator). Курсор
+    по рангу не годится: bm25 зависит от статистики всего индекса
+    и меняется с любой правкой постов, и продолжение "после ранга"
+    пропускало бы или повторяло результаты.
+    """
+
+    model = Post
+
+    def __init__(self, text):
+        self.query = match_query(text)
+
+    def count(self):
+        if not self.query:
+            return 0
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT count(*) FROM {SEARCH_TABLE} "
+                f"WHERE {SEARCH_TABLE} MATCH %s",
+                [self.query],
+            )
+            return cursor.fetchone()[0]
+
+    def _rows(self, offset, limit):
+        if not self.query or limit <= 0:
+            return []
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT rowid FROM {SEARCH_TABLE} "
+                f"WHERE {SEARCH_TABLE} MATCH %s "
+                "ORDER BY rank, rowid DESC LIMIT %s OFFSET %s",
+                [self.query, limit, offset],
+            )
+            post_ids = [post_id for post_id, in cursor.fetchall()]
+        posts = Post.objects.select_related("author", "group").in_bulk(
+            post_ids
+        )
+        # Пост мог быть удалён между запросами.
+        return [posts[post_id] for post_id in post_ids if post_id in posts]
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start = index.start or 0
+            return self._rows(start, index.stop - start)
+        return self[index:index + 1][0]
@@ -0,0 +1,157 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import comments, counters, feed_cache, follow_graph, search, timeline
+from .models import Comment, Follow, Group, Post, PullAuthor
+
+
+@receiver(post_save, sender=Post)
+def count_created_post(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.increment(instance.author_id, "posts_count")
+        counters.increment_site("posts_count")
+        if instance.group_id:
+            counters.increment_group(instance.group_id)
+
+
+@receiver(post_save, sender=Post)
+def fan_out_created_post(sender, instance, created, raw=False, **kwargs):
+    # Пост попадает в ленты подписчиков, откуда бы его ни создали:
+    # из формы, админки, API или консоли.
+    if created and not raw:
+        timeline.fan_out_post(instance)
+
+
+@receiver(post_save, sender=Post)
+def count_moved_post(sender, instance, created, raw=False, **kwargs):
+    previous_id = getattr(instance, "_previous_group_id", None)
+    if created or raw or previous_id == instance.group_id:
+        return
+    if previous_id:
+        counters.increment_group(previous_id, -1)
+    if instance.group_id:
+        counters.increment_group(instance.group_id)
+
+
+@receiver(post_delete, sender=Post)
+def count_deleted_post(sender, instance, **kwargs):
+    counters.increment(instance.author_id, "posts_count", -1)
+    counters.increment_site("posts_count", -1)
+    if instance.group_id:
+        counters.increment_group(instance.group_id, -1)
+
+
+@receiver(post_save, sender=Comment)
+def count_created_comment(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.increment_comments(instance.post_id)
+
+
+@receiver(post_delete, sender=Comment)
+def count_deleted_comment(sender, instance, **kwargs):
+    counters.increment_comments(instance.post_id, -1)
+
+
+@receiver(post_save, sender=Follow)
+def count_created_follow(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.increment(instance.author_id, "followers_count")
+        counters.increment(instance.user_id, "following_count")
+
+
+@receiver(post_delete, sender=Follow)
+def count_deleted_follow(sender, instance, **kwargs):
+    counters.increment(instance.author_id, "followers_count", -1)
+    counters.increment(instance.user_id, "following_count", -1)
+
+
+@receiver(pre_save, sender=Post)
+def remember_post_group(sender, instance, raw=False, **kwargs):
+    instance._previous_group_id = instance._previous_group_slug = None
+    if instance.pk and not raw:
+        instance._previous_group_id, instance._previous_group_slug = (
+            Group.objects.filter(posts__pk=instance.pk)
+            .values_list("id", "slug")
+            .first()
+        ) or (None, None)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def invalidate_post_feeds(sender, instance, **kwargs):
+    scopes = feed_cache.post_scopes(instance)
+    previous_slug = getattr(instance, "_previous_group_slug", None)
+    if previous_slug:
+        scopes.append(feed_cache.group_scope(previous_slug))
+    feed_cache.bump(*scopes)
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_comment_pages(sender, instance, created=False, **kwargs):
+    # Страница поста выводит только первую страницу комментариев:
+    # новый комментарий за её пределами сдвигает лишь их собственную
+    # область, и страница поста остаётся в кеше браузера.
+    scopes = [feed_cache.comments_scope(instance.post_id)]
+    if not created or comments.on_first_page(instance.post_id):
+        scopes.append(feed_cache.post_scope(instance.post_id))
+    feed_cache.bump(*scopes)
+
+
+@receiver(pre_save, sender=Group)
+def remember_group_slug(sender, instance, raw=False, **kwargs):
+    instance._previous_slug = None
+    if instance.pk and not raw:
+        instance._previous_slug = (
+            Group.objects.filter(pk=instance.pk)
+            .values_list("slug", flat=True)
+            .first()
+        )
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def invalidate_group_feeds(sender, instance, **kwargs):
+    # Ссылки на группу есть в общей ленте, поэтому сдвигается и она.
+    scopes = ["global", feed_cache.group_scope(instance.slug)]
+    previous_slug = getattr(instance, "_previous_slug", None)
+    if previous_slug:
+        scopes.append(feed_cache.group_scope(previous_slug))
+    feed_cache.bump(*scopes)
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def invalidate_follow_pages(sender, instance, signal, **kwargs):
+    reader = feed_cache.reader_scope(instance.user_id)
+    before = feed_cache.generations([reader])[reader]
+    after = feed_cache.bump(
+        feed_cache.author_scope(instance.author.username),
+        feed_cache.author_scope(instance.user.username),
+        reader,
+    )[reader]
+    follow_graph.graph.update(
+        instance.user_id,
+        instance.author_id,
+        following=signal is post_save,
+        before=before,
+        after=after,
+    )
+
+
+@receiver(post_save, sender=PullAuthor)
+@receiver(post_delete, sender=PullAuthor)
+def invalidate_pull_authors(sender, instance, **kwargs):
+    feed_cache.bump(feed_cache.PULL_AUTHORS_SCOPE)
+
+
+@receiver(post_save, sender=Post)
+def index_post_text(sender, instance, **kwargs):
+    if search.is_supported():
+        search.index_post(instance)
+
+
+@receiver(post_delete, sender=Post)
+def unindex_post_text(sender, instance, **kwargs):
+    if search.is_supported():
+        search.remove_post(instance.pk)
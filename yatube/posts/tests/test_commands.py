@@ -0,0 +1,135 @@
+import gzip
+import json
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase
+
+from posts import follow_graph, search
+from posts.models import (
+    Comment, Follow, Group, Post, SiteCounters, TimelineEntry, UserCounters
+)
+
+
+User = get_user_model()
+
+
+class TestPostsCommands(TestCase):
+    def test_posts_feed_queries_use_indexes(self):
+        """
+        Проверяем, что ни один запрос лент не проходит таблицу
+        целиком и не сортирует посты во временном B-дереве.
+        """
+        out = StringIO()
+        call_command("check_query_plans", stdout=out)
+        self.assertIn("Все ленты используют индексы.", out.getvalue())
+
+    def test_posts_recount_repairs_drift(self):
+        """Проверяем, что recount исправляет разошедшиеся счётчики."""
+        author = User.objects.create_user(username="drifted")
+        group = Group.objects.create(title="Дрейф", slug="drift")
+        post = Post.objects.create(author=author, group=group, text="Пост")
+        Comment.objects.bulk_create(
+            Comment(post=post, author=author, text="Комментарий")
+            for _ in range(3)
+        )
+        UserCounters.objects.filter(user=author).update(posts_count=42)
+        Group.objects.filter(pk=group.pk).update(posts_count=42)
+        SiteCounters.objects.update(posts_count=42)
+        call_command("recount", batch_size=1, stdout=StringIO())
+        post.refresh_from_db()
+        group.refresh_from_db()
+        self.assertEqual(post.comments_count, 3)
+        self.assertEqual(UserCounters.objects.get(user=author).posts_count, 1)
+        self.assertEqual(group.posts_count, 1)
+        self.assertEqual(SiteCounters.objects.get().posts_count, 1)
+
+    def test_posts_rebuild_search_indexes_bulk_inserts(self):
+        """Проверяем, что rebuild_search находит посты, созданные без сигналов."""
+        author = User.objects.create_user(username="bulk")
+        Post.objects.bulk_create(
+            Post(author=author, text=f"Массовая загрузка {number}")
+            for number in range(5)
+        )
+        self.assertEqual(search.SearchResults("массовая").count(), 0)
+        out = StringIO()
+        call_command("rebuild_search", batch_size=2, stdout=out)
+        self.assertEqual(search.SearchResults("массовая").count(), 5)
+
+    def test_posts_export_streams_tables_and_since(self):
+        """Проверяем выгрузку всех таблиц и инкрементальный режим --since."""
+        author = User.objects.create_user(username="exporter")
+        reader = User.objects.create_user(username="reader")
+        group = Group.objects.create(title="Выгрузка", slug="export", description="-")
+        old = Post.objects.create(author=author, text="Старый", group=group)
+        Post.objects.filter(pk=old.pk).update(pub_date=old.pub_date - timedelta(days=1))
+        new = Post.objects.create(author=author, text="Новый")
+        Comment.objects.create(post=new, author=reader, text="Комментарий")
+        Follow.objects.create(user=reader, author=author)
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+
+        def exported(name):
+            with gzip.open(os.path.join(directory, f"{name}.jsonl.gz"), "rt") as file:
+                return [json.loads(line) for line in file]
+
+        call_command("export_yatube", directory, gzip=True, batch_size=1, stdout=StringIO())
+        self.assertEqual([row["text"] for row in exported("posts")], ["Старый", "Новый"])
+        self.assertEqual(exported("posts")[0]["group"], "export")
+        self.assertEqual(exported("follows"), [{"id": Follow.objects.get().pk, "user": "reader", "author": "exporter"}])
+        self.assertEqual(len(exported("comments")), 1)
+        call_command(
+            "export_yatube", directory, gzip=True,
+            since=(new.pub_date - timedelta(hours=1)).isoformat(), stdout=StringIO(),
+        )
+        self.assertEqual([row["text"] for row in exported("posts")], ["Новый"])
+
+    def test_posts_import_round_trip(self):
+        """Проверяем, что import_yatube загружает выгрузку и пересобирает производные данные."""
+        author = User.objects.create_user(username="source")
+        group = Group.objects.create(title="Импорт", slug="import", description="-")
+        post = Post.objects.create(author=author, text="Импортируемый пост", group=group)
+        Post.objects.filter(pk=post.pk).update(pub_date=post.pub_date - timedelta(days=3))
+        Comment.objects.create(post=post, author=author, text="Комментарий")
+        cache.clear()
+        watcher = User.objects.create_user(username="watcher")
+        self.assertEqual(list(follow_graph.graph.following(watcher.pk)), [])
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        call_command("export_yatube", directory, stdout=StringIO())
+        with open(os.path.join(directory, "follows.jsonl"), "w") as file:
+            file.write(json.dumps({"id": 1, "user": "newcomer", "author": "source"}) + "\n")
+            file.write(json.dumps({"id": 2, "user": "watcher", "author": "source"}) + "\n")
+        out = StringIO()
+        call_command("import_yatube", directory, batch_size=1, stdout=out)
+        self.assertIn("строк/с", out.getvalue())
+        imported = Post.objects.exclude(pk=post.pk).get()
+        self.assertEqual(imported.pub_date, post.pub_date - timedelta(days=3))
+        self.assertEqual((imported.author, imported.group), (author, group))
+        self.assertEqual(imported.comments_count, 1)
+        self.assertEqual(UserCounters.objects.get(user=author).posts_count, 2)
+        group.refresh_from_db()
+        self.assertEqual(group.posts_count, 2)
+        self.assertEqual(SiteCounters.objects.get().posts_count, 2)
+        self.assertEqual(search.SearchResults("импортируемый").count(), 2)
+        newcomer = User.objects.get(username="newcomer")
+        self.assertEqual(TimelineEntry.objects.filter(user=newcomer).count(), 2)
+        # Граф подписок процесса видит подписку, вставленную мимо сигналов.
+        self.assertEqual(list(follow_graph.graph.following(watcher.pk)), [author.pk])
+
+    def test_posts_seed_bench_generates_skewed_dataset(self):
+        """Проверяем, что seed_bench создаёт связанный набор со степенным распределением постов."""
+        call_command("seed_bench", posts=200, users=20, follows_per_user=5, stdout=StringIO())
+        per_author = sorted(
+            UserCounters.objects.filter(user__username__startswith="bench").values_list("posts_count", flat=True)
+        )
+        self.assertEqual(sum(per_author), 200)
+        self.assertGreater(per_author[-1], 4 * per_author[len(per_author) // 2])
+        self.assertEqual(Comment.objects.count(), 100)
+        self.assertTrue(TimelineEntry.objects.exists())
@@ -1,7 +1,7 @@
 from django.contrib.auth import get_user_model
 from django.test import TestCase
 
-from posts.models import Group, Post
+from posts.models import Comment, Follow, Group, Post, UserCounters
 
 
 User = get_user_model()
@@ -64,3 +64,38 @@ class TestPostsModels(TestCase):
                 self.assertEqual(
                     post._meta.get_field(field).help_text, expected_value
                 )
+
+
+class TestPostsCounters(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username="counted_author")
+        cls.reader = User.objects.create_user(username="counted_reader")
+
+    def counters(self, user):
+        return UserCounters.objects.get(user=user)
+
+    def test_posts_counters_follow_creates_and_deletes(self):
+        """
+        Проверяем, что счётчики постов, комментариев и подписок
+        меняются вместе с созданием и удалением строк.
+        """
+        post = Post.objects.create(author=self.author, text="Пост")
+        Post.objects.create(author=self.author, text="Ещё пост")
+        comment = Comment.objects.create(
+            post=post, author=self.reader, text="Комментарий"
+        )
+        follow = Follow.objects.create(user=self.reader, author=self.author)
+        post.refresh_from_db()
+        self.assertEqual(self.counters(self.author).posts_count, 2)
+        self.assertEqual(self.counters(self.author).followers_count, 1)
+        self.assertEqual(self.counters(self.reader).following_count, 1)
+        self.assertEqual(post.comments_count, 1)
+
+        comment.delete()
+        follow.delete()
+        post.delete()
+        self.assertEqual(self.counters(self.author).posts_count, 1)
+        self.assertEqual(self.counters(self.author).followers_count, 0)
+        self.assertEqual(self.counters(self.reader).following_count, 0)
@@ -1,16 +1,25 @@
 from datetime import datetime
 import shutil
+import sqlite3
 import tempfile
 from django.conf import settings
 from time import sleep
+from unittest import mock
 
 from django.contrib.auth import get_user_model
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
 from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 
 from posts.forms import PostForm
 from posts.views import Group, Post, Comment, Follow
+from posts.models import PullAuthor, TimelineEntry
+from posts import counters, views
+from posts.cards import card_key
+from posts.paginators import CursorPaginator, FeedPaginator
+from posts import feed_cache, follow_graph, search, thumbnails, timeline
 from django.core.files.uploadedfile import SimpleUploadedFile
 
 
@@ -63,6 +72,141 @@ class PaginatorViewsTest(TestCase):
                 )
                 self.assertEqual(len(response.context["page_obj"]), 5)
 
+    def test_posts_paginator_elided_window(self):
+        """Проверяем, что навигация показывает окно, а не все страницы."""
+        paginator = FeedPaginator(list(range(200)), 10)
+        self.assertEqual(
+            list(paginator.get_page(10).page_window),
+            [1, "…", 7, 8, 9, 10, 11, 12, 13, "…", 20],
+        )
+        Post.objects.bulk_create(
+            Post(text=f"Пост {i}", author=self.user) for i in range(200)
+        )
+        # bulk_create обходит сигналы, как и массовая загрузка.
+        counters.recount_site()
+        response = self.auth_client.get(reverse("posts:index"), {"page": 8})
+        self.assertContains(response, 'class="page-link"', count=15)
+
+    def test_posts_paginator_count_from_cache(self):
+        """Проверяем, что число постов берётся из кеша без COUNT(*)."""
+        url = reverse("posts:group_list", kwargs={"slug": self.group.slug})
+        self.auth_client.get(url)
+        # Другой адрес — другой ключ кеша страницы, но тот же запрос.
+        with CaptureQueriesContext(connection) as queries:
+            self.auth_client.get(url, {"page": 1})
+        self.assertFalse(
+            [q for q in queries if "COUNT(" in q["sql"]],
+            "COUNT(*) выполняется, хотя число постов есть в кеше",
+        )
+
+    def test_posts_paginator_counts_from_counters(self):
+        """
+        Проверяем, что ленты берут число постов из счётчиков сайта,
+        группы и автора, а переносы и удаления постов их обновляют.
+        """
+        pages = {
+            "posts:index": {},
+            "posts:group_list": {"slug": self.group.slug},
+            "posts:profile": {"username": self.user.username},
+        }
+        for page, args in pages.items():
+            with self.subTest(page=page):
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.auth_client.get(reverse(page, kwargs=args))
+                self.assertFalse(
+                    [q for q in queries if "COUNT(" in q["sql"]]
+                )
+                paginator = response.context["page_obj"].paginator
+                self.assertEqual(paginator.count, 15)
+        other = Group.objects.create(title="Другая", slug="other")
+        post = Post.objects.filter(group=self.group).first()
+        post.group = other
+        post.save()
+        Post.objects.filter(group=self.group).first().delete()
+        self.group.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual((self.group.posts_count, other.posts_count), (13, 1))
+        self.assertEqual(counters.for_site().posts_count, 14)
+
+    def test_posts_paginator_overcounted_page_out_of_range(self):
+        """
+        Проверяем, что при завышенном счётчике номер за концом ленты
+        даёт настоящую последнюю страницу, а не пустую.
+        """
+        paginator = FeedPaginator(self.posts, 10, count=lambda: 100)
+        self.assertEqual(paginator.num_pages, 10)
+        page = paginator.get_page(7)
+        self.assertEqual((page.number, len(page)), (2, 5))
+        self.assertEqual(paginator.num_pages, 2)
+
+
+@override_settings(POSTS_CURSOR_PAGINATION=True)
+class CursorPaginatorViewsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username="Kostya")
+        cls.group = Group.objects.create(
+            title="Тестовая группа курсоров",
+            slug="test-group-cursor",
+            description="Группа для теста курсорной пагинации",
+        )
+        cls.auth_client = Client()
+        cls.auth_client.force_login(cls.user)
+        for i in range(1, 16):
+            Post.objects.create(
+                text="Курсорный пост " + str(i),
+                author=cls.user,
+                group=cls.group,
+            )
+        # Одинаковые даты у всех постов проверяют сортировку по id.
+        Post.objects.update(pub_date=datetime(2015, 10, 1, 12, 0, 0))
+
+    def setUp(self):
+        cache.clear()
+
+    def test_posts_pages_with_cursor_paginator(self):
+        """
+        Проверяем, что курсорная пагинация проходит ленту
+        вперёд и назад без пропусков и повторов.
+        """
+        pages = {
+            "posts:index": {},
+            "posts:group_list": {"slug": self.group.slug},
+            "posts:profile": {"username": self.user.username},
+        }
+        expected = list(
+            Post.objects.order_by("-pub_date", "-id").values_list(
+                "id", flat=True
+            )
+        )
+        for page, args in pages.items():
+            with self.subTest(page=page):
+                url = reverse(page, kwargs=args)
+                first = self.auth_client.get(url).context["page_obj"]
+                self.assertFalse(first.has_previous())
+                second = self.auth_client.get(
+                    url, {"after": first.next_cursor}
+                ).context["page_obj"]
+                self.assertFalse(second.has_next())
+                self.assertEqual(
+                    [post.id for post in first] + [post.id for post in second],
+                    expected,
+                )
+                back = self.auth_client.get(
+                    url, {"before": second.previous_cursor}
+                ).context["page_obj"]
+                self.assertEqual(
+                    [post.id for post in back], [post.id for post in first]
+                )
+
+    def test_posts_cursor_paginator_ignores_broken_cursor(self):
+        """Проверяем, что битый курсор открывает первую страницу."""
+        response = self.auth_client.get(
+            reverse("posts:index"), {"after": "not-a-cursor"}
+        )
+        self.assertEqual(len(response.context["page_obj"]), 10)
+
 
 class TestPostsView(TestCase):
     @classmethod
@@ -229,6 +373,7 @@ class TestPostsImage(TestCase):
     
     def setUp(self):
         cache.clear()
+        thumbnails.resolved.clear()
 
     def test_posts_image_in_context(self):
         '''Проверяем, что при выводе поста с картинкой изображение передаётся в словаре context.'''
@@ -243,6 +388,53 @@ class TestPostsImage(TestCase):
                 response = self.auth_client.get(url)
                 self.assertEqual(self.post.image, eval(expected), f'Со страницей {url} произошла ошибка.')
 
+    def test_posts_thumbnail_generated_in_background(self):
+        '''Проверяем, что пока миниатюры нет, шаблон получает заглушку, а не ресайз в запросе.'''
+        geometry, options = thumbnails.THUMBNAIL_SIZES[0]
+        backend = thumbnails.AsyncThumbnailBackend()
+        placeholder = backend.get_thumbnail(self.post.image, geometry, **options)
+        self.assertTrue(getattr(placeholder, 'is_placeholder', False), 'Миниатюра создана прямо в запросе')
+        response = self.auth_client.get(f'/posts/{self.post.id}/')
+        self.assertContains(response, thumbnails.PLACEHOLDER_URL)
+        thumbnails.generate(self.post.image.name, geometry, options)
+        thumbnail = backend.get_thumbnail(self.post.image, geometry, **options)
+        self.assertFalse(getattr(thumbnail, 'is_placeholder', False), 'Готовая миниатюра не найдена')
+        self.assertTrue(thumbnail.exists())
+
+    def test_posts_cached_feeds_refreshed_after_thumbnail(self):
+        '''Проверяем, что готовая миниатюра сменяет заглушку в закешированных лентах.'''
+        geometry, options = thumbnails.FEED_THUMBNAIL
+        url = reverse('posts:profile', kwargs={'username': self.user.username})
+        self.assertContains(self.auth_client.get(url), thumbnails.PLACEHOLDER_URL)
+        thumbnails.generate(self.post.image.name, geometry, options)
+        self.assertContains(self.auth_client.get(url), thumbnails.PLACEHOLDER_URL)
+        thumbnails.refresh_feeds(self.post.image.name)
+        self.assertNotContains(self.auth_client.get(url), thumbnails.PLACEHOLDER_URL)
+
+    def test_posts_thumbnails_resolved_in_one_batch(self):
+        '''Проверяем, что миниатюры страницы ищутся одним запросом, а затем берутся из LRU.'''
+        geometry, options = thumbnails.FEED_THUMBNAIL
+        posts = [self.post] + [
+            Post.objects.create(
+                text=f'Картинка {number}',
+                author=self.user,
+                image=SimpleUploadedFile(f'batch{number}.gif', self.small_gif, 'image/gif'),
+            )
+            for number in range(3)
+        ]
+        for post in posts:
+            thumbnails.generate(post.image.name, geometry, options)
+        cache.clear()
+        thumbnails.resolved.clear()
+        with CaptureQueriesContext(connection) as queries:
+            thumbnails.attach_thumbnails(posts)
+        self.assertEqual(len(queries), 1, 'Метаданные миниатюр запрашиваются по одной')
+        for post in posts:
+            self.assertFalse(post.thumbnail.is_placeholder)
+        with CaptureQueriesContext(connection) as queries:
+            thumbnails.attach_thumbnails(posts)
+        self.assertEqual(len(queries), 0, 'Готовые миниатюры не берутся из LRU процесса')
+
 class TestPostsCommnets(TestCase):
     
     @classmethod
@@ -287,16 +479,122 @@ class TestPostsIndexCache(TestCase):
             author = cls.user
         )
 
+    def setUp(self):
+        cache.clear()
+
     def test_posts_cache_working(self):
         '''Проверяем работу кеша на главной странице.'''
         response_one = self.auth_client.get(reverse('posts:index'))
-        self.post.delete()
+        # update() не шлёт сигналов, поэтому поколение кеша не меняется.
+        Post.objects.filter(pk=self.post.pk).update(text='Тест без сигнала')
         response_two = self.auth_client.get(reverse('posts:index'))
         self.assertEqual(response_one.content, response_two.content, 'Главная страница не кешируется')
         cache.clear()
         response_three = self.auth_client.get(reverse('posts:index'))
         self.assertNotEqual(response_two.content, response_three.content, 'Кеш отчищен, но контент не изменился.')
 
+    def test_posts_cache_invalidated_by_changes(self):
+        '''Проверяем, что изменения постов и групп сразу сбрасывают нужные страницы.'''
+        group = Group.objects.create(title='Кеш', slug='cache-group', description='-')
+        urls = [
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': group.slug}),
+            reverse('posts:profile', kwargs={'username': self.user.username}),
+        ]
+        post = Post.objects.create(text='Пост без группы', author=self.user)
+        before = [self.auth_client.get(url).content for url in urls]
+        post.group = group
+        post.save()
+        after = [self.auth_client.get(url).content for url in urls]
+        for url, old, new in zip(urls, before, after):
+            with self.subTest(url=url):
+                self.assertNotEqual(old, new, f'Страница {url} не обновилась после правки поста')
+        other_group = Group.objects.create(title='Другая', slug='other-group', description='-')
+        other_url = reverse('posts:group_list', kwargs={'slug': other_group.slug})
+        cached = self.auth_client.get(other_url).content
+        post.delete()
+        self.assertEqual(cached, self.auth_client.get(other_url).content)
+
+class TestPostsCards(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='Card')
+        cls.auth_client = Client()
+        cls.auth_client.force_login(cls.user)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_post_card_cached_and_refreshed_by_edit(self):
+        '''Проверяем, что карточка поста кешируется и обновляется после правки.'''
+        post = Post.objects.create(text='Карточка до правки', author=self.user)
+        self.auth_client.get(reverse('posts:index'))
+        old_key = card_key(post)
+        self.assertIn('Карточка до правки', cache.get(old_key), 'Карточка поста не попала в кеш')
+        self.auth_client.post(
+            reverse('posts:post_edit', kwargs={'post_id': post.pk}),
+            data={'text': 'Карточка после правки'},
+        )
+        post.refresh_from_db()
+        self.assertNotEqual(old_key, card_key(post), 'Версия карточки не изменилась после правки')
+        urls = [
+            reverse('posts:index'),
+            reverse('posts:profile', kwargs={'username': self.user.username}),
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.auth_client.get(url)
+                self.assertContains(response, 'Карточка после правки')
+                self.assertNotContains(response, 'Карточка до правки')
+
+
+class TestPostsSearch(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='Finder')
+        cls.guest_client = Client()
+
+    def test_posts_search_finds_ranks_and_follows_edits(self):
+        '''Проверяем поиск по словоформам, ранжирование и обновление индекса.'''
+        weak = Post.objects.create(text='Заметка про котов и собак', author=self.user)
+        strong = Post.objects.create(text='Коты, коты и ещё раз коты', author=self.user)
+        Post.objects.create(text='Совсем о другом', author=self.user)
+        response = self.guest_client.get(reverse('posts:search'), {'q': 'КОТ'})
+        self.assertEqual(list(response.context['page_obj']), [strong, weak])
+        weak.text = 'Теперь только про собак'
+        weak.save()
+        strong.delete()
+        response = self.guest_client.get(reverse('posts:search'), {'q': 'кот'})
+        self.assertEqual(list(response.context['page_obj']), [])
+        response = self.guest_client.get(reverse('posts:search'), {'q': '"собак'})
+        self.assertEqual(list(response.context['page_obj']), [weak])
+
+    def test_posts_search_pages_by_number(self):
+        '''Проверяем, что страницы поиска идут по номерам без пропусков и повторов и ссылки сохраняют запрос.'''
+        Post.objects.bulk_create(
+            Post(text=f'Поиск страница {number}', author=self.user)
+            for number in range(views.POSTS_PER_PAGE + 5)
+        )
+        self.assertEqual(search.rebuild(), views.POSTS_PER_PAGE + 5)
+        url = reverse('posts:search')
+        response = self.guest_client.get(url, {'q': 'поиск'})
+        first = response.context['page_obj']
+        self.assertEqual(len(first), views.POSTS_PER_PAGE)
+        self.assertContains(response, '?q=%D0%BF%D0%BE%D0%B8%D1%81%D0%BA&page=2')
+        # Правка другого поста меняет статистику bm25, но не порядок страниц.
+        Post.objects.create(text='Совсем о другом', author=self.user)
+        second = self.guest_client.get(
+            url, {'q': 'поиск', 'page': 2}
+        ).context['page_obj']
+        self.assertEqual(len(second), 5)
+        seen = [post.pk for post in list(first) + list(second)]
+        self.assertEqual(len(set(seen)), views.POSTS_PER_PAGE + 5)
+
+
 class TestPostsFollows(TestCase):
 
     def setUp(self):
@@ -334,6 +632,11 @@ class TestPostsFollows(TestCase):
             follow = True
         self.assertTrue(follow, 'Отписки не работают.')
 
+    def test_posts_unfollow_without_follow(self):
+        '''Проверяем, что отписка от автора, на которого нет подписки, не падает.'''
+        response = self.third_auth_client.get(reverse('posts:profile_unfollow', kwargs={"username": self.second_user.username}))
+        self.assertRedirects(response, reverse('posts:profile', kwargs={"username": self.second_user.username}))
+
     def test_posts_followed_users_see_only_needed_posts(self):
         '''Проверяем, что новая запись пользователя появляется в ленте тех, кто на него подписан и не появляется в ленте тех, кто не подписан.'''
 
@@ -342,4 +645,508 @@ class TestPostsFollows(TestCase):
         self.second_auth_client.post(reverse('posts:post_create'), data={"text": "hello, my subcribers 3"})
         response_by_follower = self.first_auth_client.get(reverse('posts:follow_index'))
         response_by_not_follower = self.third_auth_client.get(reverse('posts:follow_index'))
-        self.assertNotEqual(response_by_not_follower, response_by_follower, 'С появлением избранных постов что-то не так.')
\ No newline at end of file
+        self.assertNotEqual(response_by_not_follower, response_by_follower, 'С появлением избранных постов что-то не так.')
+
+class TestPostsTimeline(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='reader')
+        cls.author = User.objects.create_user(username='writer')
+        cls.reader_client = Client()
+        cls.reader_client.force_login(cls.reader)
+        cls.author_client = Client()
+        cls.author_client.force_login(cls.author)
+        cls.old_post = Post.objects.create(text='Старый пост', author=cls.author)
+
+    def feed(self):
+        response = self.reader_client.get(reverse('posts:follow_index'))
+        return [post.pk for post in response.context['page_obj']]
+
+    def follow(self):
+        self.reader_client.get(reverse(
+            'posts:profile_follow', kwargs={'username': self.author.username}
+        ))
+
+    def test_posts_timeline_backfill_fan_out_and_prune(self):
+        '''Проверяем, что лента заполняется при подписке и публикации и очищается при отписке.'''
+        self.follow()
+        self.assertEqual(self.feed(), [self.old_post.pk])
+        self.author_client.post(reverse('posts:post_create'), data={'text': 'Новый пост'})
+        new_post = Post.objects.get(text='Новый пост')
+        self.assertEqual(self.feed(), [new_post.pk, self.old_post.pk])
+        self.reader_client.get(reverse(
+            'posts:profile_unfollow', kwargs={'username': self.author.username}
+        ))
+        self.assertEqual(self.feed(), [])
+        self.assertFalse(TimelineEntry.objects.filter(user=self.reader).exists())
+
+    def test_posts_timeline_fans_out_posts_created_outside_form(self):
+        '''Проверяем, что пост, созданный не через форму, тоже попадает в ленту подписчиков.'''
+        self.follow()
+        post = Post.objects.create(text='Пост из консоли', author=self.author)
+        self.assertTrue(
+            TimelineEntry.objects.filter(user=self.reader, post=post).exists()
+        )
+        self.assertEqual(self.feed(), [post.pk, self.old_post.pk])
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=0)
+    def test_posts_timeline_pulls_heavy_authors(self):
+        '''Проверяем, что посты популярного автора подтягиваются при чтении ленты.'''
+        self.follow()
+        self.author_client.post(reverse('posts:post_create'), data={'text': 'Пост для всех'})
+        new_post = Post.objects.get(text='Пост для всех')
+        self.assertTrue(PullAuthor.objects.filter(author=self.author).exists())
+        self.assertFalse(TimelineEntry.objects.filter(post=new_post).exists())
+        self.assertEqual(self.feed(), [new_post.pk, self.old_post.pk])
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=0)
+    def test_posts_timeline_rebuild_pulls_popular_authors(self):
+        '''Проверяем, что пересборка ленты переводит на чтение автора с большим числом подписчиков.'''
+        Follow.objects.create(user=self.reader, author=self.author)
+        timeline.rebuild(self.reader)
+        self.assertTrue(PullAuthor.objects.filter(author=self.author).exists())
+        self.assertFalse(TimelineEntry.objects.filter(user=self.reader).exists())
+        self.assertEqual(self.feed(), [self.old_post.pk])
+
+    def test_posts_timeline_merges_pull_authors(self):
+        '''Проверяем, что лента сливает записи читателя с постами pull-авторов по дате.'''
+        star = User.objects.create_user(username='star')
+        PullAuthor.objects.create(author=star)
+        self.follow()
+        self.reader_client.get(reverse(
+            'posts:profile_follow', kwargs={'username': star.username}
+        ))
+        for i in range(12):
+            author = star if i % 2 else self.author
+            Post.objects.create(text=f'Пост {i}', author=author)
+        expected = list(
+            Post.objects.filter(author__in=[star, self.author])
+            .values_list('pk', flat=True)
+        )
+        self.assertEqual(len(expected), 13)
+        first_page = self.feed()
+        response = self.reader_client.get(reverse('posts:follow_index'), {'page': 2})
+        second_page = [post.pk for post in response.context['page_obj']]
+        self.assertEqual(first_page + second_page, expected)
+        cache.clear()
+        with override_settings(POSTS_CURSOR_PAGINATION=True):
+            first = self.reader_client.get(
+                reverse('posts:follow_index')
+            ).context['page_obj']
+            second = self.reader_client.get(
+                reverse('posts:follow_index'), {'after': first.next_cursor}
+            ).context['page_obj']
+        self.assertEqual(
+            [post.pk for post in first] + [post.pk for post in second],
+            expected,
+        )
+
+    def test_posts_timeline_count_is_cached_per_generation(self):
+        '''Проверяем, что число постов ленты подписок берётся из кеша, пока подписки не менялись.'''
+        self.follow()
+        self.assertEqual(self.feed(), [self.old_post.pk])
+        feed_cache.bump('global')
+        with CaptureQueriesContext(connection) as queries:
+            self.feed()
+        self.assertFalse(
+            [query for query in queries if 'COUNT(' in query['sql']]
+        )
+        star = User.objects.create_user(username='count_star')
+        PullAuthor.objects.create(author=star)
+        Post.objects.create(text='Пост звезды', author=star)
+        self.reader_client.get(reverse(
+            'posts:profile_follow', kwargs={'username': star.username}
+        ))
+        response = self.reader_client.get(reverse('posts:follow_index'))
+        self.assertEqual(response.context['page_obj'].paginator.count, 2)
+
+    @override_settings(TIMELINE_MAX_PAGES=1)
+    def test_posts_timeline_page_numbers_are_capped(self):
+        '''Проверяем, что номера страниц ленты подписок ограничены, а дальше она листается курсором.'''
+        self.follow()
+        for i in range(12):
+            Post.objects.create(text=f'Пост {i}', author=self.author)
+        expected = list(
+            Post.objects.filter(author=self.author).values_list('pk', flat=True)
+        )
+        response = self.reader_client.get(reverse('posts:follow_index'), {'page': 5})
+        page_obj = response.context['page_obj']
+        self.assertEqual(page_obj.number, 1)
+        self.assertEqual(page_obj.paginator.num_pages, 1)
+        self.assertIsNotNone(page_obj.next_cursor)
+        self.assertContains(response, f'after={page_obj.next_cursor}')
+        rest = self.reader_client.get(
+            reverse('posts:follow_index'), {'after': page_obj.next_cursor}
+        ).context['page_obj']
+        self.assertEqual(
+            [post.pk for post in page_obj] + [post.pk for post in rest],
+            expected,
+        )
+
+    def test_posts_timeline_walks_date_index_for_many_pull_authors(self):
+        '''
+        Проверяем, что проход индекса дат для читателя многих
+        pull-авторов даёт те же страницы, что и слияние по авторам,
+        и не зависит от числа авторов по числу запросов.
+        '''
+        stars = []
+        for number in range(4):
+            star = User.objects.create_user(username=f'walk_star{number}')
+            PullAuthor.objects.create(author=star)
+            Follow.objects.create(user=self.reader, author=star)
+            stars.append(star)
+        stranger = User.objects.create_user(username='walk_stranger')
+        PullAuthor.objects.create(author=stranger)
+        for i in range(25):
+            author = stranger if i % 5 == 0 else stars[i % 4]
+            Post.objects.create(text=f'Пост {i}', author=author)
+        pages = {}
+        variants = {
+            'merge': {'TIMELINE_MERGE_AUTHORS': 20},
+            'walk': {'TIMELINE_MERGE_AUTHORS': 0},
+            # Проход упирается в границу и уступает слиянию, которое
+            # идёт пачками по два автора.
+            'bounded': {'TIMELINE_MERGE_AUTHORS': 0, 'TIMELINE_WALK_ROWS': 3},
+        }
+        for name, options in variants.items():
+            with override_settings(**options), \
+                    mock.patch.object(timeline, 'MERGE_BRANCHES', 2):
+                feed = timeline.feed(self.reader)
+                paginator = CursorPaginator(feed, 10)
+                first = paginator.page()
+                with CaptureQueriesContext(connection) as queries:
+                    second = paginator.page(after=first.next_cursor)
+                pages[name] = (
+                    [post.pk for post in first] + [post.pk for post in second],
+                    len(queries),
+                    feed.count(),
+                )
+        expected = list(
+            Post.objects.filter(author__in=stars).values_list('pk', flat=True)
+        )
+        for name in variants:
+            self.assertEqual(pages[name][0], expected, name)
+            self.assertEqual(pages[name][2], 20, name)
+        # Последней странице прохода не хватает строки для has_next,
+        # и её добирает слияние: две пачки ключей и посты по ключу.
+        self.assertEqual(
+            [pages[name][1] for name in variants], [4, 5, 5]
+        )
+
+    def test_posts_timeline_merge_fits_query_params_limit(self):
+        '''Проверяем, что слияние сотен pull-авторов с курсором укладывается в лимит параметров SQLite.'''
+        User.objects.bulk_create(
+            User(username=f'merge_star{number}') for number in range(260)
+        )
+        stars = list(User.objects.filter(username__startswith='merge_star'))
+        PullAuthor.objects.bulk_create(PullAuthor(author=star) for star in stars)
+        Post.objects.bulk_create(
+            Post(text=f'Пост {star.pk}', author=star) for star in stars
+        )
+        posts = list(Post.objects.filter(author__in=stars).order_by('-pub_date', '-pk'))
+        feed = timeline.PullAuthorsFeed(self.reader, [star.pk for star in stars])
+        connection.ensure_connection()
+        raw = connection.connection
+        limit = raw.getlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER)
+        raw.setlimit(
+            sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER,
+            connection.features.max_query_params,
+        )
+        try:
+            rows = feed._merge((posts[0].pub_date, posts[0].pk), False, 10)
+        finally:
+            raw.setlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER, limit)
+        self.assertEqual(rows, posts[1:11])
+
+
+@override_settings(QUERY_BUDGET_STRICT=True)
+class TestPostsQueryBudget(TestCase):
+    """Бюджет запросов view не должен зависеть от числа постов."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(
+            username='budget_author', first_name='Бюджет', last_name='Автор'
+        )
+        cls.reader = User.objects.create_user(username='budget_reader')
+        cls.star = User.objects.create_user(username='budget_star')
+        PullAuthor.objects.create(author=cls.star)
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        Follow.objects.create(user=cls.reader, author=cls.star)
+        cls.group = Group.objects.create(
+            title='Бюджетная группа', slug='budget-group', description='-'
+        )
+        cls.client_reader = Client()
+        cls.client_reader.force_login(cls.reader)
+
+    def setUp(self):
+        cache.clear()
+
+    def add_posts(self, count):
+        Post.objects.bulk_create(
+            Post(
+                text=f'Пост {i}',
+                author=self.star if i % 10 == 0 else self.author,
+                group=self.group,
+            )
+            for i in range(count)
+        )
+        post_ids = Post.objects.filter(author=self.author).values_list(
+            'pk', 'pub_date'
+        )
+        TimelineEntry.objects.bulk_create(
+            TimelineEntry(
+                user=self.reader, post_id=pk, author=self.author,
+                pub_date=pub_date,
+            )
+            for pk, pub_date in post_ids
+        )
+        post = Post.objects.filter(author=self.author).first()
+        Comment.objects.bulk_create(
+            Comment(post=post, author=self.reader, text=f'Комментарий {i}')
+            for i in range(count)
+        )
+        return post
+
+    def assert_views_within_budget(self, post):
+        urls = {
+            reverse('posts:index'): views.index,
+            reverse('posts:group_list', args=[self.group.slug]): views.group_posts,
+            reverse('posts:profile', args=[self.author.username]): views.profile,
+            reverse('posts:post_detail', args=[post.pk]): views.post_detail,
+            reverse('posts:follow_index'): views.follow_index,
+        }
+        for url, view in urls.items():
+            for query in ({}, {'page': 2}):
+                with self.subTest(url=url, query=query):
+                    cache.clear()
+                    with CaptureQueriesContext(connection) as queries:
+                        response = self.client_reader.get(url, query)
+                    self.assertEqual(response.status_code, 200)
+                    self.assertLessEqual(len(queries), view.query_budget)
+
+    def test_posts_views_fit_query_budget_with_10_posts(self):
+        """Проверяем бюджет запросов лент и поста на 10 постах."""
+        self.assert_views_within_budget(self.add_posts(10))
+
+    def test_posts_views_fit_query_budget_with_10000_posts(self):
+        """Проверяем бюджет запросов лент и поста на 10 000 постах."""
+        self.assert_views_within_budget(self.add_posts(10000))
+
+
+class TestPostsConditionalGet(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='Conditional')
+        cls.group = Group.objects.create(
+            title='Условный GET', slug='conditional', description='-'
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client_author = Client()
+        self.client_author.force_login(self.user)
+        self.post = Post.objects.create(
+            text='Исходный текст', author=self.user, group=self.group
+        )
+
+    def test_posts_not_modified_before_render(self):
+        '''Проверяем 304 без отрисовки шаблона и ответ 200 после правки поста.'''
+        urls = [
+            reverse('posts:post_detail', args=[self.post.pk]),
+            reverse('posts:group_list', args=[self.group.slug]),
+            reverse('posts:profile', args=[self.user.username]),
+        ]
+        responses = {url: self.client_author.get(url) for url in urls}
+        for url, response in responses.items():
+            with self.subTest(url=url):
+                not_modified = self.client_author.get(
+                    url, HTTP_IF_NONE_MATCH=response['ETag']
+                )
+                self.assertEqual(not_modified.status_code, 304)
+                self.assertFalse(not_modified.templates)
+        # Last-Modified точен до секунды.
+        sleep(1)
+        self.client_author.post(
+            reverse('posts:post_edit', args=[self.post.pk]),
+            {'text': 'Новый текст', 'group': self.group.pk},
+        )
+        for url, response in responses.items():
+            with self.subTest(url=url):
+                by_etag = self.client_author.get(
+                    url, HTTP_IF_NONE_MATCH=response['ETag']
+                )
+                self.assertEqual(by_etag.status_code, 200)
+                by_date = self.client_author.get(
+                    url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']
+                )
+                self.assertEqual(by_date.status_code, 200)
+
+
+    def test_posts_conditional_pages_revalidate_privately(self):
+        '''Проверяем, что условные страницы браузер хранит только у себя и всегда сверяет.'''
+        urls = [
+            reverse('posts:post_detail', args=[self.post.pk]),
+            reverse('posts:post_comments', args=[self.post.pk]),
+            reverse('posts:group_list', args=[self.group.slug]),
+            reverse('posts:profile', args=[self.user.username]),
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.client_author.get(url)
+                self.assertIn('private', response['Cache-Control'])
+                self.assertIn('no-cache', response['Cache-Control'])
+                not_modified = self.client_author.get(
+                    url, HTTP_IF_NONE_MATCH=response['ETag']
+                )
+                self.assertIn('no-cache', not_modified['Cache-Control'])
+
+    def test_posts_post_etag_changes_with_csrf_token_on_login(self):
+        '''Проверяем, что после нового входа страница поста с формой отдаётся заново, с новым токеном CSRF.'''
+        self.user.set_password('conditional-password')
+        self.user.save()
+        credentials = {
+            'username': self.user.username,
+            'password': 'conditional-password',
+        }
+        url = reverse('posts:post_detail', args=[self.post.pk])
+        self.client.post(reverse('users:login'), credentials)
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(
+            self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304
+        )
+        self.client.get(reverse('users:logout'))
+        self.client.post(reverse('users:login'), credentials)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'csrfmiddlewaretoken')
+
+
+class TestPostsComments(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='Commentator')
+        cls.post = Post.objects.create(text='Вирусный пост', author=cls.user)
+        Comment.objects.bulk_create(
+            Comment(post=cls.post, author=cls.user, text=f'Комментарий {i}')
+            for i in range(25)
+        )
+        counters.recount_posts([cls.post.pk])
+
+    def setUp(self):
+        cache.clear()
+        self.auth_client = Client()
+        self.auth_client.force_login(self.user)
+
+    def test_posts_comments_first_page_inline_rest_by_fragment(self):
+        '''
+        Проверяем, что на странице поста только первая страница
+        комментариев, а остальные отдаёт фрагмент одним запросом.
+        '''
+        url = reverse('posts:post_detail', args=[self.post.pk])
+        comments = self.client.get(url).context['comments']
+        self.assertEqual(len(comments), 20)
+        self.assertEqual(comments[0].text, 'Комментарий 0')
+        self.assertTrue(comments.has_next())
+        more = reverse('posts:post_comments', args=[self.post.pk])
+        with self.assertNumQueries(1):
+            response = self.client.get(more, {'after': comments.next_cursor})
+        self.assertEqual(
+            [comment.text for comment in response.context['comments']],
+            [f'Комментарий {i}' for i in range(20, 25)],
+        )
+        self.assertNotContains(response, 'data-comments-more')
+        missing = reverse('posts:post_comments', args=[self.post.pk + 100])
+        self.assertEqual(self.client.get(missing).status_code, 404)
+
+    def test_posts_comments_past_first_page_keep_post_etag(self):
+        '''
+        Проверяем, что комментарий за первой страницей не меняет
+        ETag страницы поста, а меняет ETag фрагмента комментариев.
+        '''
+        post_url = reverse('posts:post_detail', args=[self.post.pk])
+        more_url = reverse('posts:post_comments', args=[self.post.pk])
+        post_etag = self.client.get(post_url)['ETag']
+        more_etag = self.client.get(more_url)['ETag']
+        self.auth_client.post(
+            reverse('posts:add_comment', args=[self.post.pk]),
+            {'text': 'Поздний комментарий'},
+        )
+        response = self.client.get(post_url, HTTP_IF_NONE_MATCH=post_etag)
+        self.assertEqual(response.status_code, 304)
+        response = self.client.get(more_url, HTTP_IF_NONE_MATCH=more_etag)
+        self.assertEqual(response.status_code, 200)
+        fresh = Post.objects.create(text='Новый пост', author=self.user)
+        fresh_url = reverse('posts:post_detail', args=[fresh.pk])
+        fresh_etag = self.client.get(fresh_url)['ETag']
+        self.auth_client.post(
+            reverse('posts:add_comment', args=[fresh.pk]),
+            {'text': 'Первый комментарий'},
+        )
+        response = self.client.get(fresh_url, HTTP_IF_NONE_MATCH=fresh_etag)
+        self.assertContains(response, 'Первый комментарий')
+
+
+class TestPostsFollowGraph(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = User.objects.create_user(username='graph_reader')
+        cls.authors = [
+            User.objects.create_user(username=f'graph_author{number}')
+            for number in range(3)
+        ]
+
+    def setUp(self):
+        cache.clear()
+        follow_graph.graph.clear()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def follow(self, author, action='posts:profile_follow'):
+        self.reader_client.get(reverse(action, args=[author.username]))
+
+    def test_posts_follow_graph_updates_without_reload(self):
+        '''
+        Проверяем, что подписка и отписка меняют граф в памяти,
+        и проверка подписки после этого не обращается к БД.
+        '''
+        graph = follow_graph.graph
+        first, second, third = self.authors
+        self.follow(third)
+        self.assertEqual(list(graph.following(self.reader.pk)), [third.pk])
+        self.follow(first)
+        self.follow(second)
+        self.follow(third, 'posts:profile_unfollow')
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                list(graph.following(self.reader.pk)), [first.pk, second.pk]
+            )
+            self.assertTrue(graph.is_following(self.reader.pk, first.pk))
+            self.assertFalse(graph.is_following(self.reader.pk, third.pk))
+        response = self.reader_client.get(
+            reverse('posts:profile', args=[first.username])
+        )
+        self.assertTrue(response.context['following'])
+
+    def test_posts_follow_graph_is_bounded_and_sees_pull_authors(self):
+        '''
+        Проверяем вытеснение по LRU и то, что новый pull-автор
+        сбрасывает записи графа.
+        '''
+        graph = follow_graph.FollowGraph(max_size=2)
+        users = [self.reader, *self.authors]
+        for user in users:
+            graph.following(user.pk)
+        self.assertEqual(list(graph._items), [users[2].pk, users[3].pk])
+        Follow.objects.create(user=self.reader, author=self.authors[0])
+        self.assertEqual(list(graph.pull_authors(self.reader.pk)), [])
+        PullAuthor.objects.create(author=self.authors[0])
+        self.assertEqual(
+            list(graph.pull_authors(self.reader.pk)), [self.authors[0].pk]
+        )
@@ -0,0 +1,307 @@
+import logging
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connections, transaction
+from sorl.thumbnail import default
+from sorl.thumbnail.base import ThumbnailBackend
+from sorl.thumbnail.conf import defaults as sorl_defaults
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.kvstores.cached_db_kvstore import EMPTY_VALUE
+from sorl.thumbnail.models import KVStore
+from sorl.thumbnail.parsers import parse_geometry
+
+from core import metrics, timing
+
+from . import feed_cache
+from .models import Post
+
+
+logger = logging.getLogger(__name__)
+
+# Все размеры, которые запрашивают шаблоны постов; при загрузке
+# картинки миниатюры для них готовятся заранее.
+THUMBNAIL_SIZES = [
+    ("960x339", {"crop": "center", "upscale": True}),
+]
+PLACEHOLDER_URL = (
+    "data:image/svg+xml,%3Csvg%20xmlns=%27http://www.w3.org/2000/svg%27%3E"
+    "%3Crect%20width=%27100%25%27%20height=%27100%25%27"
+    "%20fill=%27%23e9ecef%27/%3E%3C/svg%3E"
+)
+
+# Размер картинки в лентах: его отдаёт attach_thumbnails.
+FEED_THUMBNAIL = THUMBNAIL_SIZES[0]
+
+_executor = None
+_executor_lock = threading.Lock()
+# Миниатюры, уже поставленные в очередь: ключ -> время постановки.
+# Если коммит так и не случился, через PENDING_TIMEOUT ставим снова.
+_pending = {}
+_pending_lock = threading.Lock()
+PENDING_TIMEOUT = 60
+
+
+ResolvedThumbnail = namedtuple("ResolvedThumbnail", "url width height")
+ResolvedThumbnail.is_placeholder = False
+
+
+class PlaceholderImage:
+    """Заглушка с размерами миниатюры, пока та готовится в фоне."""
+
+    url = PLACEHOLDER_URL
+    is_placeholder = True
+
+    def __init__(self, geometry_string):
+        self.width, self.height = parse_geometry(geometry_string)
+
+    def exists(self):
+        return False
+
+
+class AsyncThumbnailBackend(ThumbnailBackend):
+    """
+    Бэкенд sorl-thumbnail, который не ресайзит картинку в запросе.
+    Готовая миниатюра берётся из kvstore, иначе её генерация уходит
+    в фоновый пул, а шаблон получает PlaceholderImage.
+    """
+
+    def _prepare_options(self, source, options):
+        # Та же нормализация, что в ThumbnailBackend.get_thumbnail:
+        # от неё зависит имя файла миниатюры.
+        if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault("format", self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(sorl_settings, attr)
+            if value != getattr(sorl_defaults, attr):
+                options.setdefault(key, value)
+        return options
+
+    def get_thumbnail(self, file_, geometry_string, **options):
+        if not settings.THUMBNAIL_ASYNC or not file_:
+            return super().get_thumbnail(file_, geometry_string, **options)
+        source = ImageFile(file_)
+        prepared = self._prepare_options(source, dict(options))
+        name = self._get_thumbnail_filename(source, geometry_string, prepared)
+        cached = default.kvstore.get(ImageFile(name, default.storage))
+        if cached:
+            return cached
+        schedule(source.name, geometry_string, options)
+        return PlaceholderImage(geometry_string)
+
+    def generate(self, name, geometry_string, options):
+        return super().get_thumbnail(name, geometry_string, **options)
+
+    def thumbnail_file(self, file_, geometry_string, options):
+        """ImageFile миниатюры без обращения к хранилищу и kvstore."""
+        source = ImageFile(file_)
+        prepared = self._prepare_options(source, dict(options))
+        name = self._get_thumbnail_filename(source, geometry_string, prepared)
+        return ImageFile(name, default.storage)
+
+
+class ResolvedCache:
+    """
+    Ограниченный LRU готовых миниатюр в памяти процесса: имя файла
+    миниатюры -> url и размеры. Заглушки сюда не попадают, поэтому
+    миниатюра, доделанная в фоне, подхватывается следующим запросом.
+    """
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._items.get(key)
+            if value is not None:
+                self._items.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+
+resolved = ResolvedCache(settings.THUMBNAIL_LRU_SIZE)
+
+
+def _get_executor():
+    global _executor
+    # Пул создаётся лениво, уже в процессе воркера: потоки не
+    # переживают fork при запуске gunicorn с preload.
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.THUMBNAIL_WORKERS,
+                thread_name_prefix="thumbnails",
+            )
+        return _executor
+
+
+def generate(name, geometry_string, options):
+    """
+    Синхронно создаёт миниатюру и кладёт её в kvstore. Возвращает,
+    удалось ли это.
+    """
+    started = time.perf_counter()
+    result = "ok"
+    try:
+        AsyncThumbnailBackend().generate(name, geometry_string, dict(options))
+    except Exception:
+        result = "error"
+        logger.exception("Не удалось создать миниатюру %s", name)
+    finally:
+        with _pending_lock:
+            _pending.pop((name, geometry_string), None)
+        metrics.registry.inc(
+            "yatube_thumbnails_generated_total", result=result
+        )
+        metrics.registry.observe(
+            "yatube_thumbnail_generation_seconds",
+            time.perf_counter() - started,
+        )
+    return result == "ok"
+
+
+def refresh_feeds(name):
+    """
+    Сдвигает области лент с постами картинки name: закешированные
+    страницы выводят заглушку вместо готовой миниатюры. Карточки
+    ключуются адресом миниатюры и при новом рендере ленты тоже
+    перестают находиться.
+    """
+    scopes = set()
+    posts = Post.objects.filter(image=name).select_related("author", "group")
+    for post in posts:
+        scopes.update(feed_cache.post_scopes(post))
+    if scopes:
+        feed_cache.bump(*scopes)
+
+
+def _generate_in_background(name, geometry_string, options):
+    try:
+        if generate(name, geometry_string, options):
+            refresh_feeds(name)
+    finally:
+        # Соединения с БД, открытые kvstore в потоке пула, иначе
+        # остались бы висеть до конца процесса.
+        connections.close_all()
+
+
+def schedule(name, geometry_string, options):
+    """
+    Ставит генерацию в фоновый пул после коммита транзакции, чтобы
+    поток не читал картинку раньше, чем пост сохранён. Повторные
+    запросы одной миниатюры, пока она готовится, не дублируются.
+    """
+    key = (name, geometry_string)
+    now = time.monotonic()
+    # Проверка и постановка из потоков запросов идут под замком,
+    # как и снятие из потоков пула: иначе два запроса поставят
+    # одну миниатюру дважды.
+    with _pending_lock:
+        if now - _pending.get(key, -PENDING_TIMEOUT) < PENDING_TIMEOUT:
+            return
+        _pending[key] = now
+    transaction.on_commit(
+        lambda: _get_executor().submit(
+            _generate_in_background, name, geometry_string, options
+        )
+    )
+
+
+def queue_for_post(post):
+    """Заранее готовит миниатюры картинки поста для всех шаблонов."""
+    if not post.image:
+        return
+    for geometry_string, options in THUMBNAIL_SIZES:
+        schedule(post.image.name, geometry_string, options)
+
+
+def _kvstore_lookup(raw_keys):
+    """
+    Метаданные миниатюр из kvstore пачкой: один get_many к кешу
+    и один запрос к таблице kvstore для промахов вместо обращения
+    на каждую картинку.
+    """
+    kvstore = default.kvstore
+    if not hasattr(kvstore, "cache"):
+        return {key: kvstore._get_raw(key) for key in raw_keys}
+    found = {
+        key: value
+        for key, value in kvstore.cache.get_many(raw_keys).items()
+        if value != EMPTY_VALUE
+    }
+    missing = [key for key in raw_keys if key not in found]
+    if missing:
+        rows = dict(
+            KVStore.objects.filter(key__in=missing).values_list(
+                "key", "value"
+            )
+        )
+        if rows:
+            kvstore.cache.set_many(
+                rows, sorl_settings.THUMBNAIL_CACHE_TIMEOUT
+            )
+        found.update(rows)
+    return found
+
+
+def attach_thumbnails(posts, size=FEED_THUMBNAIL):
+    """
+    Проставляет постам с картинкой post.thumbnail: готовую миниатюру
+    из LRU процесса или kvstore, а для несозданных — заглушку
+    с постановкой генерации в очередь.
+    """
+    with timing.phase("thumb"):
+        return _attach_thumbnails(posts, size)
+
+
+def _attach_thumbnails(posts, size):
+    geometry_string, options = size
+    backend = AsyncThumbnailBackend()
+    pending = {}
+    for post in posts:
+        if not post.image:
+            post.thumbnail = None
+            continue
+        thumbnail = backend.thumbnail_file(
+            post.image, geometry_string, options
+        )
+        post.thumbnail = resolved.get(thumbnail.name)
+        if post.thumbnail is None:
+            key = add_prefix(thumbnail.key)
+            pending.setdefault(key, []).append(post)
+    found = _kvstore_lookup(list(pending)) if pending else {}
+    for key, waiting in pending.items():
+        if found.get(key):
+            image = deserialize_image_file(found[key])
+            thumbnail = ResolvedThumbnail(image.url, image.width, image.height)
+            resolved.set(image.name, thumbnail)
+        elif settings.THUMBNAIL_ASYNC:
+            thumbnail = PlaceholderImage(geometry_string)
+            schedule(waiting[0].image.name, geometry_string, options)
+        else:
+            image = backend.generate(
+                waiting[0].image.name, geometry_string, options
+            )
+            thumbnail = ResolvedThumbnail(image.url, image.width, image.height)
+        for post in waiting:
+            post.thumbnail = thumbnail
+    return posts
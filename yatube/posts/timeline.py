@@ -0,0 +1,429 @@
+import heapq
+from datetime import datetime, timezone
+from itertools import islice
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Count, Exists, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+from . import feed_cache, follow_graph
+from .models import Follow, Post, PullAuthor, TimelineEntry, UserCounters
+from .paginators import (
+    DEFAULT_CURSOR_ORDERING,
+    keyset_filter,
+    reversed_ordering,
+)
+
+
+BATCH_SIZE = 500
+TIMELINE_ORDERING = ("-pub_date", "-post_id")
+# Больше авторов одним UNION ALL не слить: SQLite допускает в нём
+# не больше 500 частей. Меньше их выходит из-за лимита параметров.
+MERGE_BRANCHES = 500
+COUNT_PREFIX = "timeline:count:"
+
+
+def is_pull_author(author_id):
+    return PullAuthor.objects.filter(author_id=author_id).exists()
+
+
+def mark_pull_author(author_id):
+    """
+    Переводит автора на чтение при запросе; решение не откатывается.
+    Разложенные раньше записи удаляются, чтобы посты не задваивались.
+    """
+    _, created = PullAuthor.objects.get_or_create(author_id=author_id)
+    if created:
+        TimelineEntry.objects.filter(author_id=author_id).delete()
+
+
+def _entries(post_rows, user_ids):
+    return [
+        TimelineEntry(
+            user_id=user_id,
+            post_id=post_id,
+            author_id=author_id,
+            pub_date=pub_date,
+        )
+        for user_id in user_ids
+        for post_id, author_id, pub_date in post_rows
+    ]
+
+
+def _bulk_insert(entries):
+    for start in range(0, len(entries), BATCH_SIZE):
+        TimelineEntry.objects.bulk_create(
+            entries[start:start + BATCH_SIZE], ignore_conflicts=True
+        )
+
+
+def fan_out_post(post):
+    """Раскладывает новый пост по лентам подписчиков автора."""
+    if is_pull_author(post.author_id):
+        return
+    limit = settings.TIMELINE_FANOUT_LIMIT
+    follower_ids = list(
+        Follow.objects.filter(author_id=post.author_id).values_list(
+            "user_id", flat=True
+        )[:limit + 1]
+    )
+    if len(follower_ids) > limit:
+        mark_pull_author(post.author_id)
+        return
+    _bulk_insert(
+        _entries([(post.pk, post.author_id, post.pub_date)], follower_ids)
+    )
+
+
+def backfill(user, author):
+    """Добавляет в ленту нового подписчика последние посты автора."""
+    if is_pull_author(author.pk):
+        return
+    limit = settings.TIMELINE_BACKFILL_LIMIT
+    post_rows = list(
+        Post.objects.filter(author=author).values_list(
+            "pk", "author_id", "pub_date"
+        )[:limit + 1]
+    )
+    if len(post_rows) > limit:
+        mark_pull_author(author.pk)
+        return
+    _bulk_insert(_entries(post_rows, [user.pk]))
+
+
+def prune(user, author):
+    """Убирает посты автора из ленты отписавшегося пользователя."""
+    TimelineEntry.objects.filter(user=user, author=author).delete()
+
+
+def rebuild(user):
+    """Пересобирает ленту пользователя по его текущим подпискам."""
+    rebuild_many([user.pk])
+
+
+def _authors_over(queryset, authors, limit):
+    """Авторы из authors, ещё не pull, у которых в queryset > limit строк."""
+    return (
+        queryset.filter(author_id__in=authors)
+        .exclude(author_id__in=PullAuthor.objects.values("author_id"))
+        .order_by()
+        .values("author_id")
+        .annotate(total=Count("*"))
+        .filter(total__gt=limit)
+        .values_list("author_id", flat=True)
+    )
+
+
+def rebuild_many(user_ids):
+    """
+    Пересобирает ленты пользователей одним INSERT ... SELECT вместо
+    backfill на каждую подписку. Как backfill и fan_out_post, авторы,
+    у которых постов больше TIMELINE_BACKFILL_LIMIT или подписчиков
+    больше TIMELINE_FANOUT_LIMIT, переводятся на чтение.
+    """
+    user_ids = list(user_ids)
+    authors = Follow.objects.filter(user_id__in=user_ids).values("author_id")
+    prolific = _authors_over(
+        Post.objects, authors, settings.TIMELINE_BACKFILL_LIMIT
+    )
+    popular = _authors_over(
+        Follow.objects, authors, settings.TIMELINE_FANOUT_LIMIT
+    )
+    for author_id in set(prolific) | set(popular):
+        mark_pull_author(author_id)
+    TimelineEntry.objects.filter(user_id__in=user_ids).delete()
+    placeholders = ", ".join(["%s"] * len(user_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT OR IGNORE INTO {TimelineEntry._meta.db_table} "
+            "(user_id, post_id, author_id, pub_date) "
+            "SELECT follow.user_id, post.id, post.author_id, post.pub_date "
+            f"FROM {Follow._meta.db_table} AS follow "
+            f"JOIN {Post._meta.db_table} AS post "
+            "ON post.author_id = follow.author_id "
+            f"WHERE follow.user_id IN ({placeholders}) "
+            "AND follow.author_id NOT IN ("
+            f"SELECT author_id FROM {PullAuthor._meta.db_table})",
+            user_ids,
+        )
+
+
+def _post_key(post):
+    return post.pub_date, post.pk
+
+
+def _as_posts(rows):
+    for row in rows:
+        yield row.post if isinstance(row, TimelineEntry) else row
+
+
+def _unique(posts):
+    last_pk = None
+    for post in posts:
+        if post.pk != last_pk:
+            yield post
+        last_pk = post.pk
+
+
+def _merge(streams, reverse, limit):
+    """Слияние упорядоченных потоков постов, первые limit без повторов."""
+    if len(streams) == 1:
+        return list(islice(streams[0], limit))
+    merged = heapq.merge(*streams, key=_post_key, reverse=not reverse)
+    return list(islice(_unique(merged), limit))
+
+
+class KeysetRange:
+    """Диапазон одного индекса: строки после курсора с LIMIT."""
+
+    def __init__(self, queryset, ordering):
+        self.queryset = queryset
+        self.ordering = ordering
+
+    def count(self):
+        return self.queryset.count()
+
+    def keyset_rows(self, values, reverse, limit):
+        queryset = self.queryset
+        if values is not None:
+            queryset = queryset.filter(
+                keyset_filter(self.ordering, values, reverse)
+            )
+        ordering = (
+            reversed_ordering(self.ordering) if reverse else self.ordering
+        )
+        return _as_posts(queryset.order_by(*ordering)[:limit])
+
+
+class PullAuthorsFeed:
+    """
+    Посты pull-авторов, на которых подписан читатель. Пока их не больше
+    TIMELINE_MERGE_AUTHORS, страница — k-way слияние диапазонов индекса
+    (author, pub_date) с LIMIT по каждому автору. Для читателя многих
+    авторов страница берётся проходом индекса pub_date от курсора
+    с проверкой подписки через EXISTS по уникальному индексу Follow:
+    проход останавливается на первой странице, и чем больше авторов
+    в подписках, тем он короче. С author__in SQLite сортировал бы
+    все посты этих авторов.
+
+    Проход ограничен TIMELINE_WALK_ROWS постами от курсора: если
+    авторы давно не писали, страница не набирается, и вместо скана
+    всего индекса идёт слияние по авторам.
+    """
+
+    def __init__(self, user, author_ids):
+        self.user = user
+        self.author_ids = author_ids
+
+    def count(self):
+        # Число постов каждого автора уже поддерживают счётчики.
+        total = UserCounters.objects.filter(
+            user__following__user=self.user,
+            user__pull_author__isnull=False,
+        ).aggregate(total=Sum("posts_count"))["total"]
+        return total or 0
+
+    def _posts(self):
+        return Post.objects.select_related("author", "group")
+
+    def _after(self, queryset, values, reverse):
+        """
+        Посты строго после курсора. Лишнее условие на первое поле ключа
+        держит план на диапазоне индекса: с параметрами вместо литералов
+        SQLite иначе разбирает OR курсора на два поиска и сортирует.
+        """
+        if values is None:
+            return queryset
+        name = DEFAULT_CURSOR_ORDERING[0]
+        descending = name.startswith("-") != reverse
+        lookup = "%s__%s" % (name.lstrip("-"), "lte" if descending else "gte")
+        return queryset.filter(
+            keyset_filter(DEFAULT_CURSOR_ORDERING, values, reverse),
+            **{lookup: values[0]},
+        )
+
+    def _ordering(self, reverse):
+        if reverse:
+            return reversed_ordering(DEFAULT_CURSOR_ORDERING)
+        return DEFAULT_CURSOR_ORDERING
+
+    def _walk(self, values, reverse, limit):
+        """
+        Посты от курсора по индексу pub_date, но не дальше даты поста
+        через TIMELINE_WALK_ROWS от курсора: граница — константный
+        подзапрос, поэтому SQLite ставит её концом диапазона индекса.
+        Если постов до конца индекса меньше, граница — край дат.
+        """
+        ordering = self._ordering(reverse)
+        boundary = (
+            self._after(Post.objects.all(), values, reverse)
+            .order_by(*ordering)
+            .values("pub_date")
+        )[settings.TIMELINE_WALK_ROWS:settings.TIMELINE_WALK_ROWS + 1]
+        edge = Value(
+            (datetime.max if reverse else datetime.min).replace(
+                tzinfo=timezone.utc
+            ),
+            output_field=Post._meta.get_field("pub_date"),
+        )
+        lookup = "pub_date__lte" if reverse else "pub_date__gte"
+        followed = Follow.objects.filter(
+            user=self.user, author_id=OuterRef("author_id")
+        )
+        pull = PullAuthor.objects.filter(author_id=OuterRef("author_id"))
+        queryset = (
+            self._after(self._posts(), values, reverse)
+            .filter(**{lookup: Coalesce(Subquery(boundary), edge)})
+            .annotate(is_followed=Exists(followed), is_pull=Exists(pull))
+            .filter(is_followed=True, is_pull=True)
+        )
+        return list(queryset.order_by(*ordering)[:limit])
+
+    def _merge_branch(self, values, reverse):
+        """
+        Часть UNION ALL для одного автора: ключи (pub_date, id) первых
+        постов после курсора по покрывающему индексу (author, pub_date).
+        Условие курсора собирается один раз и возвращается со своими
+        параметрами.
+        """
+        query = self._after(Post.objects.all(), values, reverse).query
+        compiler = query.get_compiler(connection=connection)
+        where, where_params = compiler.compile(query.where)
+        fields = [
+            Post._meta.get_field(name.lstrip("-"))
+            for name in DEFAULT_CURSOR_ORDERING
+        ]
+        order_by = ", ".join(
+            "%s %s" % (
+                field.column,
+                "DESC" if name.startswith("-") else "ASC",
+            )
+            for name, field in zip(self._ordering(reverse), fields)
+        )
+        branch = (
+            f"SELECT * FROM (SELECT {fields[0].column}, {fields[1].column} "
+            f"FROM {Post._meta.db_table} WHERE author_id = %s"
+            + (f" AND ({where})" if where else "")
+            + f" ORDER BY {order_by} LIMIT %s)"
+        )
+        return branch, list(where_params)
+
+    def _merge_keys(self, branch, where_params, author_ids, limit):
+        """Ключи первых limit постов каждого автора одним UNION ALL."""
+        # Параметры каждой части перечисляются явно: автор, курсор, LIMIT.
+        params = []
+        for author_id in author_ids:
+            params += [author_id, *where_params, limit]
+        with connection.cursor() as cursor:
+            cursor.execute(
+                " UNION ALL ".join([branch] * len(author_ids)), params
+            )
+            return cursor.fetchall()
+
+    def _merge(self, values, reverse, limit):
+        """
+        Слияние ключей авторов пачками UNION ALL, сортировка ключей
+        в Python и один запрос самих постов по первичному ключу. Пачка
+        не больше MERGE_BRANCHES частей и не больше, чем позволяет
+        лимит параметров запроса: у каждой части автор, курсор и LIMIT.
+        """
+        branch, where_params = self._merge_branch(values, reverse)
+        size = min(
+            MERGE_BRANCHES,
+            connection.features.max_query_params // (2 + len(where_params)),
+        )
+        keys = []
+        for start in range(0, len(self.author_ids), size):
+            keys += self._merge_keys(
+                branch,
+                where_params,
+                self.author_ids[start:start + size],
+                limit,
+            )
+        keys.sort(reverse=not reverse)
+        pks = [pk for _, pk in keys[:limit]]
+        posts = self._posts().in_bulk(pks)
+        return [posts[pk] for pk in pks if pk in posts]
+
+    def keyset_rows(self, values, reverse, limit):
+        if len(self.author_ids) > settings.TIMELINE_MERGE_AUTHORS:
+            rows = self._walk(values, reverse, limit)
+            if len(rows) == limit:
+                return rows
+        return self._merge(values, reverse, limit)
+
+
+class MergedFeed:
+    """
+    Лента, слитая из нескольких упорядоченных источников: диапазона
+    TimelineEntry читателя и постов pull-авторов (PullAuthorsFeed).
+    Каждый источник читает не больше страницы по своему индексу,
+    слияние идёт в Python, поэтому SQLite не сортирует посты во
+    временном B-дереве. Поддерживает интерфейс, нужный Paginator
+    и CursorPaginator.
+    """
+
+    model = Post
+
+    def __init__(self, sources):
+        self.sources = sources
+
+    def count(self):
+        return sum(source.count() for source in self.sources)
+
+    def keyset_rows(self, values, reverse, limit):
+        return _merge(
+            [
+                source.keyset_rows(values, reverse, limit)
+                for source in self.sources
+            ],
+            reverse,
+            limit,
+        )
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start = index.start or 0
+            return self.keyset_rows(None, False, index.stop)[start:]
+        return self[index:index + 1][0]
+
+
+def feed(user):
+    """
+    Лента подписок пользователя: его записи плюс pull-авторы, которых
+    подсказывает граф подписок в памяти процесса.
+    """
+    sources = [KeysetRange(
+        TimelineEntry.objects.filter(user=user).select_related(
+            "post__author", "post__group"
+        ),
+        TIMELINE_ORDERING,
+    )]
+    pull_author_ids = follow_graph.graph.pull_authors(user.pk)
+    if pull_author_ids:
+        sources.append(PullAuthorsFeed(user, pull_author_ids))
+    return MergedFeed(sources)
+
+
+def cached_count(user, merged_feed):
+    """
+    Число постов ленты подписок из кеша на PAGINATOR_COUNT_TIMEOUT
+    секунд. Ключ включает поколения читателя и набора pull-авторов:
+    подписка, отписка и перевод автора на чтение при запросе дают
+    новый ключ, а новые посты подписок учитываются по истечении срока
+    (FeedPaginator не обрезает страницы по числу).
+    """
+    reader = feed_cache.reader_scope(user.pk)
+    current = feed_cache.generations(
+        [reader, feed_cache.PULL_AUTHORS_SCOPE]
+    )
+    key = COUNT_PREFIX + "%s:%s:%s" % (
+        user.pk, current[reader], current[feed_cache.PULL_AUTHORS_SCOPE]
+    )
+    count = cache.get(key)
+    if count is None:
+        count = merged_feed.count()
+        cache.set(key, count, settings.PAGINATOR_COUNT_TIMEOUT)
+    return count
@@ -1,63 +1,145 @@
+from functools import partial
+
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import Paginator
 from django.shortcuts import get_object_or_404, redirect, render
-from django.views.decorators.cache import cache_page
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.views.generic.edit import FormView, CreateView
 from .forms import PostForm, CommentForm
 from django.urls import reverse_lazy
+from core.decorators import query_budget
 from .models import Group, Post, User, Comment, Follow
+from .paginators import CursorPaginator, FeedPaginator
+from . import counters, follow_graph, search, timeline
+from .cards import attach_cards
+from .comments import comments_page
+from .thumbnails import attach_thumbnails, queue_for_post
+from .feed_cache import cache_feed, feed_etag
+from .freshness import feed_last_modified, post_etag, post_last_modified
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
 
 
 POSTS_PER_PAGE = 10
 
 
-def paginator(request, queryset, number_page):
-    paginator = Paginator(queryset, number_page)
+def paginator(request, queryset, number_page, count=None, max_pages=None):
+    """
+    Страница ленты: курсорная по ?after=/?before= или номерная.
+    count — источник числа постов для номерной пагинации, см.
+    FeedPaginator; по умолчанию точный COUNT(*) из кеша. max_pages
+    ограничивает глубину номеров страниц.
+    """
+    after = request.GET.get("after") or None
+    before = request.GET.get("before") or None
+    if after or before or settings.POSTS_CURSOR_PAGINATION:
+        paginator = CursorPaginator(queryset, number_page)
+        return paginator.get_page(after=after, before=before)
+    paginator = FeedPaginator(
+        queryset, number_page, count=count, max_pages=max_pages
+    )
     page_number = request.GET.get("page")
     page_object = paginator.get_page(page_number)
     return page_object
 
-@cache_page(20, key_prefix='index_page')
+# Бюджеты запросов лент учитывают сессию и пользователя, число постов
+# и страницу, а также повторный запрос курсорной пагинации при
+# возврате к началу ленты по ?before=.
+@cache_feed("global")
+@query_budget(5)
 def index(request):
-    posts = Post.objects.all()
-    page_obj = paginator(request, posts, POSTS_PER_PAGE)
+    posts = Post.objects.select_related("author", "group")
+    page_obj = paginator(
+        request,
+        posts,
+        POSTS_PER_PAGE,
+        count=lambda: counters.for_site().posts_count,
+    )
+    attach_cards(page_obj)
     template = "posts/index.html"
     context = {"page_obj": page_obj}
     return render(request, template, context)
 
 
+# Условные ответы браузер хранит, но всегда сверяет по ETag
+# и Last-Modified: страницы зависят от пользователя.
+@cache_control(private=True, no_cache=True)
+@condition(
+    etag_func=feed_etag("group:{slug}"),
+    last_modified_func=feed_last_modified("group:{slug}", "group__slug"),
+)
+@cache_feed("group:{slug}")
+@query_budget(6)
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
-    posts = group.posts.all()
-    page_obj = paginator(request, posts, POSTS_PER_PAGE)
+    posts = group.posts.select_related("author")
+    page_obj = paginator(
+        request, posts, POSTS_PER_PAGE, count=lambda: group.posts_count
+    )
+    attach_cards(page_obj)
     template = "posts/group_list.html"
     context = {"group": group, "page_obj": page_obj}
     return render(request, template, context)
 
 
+@cache_control(private=True, no_cache=True)
+@condition(
+    etag_func=feed_etag("author:{username}"),
+    last_modified_func=feed_last_modified(
+        "author:{username}", "author__username"
+    ),
+)
+@cache_feed("author:{username}")
+@query_budget(7)
 def profile(request, username):
-    author = User.objects.get(username=username)
-    posts = author.posts.all()
-    paginator = Paginator(posts, 10)
-    page_number = request.GET.get("page")
-    page_obj = paginator.get_page(page_number)
+    author = get_object_or_404(
+        User.objects.select_related("counters"), username=username
+    )
+    posts = author.posts.select_related("group")
+    page_obj = paginator(
+        request,
+        posts,
+        POSTS_PER_PAGE,
+        count=lambda: counters.for_user(author).posts_count,
+    )
+    attach_cards(page_obj)
     template = "posts/profile.html"
-    try:
-        following = Follow.objects.get(author=author, user=request.user)
-        following = True
-    except:
-        following = False
-    context = {"page_obj": page_obj, "username": author, 'following': following}
+    following = request.user.is_authenticated and (
+        follow_graph.graph.is_following(request.user.pk, author.pk)
+    )
+    context = {
+        "page_obj": page_obj,
+        "username": author,
+        "counters": counters.for_user(author),
+        "following": following,
+    }
     return render(request, template, context)
 
 
+@query_budget(5)
+def search_posts(request):
+    query = request.GET.get("q", "").strip()
+    results = search.SearchResults(query)
+    page_obj = FeedPaginator(
+        results, POSTS_PER_PAGE, count=results.count
+    ).get_page(request.GET.get("page"))
+    attach_cards(page_obj)
+    template = "posts/search.html"
+    context = {"page_obj": page_obj, "query": query}
+    return render(request, template, context)
+
+
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=post_etag, last_modified_func=post_last_modified)
+@query_budget(5)
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, pk=post_id)
-    comments = Comment.objects.filter(post=post)
+    post = get_object_or_404(
+        Post.objects.select_related("author__counters", "group"), pk=post_id
+    )
+    attach_thumbnails([post])
+    comments = comments_page(post.pk)
     comment_form = CommentForm()
-    author = post.author
-    posts_count = author.posts.count()
+    posts_count = counters.for_user(post.author).posts_count
     template = "posts/post_detail.html"
     context = {
         "post": post,
@@ -68,6 +150,25 @@ def post_detail(request, post_id):
     }
     return render(request, template, context)
 
+
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=feed_etag("comments:{post_id}"))
+@cache_feed("comments:{post_id}")
+@query_budget(3)
+def post_comments(request, post_id):
+    """
+    Фрагмент со следующей страницей комментариев для подгрузки
+    на странице поста: только сам список и ссылка на продолжение.
+    """
+    comments = comments_page(post_id, after=request.GET.get("after") or None)
+    # Комментарии удаляются вместе с постом: есть ли пост, проверяется
+    # лишь для пустой страницы, и обычный фрагмент стоит одного запроса.
+    if not comments:
+        get_object_or_404(Post.objects.only("pk"), pk=post_id)
+    template = "posts/includes/comment_list.html"
+    context = {"post_id": post_id, "comments": comments}
+    return render(request, template, context)
+
 # @login_required
 # def post_create(request):
 #     if request.method == "POST":
@@ -94,6 +195,7 @@ class PostCreateView(LoginRequiredMixin, CreateView):
         self.object = form.save(commit=False)
         self.object.author = self.request.user
         self.object.save()
+        queue_for_post(self.object)
         return redirect(self.get_success_url())
 
 @login_required
@@ -104,7 +206,9 @@ def post_edit(request, post_id):
     if request.method == "POST":
         form = PostForm(request.POST or None, files=request.FILES or None, instance=post)
         if form.is_valid():
-            form.save()
+            post = form.save()
+            if "image" in form.changed_data:
+                queue_for_post(post)
             return redirect("posts:post_detail", post_id=post.pk)
         template = "posts/create_post.html"
         context = {"form": form}
@@ -136,26 +240,34 @@ class CommentCreateView(LoginRequiredMixin, CreateView):
         return redirect(self.get_success_url())
 
 @login_required
+@cache_feed("global", "reader:{user}")
+@query_budget(8)
 def follow_index(request):
-    authors = Follow.objects.filter(user=request.user.id)
-    authors_list = [i.author.id for i in authors]
-    posts = Post.objects.filter(author__in=authors_list)
-    page_obj = paginator(request, posts, POSTS_PER_PAGE)
+    posts = timeline.feed(request.user)
+    page_obj = paginator(
+        request,
+        posts,
+        POSTS_PER_PAGE,
+        count=partial(timeline.cached_count, request.user, posts),
+        max_pages=settings.TIMELINE_MAX_PAGES,
+    )
+    attach_cards(page_obj)
     return render(request, 'posts/follow.html', context = {'page_obj': page_obj})
 
 @login_required
 def profile_follow(request, username):
     author = User.objects.get(username=username)
     user = request.user
-    Follow.objects.create(
-        author = author,
-        user = user
-    )
+    follow, created = Follow.objects.get_or_create(author=author, user=user)
+    if created:
+        timeline.backfill(user, author)
     return redirect('posts:profile', username=username)
 
 @login_required
 def profile_unfollow(request, username):
     author = User.objects.get(username=username)
     user = request.user
-    Follow.objects.get(author = author.id, user=user.id).delete()
+    deleted, _ = Follow.objects.filter(author=author, user=user).delete()
+    if deleted:
+        timeline.prune(user, author)
     return redirect('posts:profile', username=username)
\ No newline at end of file
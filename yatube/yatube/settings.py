@@ -27,11 +27,14 @@ INSTALLED_APPS = [
     "posts.apps.PostsConfig",
     "users.apps.UsersConfig",
     "core.apps.CoreConfig",
+    "api.apps.ApiConfig",
     "about.apps.AboutConfig",
     'sorl.thumbnail',
 ]
 
 MIDDLEWARE = [
+    "core.timing.ServerTimingMiddleware",
+    "core.metrics.MetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -46,7 +49,7 @@ ROOT_URLCONF = "yatube.urls"
 TEMPLATES_DIR = os.path.join(BASE_DIR, "templates")
 TEMPLATES = [
     {
-        "BACKEND": "django.template.backends.django.DjangoTemplates",
+        "BACKEND": "core.timing.TimedDjangoTemplates",
         "DIRS": [TEMPLATES_DIR],
         "APP_DIRS": True,
         "OPTIONS": {
@@ -72,6 +75,17 @@ DATABASES = {
 }
 
 
+# Кеш, метрики и журнал медленных запросов лежат в файлах рядом с
+# базой, если переменные окружения YATUBE_*_PATH не указывают иное.
+# Прогон тестов переносит их во временный каталог
+# (core.testing.temporary_runtime_files).
+def _runtime_path(variable, name):
+    return os.environ.get(variable, os.path.join(BASE_DIR, name))
+
+
+TEST_RUNNER = 'core.testing.TemporaryFilesRunner'
+
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         "NAME": "django.contrib.auth.password_validation.UserAttributeSimilarityValidator",
@@ -116,8 +130,102 @@ CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media') 
 
+# Курсорная пагинация лент (?after=/?before=) вместо номеров страниц.
+POSTS_CURSOR_PAGINATION = False
+# Сколько секунд номерная пагинация берёт число постов из кеша,
+# а не из COUNT(*) (posts.paginators.FeedPaginator).
+PAGINATOR_COUNT_TIMEOUT = 60
+
+# Лента подписок раскладывается по читателям при публикации поста.
+# Авторы с большим числом подписчиков или постов читаются при запросе.
+TIMELINE_FANOUT_LIMIT = 5000
+TIMELINE_BACKFILL_LIMIT = 1000
+# До скольких pull-авторов в подписках их посты сливаются по авторам,
+# а не одним проходом индекса дат (posts.timeline.PullAuthorsFeed).
+TIMELINE_MERGE_AUTHORS = 20
+# Сколько постов от курсора просматривает проход индекса дат, прежде
+# чем уступить слиянию по авторам.
+TIMELINE_WALK_ROWS = 5000
+# Глубина номерной пагинации ленты подписок: N-я страница слияния
+# читает N страниц из каждого источника, дальше лента листается
+# курсором.
+TIMELINE_MAX_PAGES = 20
+
+# Превышение бюджета запросов view (core.decorators.query_budget)
+# пишется в лог; в строгом режиме (его включают тесты) роняет запрос.
+QUERY_BUDGET_STRICT = False
+
+# Время SQL, шаблонов, кеша и миниатюр каждого запроса отдаётся
+# в заголовке Server-Timing и пишется в лог yatube.timing. Замеры
+# собираются и при SERVER_TIMING = False: их читают метрики.
+SERVER_TIMING = True
+
+# Метрики для Prometheus (/metrics) копятся в памяти процесса, и
+# фоновый поток раз в METRICS_FLUSH_INTERVAL секунд складывает их
+# в общий для воркеров файл SQLite (core.metrics).
+METRICS_PATH = _runtime_path('YATUBE_METRICS_PATH', 'metrics.sqlite3')
+METRICS_FLUSH_INTERVAL = 1.0
+# Адреса, с которых /metrics отдаётся без входа (сборщик Prometheus);
+# остальным — только сотрудникам.
+METRICS_ALLOWED_IPS = ['127.0.0.1', '::1']
+
+# Запросы дольше SLOW_QUERY_MS миллисекунд пишутся с планом в
+# SLOW_QUERY_LOG (core.slow_queries, отчёт — manage.py slow_queries);
+# None отключает журнал. Стек сохраняется у доли SLOW_QUERY_STACK_RATE.
+SLOW_QUERY_MS = 100
+SLOW_QUERY_STACK_RATE = 0.25
+SLOW_QUERY_LOG = _runtime_path('YATUBE_SLOW_QUERY_LOG', 'slow_queries.log')
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'slow_queries': {
+            'class': 'logging.handlers.RotatingFileHandler',
+            'filename': SLOW_QUERY_LOG,
+            'maxBytes': 10 * 1024 * 1024,
+            'backupCount': 5,
+            'encoding': 'utf-8',
+            'delay': True,
+        },
+    },
+    'loggers': {
+        'yatube.slow_queries': {
+            'handlers': ['slow_queries'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+    },
+}
+
+# Страницы лент живут в кеше долго: свежесть обеспечивают поколения
+# posts.feed_cache, которые сдвигаются сигналами при изменениях.
+FEED_CACHE_TIMEOUT = 60 * 60 * 24
+# Карточки постов ключуются версией поста, поэтому тоже живут долго.
+POST_CARD_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Миниатюры готовятся фоновым пулом потоков, а не в запросе: пока
+# миниатюры нет, шаблоны получают заглушку.
+THUMBNAIL_BACKEND = 'posts.thumbnails.AsyncThumbnailBackend'
+THUMBNAIL_ASYNC = True
+THUMBNAIL_WORKERS = 2
+# Сколько готовых миниатюр держать в памяти процесса.
+THUMBNAIL_LRU_SIZE = 2048
+
+# Для скольких пользователей держать в памяти процесса списки подписок
+# (posts.follow_graph): по 8 байт на подписку плюс запись LRU.
+FOLLOW_GRAPH_LRU_SIZE = 10000
+
+# Общий для всех воркеров кеш в файле SQLite (core.cache.SQLiteCache):
+# LocMemCache держал бы в каждом процессе свою копию страниц, а сброс
+# поколений доходил бы только до одного воркера.
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': 'core.cache.SQLiteCache',
+        'LOCATION': _runtime_path('YATUBE_CACHE_PATH', 'cache.sqlite3'),
+        'OPTIONS': {
+            'MAX_SIZE': 256 * 1024 * 1024,
+            'MAX_ENTRIES': 200000,
+        },
     }
-} 
\ No newline at end of file
+}
\ No newline at end of file